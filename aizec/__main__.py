@@ -1,50 +1,194 @@
 import argparse
+import subprocess
+import sys
 
 from aizec.common import *
 
-from aizec.aize_run import FrontendManager, IRManager, BackendManager, fail_callback
+from aizec.aize_common import MessageHandler, StageTimer
+from aizec.aize_frontend import ParseCache, MemoryParseCache
+from aizec.aize_backend import StdBundle, OPT_LEVELS
+from aizec.aize_run import FrontendManager, IRManager, BackendManager, build_std_bundle, fail_callback
+
+
+STD_DIR = Path(__file__).parent / "std"
+DEFAULT_STD_BUNDLE_DIR = Path(__file__).parent / "std-bundle"
 
 
 def make_arg_parser():
     parser = argparse.ArgumentParser(prog="aizec")
 
-    parser.add_argument("file")
+    parser.add_argument("file", nargs="?")
     parser.add_argument("-o", "--output", default=None)
-    parser.add_argument("-O", choices=[0, 1], type=int, default=1, dest="opt_level")
-    parser.add_argument("--backend-opt", action='append')
+    parser.add_argument("-O", choices=OPT_LEVELS, default='2', dest="opt_level", help="optimize with this preset, from 0 (none) to 3 (the most for speed), or s or z (the most for size) for small code (default: 2)")
+    parser.add_argument("--target-cpu", metavar="CPU", default='', help="generate code for this CPU, or native for this machine's (default: the generic CPU of the target)")
+    parser.add_argument("--target-features", metavar="FEATURES", default='', help="enable or disable these target features, such as +avx2,-avx512f, or native for this machine's")
+    parser.add_argument("--backend-opt", action='append', default=[])
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="parse imported files, and compile the sources of a --build-dir or the --codegen-units, with this many workers; the program built is the same as with one")
+    parser.add_argument("--codegen-units", metavar="N", type=int, default=1, help="split the program into N units that -j can compile at once, which stops functions being inlined between them (default: 1)")
+    parser.add_argument("--build-dir", default=None, help="only recompile sources that changed since the last build in this directory")
+    parser.add_argument("--cache-dir", default=None, help="reuse parsed sources stored in this directory (e.g. .aizec-cache)")
+    parser.add_argument("--std-bundle", metavar="DIR", default=None, help=f"use the prebuilt std in this directory, if it is up to date and was built with the same -O, --target-cpu, and --target-features (default: {DEFAULT_STD_BUNDLE_DIR})")
+    parser.add_argument("--no-std-bundle", action="store_true", help="compile std from its sources, even if there is an up to date bundle")
+    parser.add_argument("--build-std-bundle", action="store_true", help="analyze and compile std once into the --std-bundle directory, for later compiles with the same -O, --target-cpu, and --target-features to use")
+    parser.add_argument("--check", action="store_true", help="only report errors, without building the program; exits with 1 if there were any")
+    parser.add_argument("--time-passes", action="store_true", help="print the time and memory used by each stage of the compile")
+    parser.add_argument("--stats-json", metavar="FILE", default=None, help="write the time and memory used by each stage of the compile to FILE as JSON")
+    parser.add_argument("--serve", metavar="SOCKET", default=None, help="stay running and compile the requests sent to this Unix socket")
+    parser.add_argument("--connect", metavar="SOCKET", default=None, help="send the compile to the server listening on this Unix socket")
 
     return parser
 
 
-def main():
-    arg_parser = make_arg_parser()
-    args = arg_parser.parse_args()
+def get_parse_cache(args: argparse.Namespace, cache: Optional[ParseCache]) -> Optional[ParseCache]:
+    if args.cache_dir is not None:
+        return ParseCache(Path(args.cache_dir))
+    return cache
+
 
-    input_file = Path(args.file)
+def get_std_bundle_dir(args: argparse.Namespace) -> Path:
+    if args.std_bundle is not None:
+        return Path(args.std_bundle)
+    return DEFAULT_STD_BUNDLE_DIR
+
+
+def analyze_program(args: argparse.Namespace, cache: Optional[ParseCache]) -> Tuple[FrontendManager, IRManager]:
+    bundle = None
+    if not args.no_std_bundle:
+        with StageTimer.stage("open std bundle"):
+            bundle = StdBundle.open(get_std_bundle_dir(args), STD_DIR,
+                                    args.opt_level, args.target_cpu, args.target_features)
+    frontend = FrontendManager(Path.cwd(), STD_DIR, get_parse_cache(args, cache), bundle)
+    with StageTimer.stage("frontend"):
+        frontend.add_file(Path(args.file))
+        frontend.trace_imports(args.jobs)
+
+    ir_manager = IRManager(frontend.get_ir())
+    ir_manager.schedule_default_passes()
+    with StageTimer.stage("analysis"):
+        ir_manager.run_scheduled()
+    return frontend, ir_manager
+
+
+def check_program(args: argparse.Namespace, cache: Optional[ParseCache]) -> int:
+    """Report the errors in the file args names, returning 0 if there were none and 1 otherwise"""
+    status = 1
+    with fail_callback(lambda c: None):
+        analyze_program(args, cache)
+        status = 0
+    return status
+
+
+def compile_program(args: argparse.Namespace, cache: Optional[ParseCache], run: bool = True) -> Tuple[int, Optional[Path]]:
+    """Compile the file args names, returning the exit status and the path of the built program"""
     if args.output is None:
         output_file = None
     else:
         output_file = Path(args.output)
-    opt_level: int = args.opt_level
+    opt_level: str = args.opt_level
     backend_options: List[str] = args.backend_opt
 
-    with fail_callback(lambda c: exit(0)):
-        frontend = FrontendManager(Path.cwd(), Path(__file__).parent / "std")
-        frontend.add_file(input_file)
-        frontend.trace_imports()
-
-        ir_manager = IRManager(frontend.get_ir())
-        ir_manager.schedule_default_passes()
+    status, output_path = 1, None
+    with fail_callback(lambda c: None):
+        frontend, ir_manager = analyze_program(args, cache)
         ir_manager.schedule_mangling()
         ir_manager.run_scheduled()
 
-        backend = BackendManager.create_llvm(ir_manager.ir)
-        backend.set_output(output_file)
-        backend.set_opt_level(opt_level)
-        for opt in backend_options:
-            backend.set_option(opt)
-        backend.run_backend()
-        backend.run_output()
+        with StageTimer.stage("backend"):
+            backend = BackendManager.create_llvm(ir_manager.ir)
+            backend.set_output(output_file)
+            backend.set_opt_level(opt_level)
+            backend.set_jobs(args.jobs)
+            backend.set_codegen_units(args.codegen_units)
+            backend.set_target(args.target_cpu, args.target_features)
+            backend.set_std_bundle(frontend.bundle)
+            if args.build_dir is not None:
+                backend.set_build_dir(Path(args.build_dir), frontend.get_import_graph())
+            for opt in backend_options:
+                backend.set_option(opt)
+            backend.run_backend()
+        status, output_path = 0, backend.backend.output_path
+        if run:
+            backend.run_output()
+    return status, output_path
+
+
+def run_program_args(args: argparse.Namespace, cache: Optional[ParseCache], run: bool = True) -> Tuple[int, Optional[Path]]:
+    StageTimer.reset()
+    StageTimer.enable(args.time_passes or args.stats_json is not None)
+    try:
+        if args.check:
+            return check_program(args, cache), None
+        else:
+            return compile_program(args, cache, run)
+    finally:
+        if args.time_passes:
+            StageTimer.report(sys.stderr)
+        if args.stats_json is not None:
+            with open(args.stats_json, "w") as stats_file:
+                StageTimer.dump_json(stats_file)
+
+
+def serve(socket_path: Path):
+    from aizec.aize_server import CompileServer
+
+    arg_parser = make_arg_parser()
+    # Kept for the life of the server, so std and other unchanged files are only parsed once
+    cache = MemoryParseCache()
+
+    def compile_request(argv: List[str]) -> Tuple[int, Optional[Path]]:
+        args = arg_parser.parse_args(argv)
+        if args.file is None:
+            arg_parser.error("the following arguments are required: file")
+        # Report to the request's (redirected) stderr, and forget the messages of earlier requests
+        MessageHandler.set_config(err_out=sys.stderr)
+        MessageHandler.reset_errors()
+        return run_program_args(args, cache, run=False)
+
+    server = CompileServer(socket_path, compile_request)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def connect(socket_path: Path, argv: List[str]) -> int:
+    from aizec.aize_server import send_request
+
+    response = send_request(socket_path, argv, Path.cwd())
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    if response["status"] == 0 and response["output"] is not None:
+        # The program runs here rather than in the server so it gets this terminal and environment
+        return_code = subprocess.run([response["output"]])
+        print("Returned with code:", return_code.returncode)
+    return response["status"]
+
+
+def main(argv: List[str] = None):
+    if argv is None:
+        argv = sys.argv[1:]
+    arg_parser = make_arg_parser()
+    args = arg_parser.parse_args(argv)
+
+    if args.serve is not None:
+        serve(Path(args.serve))
+        return
+    if args.build_std_bundle:
+        status = 1
+        with fail_callback(lambda c: None):
+            build_std_bundle(STD_DIR, get_std_bundle_dir(args), args.opt_level, args.target_cpu, args.target_features)
+            status = 0
+        exit(status)
+    if args.file is None:
+        arg_parser.error("the following arguments are required: file")
+
+    if args.connect is not None:
+        exit(connect(Path(args.connect), argv))
+    else:
+        status, _ = run_program_args(args, None)
+        exit(status)
 
 
 if __name__ == '__main__':
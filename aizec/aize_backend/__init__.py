@@ -1,2 +1,11 @@
-from .aize_backend import Backend
-from .aize_llvm_backend import LLVMBackend
+from .aize_backend import Backend, OPT_LEVELS
+from .aize_build import BuildState
+from .aize_bundle import StdBundle
+
+
+def __getattr__(name: str):
+    # The LLVM backend imports and initializes llvmlite, which frontend-only runs should not pay for
+    if name == 'LLVMBackend':
+        from .aize_llvm_backend import LLVMBackend
+        return LLVMBackend
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
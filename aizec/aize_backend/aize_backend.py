@@ -8,6 +8,9 @@ from aizec.aize_common import AizeMessage, MessageHandler, Reporter, ErrorLevel
 
 from aizec.ir import IR
 
+from .aize_build import BuildState
+from .aize_bundle import StdBundle
+
 
 class LinkingError(AizeMessage):
     def __init__(self, msg: str):
@@ -27,23 +30,79 @@ class LinkingWarning(AizeMessage):
         reporter.general_error("Linking Warning", self.msg)
 
 
+class TargetError(AizeMessage):
+    def __init__(self, msg: str):
+        super().__init__(ErrorLevel.ERROR)
+        self.msg = msg
+
+    def display(self, reporter: Reporter):
+        reporter.general_error("Target Error", self.msg)
+
+
 T = TypeVar('T')
 
 
+OPT_LEVELS = ('0', '1', '2', '3', 's', 'z')
+"""
+The optimization presets that can be given with -O, from none to the most for speed, then s and z for small code, with z
+giving up more speed for it
+"""
+
+
 # TODO Reuse `Source`s somehow so it can be used for both input and output
 class Backend(ABC):
     def __init__(self, ir: IR):
         self.ir = ir
         self.output_path: Optional[Path] = None
-        self.opt_level: Literal[0, 1] = 1
+        self.opt_level: str = '2'
+        self.target_cpu: str = ''
+        self.target_features: str = ''
+        self.build_state: Optional[BuildState] = None
+        self.std_bundle: Optional[StdBundle] = None
+        self.jobs: int = 1
+        self.codegen_units: int = 1
 
     def set_output(self, path: Optional[Path]):
         self.output_path = path
 
-    def set_opt_level(self, level: int):
-        assert level in (0, 1)
+    def set_build_state(self, state: Optional[BuildState]):
+        """Build incrementally, reusing the per-source outputs recorded in state"""
+        self.build_state = state
+
+    def set_std_bundle(self, bundle: Optional[StdBundle]):
+        """Link the object file of bundle for the program's prebuilt sources, which bundle's IR was extended with"""
+        self.std_bundle = bundle
+
+    def set_opt_level(self, level: Union[int, str]):
+        """Optimize with the preset named level, one of OPT_LEVELS"""
+        level = str(level)
+        assert level in OPT_LEVELS
         self.opt_level = level
 
+    def set_target(self, cpu: str = '', features: str = ''):
+        """
+        Compile for the CPU named cpu, with the target features in features (such as "+avx2,-avx512f").
+
+        Either can be "native" for the host's, and is the target's generic choice when empty. A native CPU brings the
+        host's features, unless features are given.
+        """
+        self.target_cpu = cpu
+        self.target_features = features
+
+    def set_jobs(self, jobs: int):
+        """Compile with up to jobs workers at once, which never changes the code generated"""
+        assert jobs >= 1
+        self.jobs = jobs
+
+    def set_codegen_units(self, units: int):
+        """
+        Split the program into up to units parts which are compiled separately, so the jobs can compile them at once.
+
+        Functions are not inlined from one part into another, so the program can be slower than when compiled whole.
+        """
+        assert units >= 1
+        self.codegen_units = units
+
     @abstractmethod
     def handle_option(self, option: str) -> bool:
         return False
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+from aizec.common import *
+from aizec.aize_common import Source, write_atomic, fingerprint_modules
+
+
+__all__ = ['BuildState']
+
+
+class BuildState:
+    """
+    Records the import graph, content hashes, and object files of the builds done in a build directory.
+
+    Each source's object file is named by a key. The key hashes the source's text, the text of everything it imports
+    directly or indirectly, the backend settings, and the compiler itself. A source only needs to be compiled again
+    when its key changes.
+    """
+
+    STATE_FILE = "build-state.json"
+    VERSION = 1
+
+    def __init__(self, build_dir: Path, import_graph: Dict[Source, List[Source]]):
+        self.build_dir = build_dir
+
+        self.hashes: Dict[str, str] = {source.get_name(): hashlib.sha256(source.get_text().encode()).hexdigest()
+                                       for source in import_graph}
+        self.imports: Dict[str, List[str]] = {source.get_name(): sorted({imported.get_name() for imported in imports})
+                                              for source, imports in import_graph.items()}
+
+        self.recorded: Dict[str, Dict[str, Any]] = self._load()
+
+    @staticmethod
+    def compiler_fingerprint() -> str:
+        """Return a digest of the whole compiler, since any of it can change the object files built"""
+        return fingerprint_modules(Path(__file__).absolute().parent.parent)
+
+    @property
+    def state_path(self) -> Path:
+        return self.build_dir / self.STATE_FILE
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            state = json.loads(self.state_path.read_text())
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(state, dict) or state.get("version") != self.VERSION:
+            return {}
+        return state.get("sources", {})
+
+    def transitive_imports(self, name: str) -> List[str]:
+        """Return every source name imports directly or indirectly, sorted by name"""
+        found: Set[str] = set()
+        to_visit = [name]
+        while to_visit:
+            for imported in self.imports.get(to_visit.pop(), []):
+                if imported not in found:
+                    found.add(imported)
+                    to_visit.append(imported)
+        found.discard(name)
+        return sorted(found)
+
+    def get_key(self, name: str, settings: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(self.compiler_fingerprint().encode())
+        digest.update(settings.encode())
+        for source_name in [name, *self.transitive_imports(name)]:
+            digest.update(f"\0{source_name}\0{self.hashes[source_name]}".encode())
+        return digest.hexdigest()
+
+    def object_path(self, key: str) -> Path:
+        return self.build_dir / f"{key}.o"
+
+    def get_object(self, key: str) -> Optional[Path]:
+        """Return the object file built for key, or None if it has not been built yet"""
+        path = self.object_path(key)
+        if path.exists():
+            return path
+        else:
+            return None
+
+    def store_object(self, key: str, data: bytes) -> Path:
+        path = self.object_path(key)
+        write_atomic(path, data)
+        return path
+
+    def record(self, name: str, key: str):
+        self.recorded[name] = {
+            "hash": self.hashes[name],
+            "imports": self.imports[name],
+            "object": self.object_path(key).name,
+        }
+
+    def save(self):
+        """Save the recorded sources, then remove the object files none of them refer to any more"""
+        state = {"version": self.VERSION, "sources": self.recorded}
+        write_atomic(self.state_path, json.dumps(state, indent=2, sort_keys=True).encode())
+
+        used = {Path(recorded["object"]).stem for recorded in self.recorded.values()}
+        for path in [*self.build_dir.glob("*.o"), *self.build_dir.glob("*.ll")]:
+            if path.stem not in used:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+from aizec.common import *
+from aizec.aize_common import Source, write_atomic
+
+from aizec.ir import IR
+from aizec.ir.nodes import ImportIR
+
+from .aize_build import BuildState
+
+
+__all__ = ['StdBundle']
+
+
+class StdBundle:
+    """
+    The std library, analyzed and compiled ahead of time, so programs that import it skip parsing, analyzing, and
+    compiling it.
+
+    A bundle directory holds the analyzed IR of every std source, one object file with their code, and a manifest of
+    what they were built from: the compiler, the std directory and the hash of each of its sources, the target, and the
+    optimization preset, CPU, and target features the object file was compiled with. A bundle whose manifest does not
+    match the current compiler and std directory, or the settings of the build, is not used.
+
+    Opening a bundle only reads its manifest. Its IR is loaded when one of its sources is first looked up, which is
+    when a program imports std, and becomes the IR of the program built with it, so each bundle is opened for one
+    build.
+    """
+
+    MANIFEST_FILE = "bundle.json"
+    IR_FILE = "std.air"
+    OBJECT_FILE = "std.o"
+    VERSION = 2
+
+    def __init__(self, bundle_dir: Path, std_dir: Path, manifest: Dict[str, Any]):
+        self.bundle_dir = bundle_dir
+        self.triple: str = manifest["triple"]
+        """The target the bundle's object file was compiled for"""
+
+        self._paths: Set[Path] = {std_dir.resolve() / name for name in manifest["sources"]}
+        self._ir: Optional[IR] = None
+        self._sources: Optional[Dict[Path, Source]] = None
+
+    @property
+    def ir(self) -> Optional[IR]:
+        """The IR of the bundled sources, loaded the first time it is needed, or None if it could not be loaded"""
+        if self._sources is None:
+            from aizec.ir.serialization import IRFormatError
+            try:
+                self._ir = IR.load(self.bundle_dir / self.IR_FILE)
+            except (OSError, IRFormatError):
+                self._ir = None
+                self._sources = {}
+            else:
+                self._sources = {source_ir.source.get_path(): source_ir.source
+                                 for source_ir in self._ir.program.sources}
+        return self._ir
+
+    @property
+    def object_path(self) -> Path:
+        return self.bundle_dir / self.OBJECT_FILE
+
+    @staticmethod
+    def hash_std(std_dir: Path) -> Dict[str, str]:
+        """Return the hash of each source in std_dir, by its path relative to std_dir"""
+        return {path.relative_to(std_dir).as_posix(): hashlib.sha256(path.read_bytes()).hexdigest()
+                for path in sorted(std_dir.rglob("*.az"))}
+
+    @classmethod
+    def make_manifest(cls, std_dir: Path, triple: str, opt_level: str, cpu: str, features: str) -> Dict[str, Any]:
+        std_dir = std_dir.resolve()
+        return {
+            "version": cls.VERSION,
+            "compiler": BuildState.compiler_fingerprint(),
+            "std_dir": str(std_dir),
+            "sources": cls.hash_std(std_dir),
+            "triple": triple,
+            "opt_level": opt_level,
+            "target_cpu": cpu,
+            "target_features": features,
+        }
+
+    @classmethod
+    def open(cls, bundle_dir: Path, std_dir: Path,
+             opt_level: str = '2', cpu: str = '', features: str = '') -> Optional[StdBundle]:
+        """
+        Return the bundle in bundle_dir, or None if there is none, or it was not built from std_dir as it is now with
+        the optimization preset opt_level, and the CPU and target features given to the backend's set_target.
+        """
+        try:
+            manifest = json.loads((bundle_dir / cls.MANIFEST_FILE).read_text())
+        except (OSError, ValueError):
+            return None
+        if not isinstance(manifest, dict) or manifest.get("version") != cls.VERSION:
+            return None
+        if manifest != cls.make_manifest(std_dir, manifest.get("triple"), opt_level, cpu, features):
+            return None
+        return cls(bundle_dir, std_dir, manifest)
+
+    @classmethod
+    def save(cls, bundle_dir: Path, std_dir: Path, ir_data: bytes, object_data: bytes, triple: str,
+             opt_level: str, cpu: str, features: str):
+        """
+        Write a bundle of the std sources in std_dir, given their analyzed IR and their object file, and the settings
+        the object file was compiled with.
+        """
+        write_atomic(bundle_dir / cls.IR_FILE, ir_data)
+        write_atomic(bundle_dir / cls.OBJECT_FILE, object_data)
+        # Written last, so a bundle is only used once all of it is written
+        manifest = cls.make_manifest(std_dir, triple, opt_level, cpu, features)
+        write_atomic(bundle_dir / cls.MANIFEST_FILE, json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    def get_source(self, path: Path) -> Optional[Source]:
+        """
+        Return the bundled source for the std file at path, or None if it is not in the bundle, or the bundle's IR
+        cannot be loaded.
+        """
+        if path not in self._paths or self.ir is None:
+            return None
+        return self._sources.get(path)
+
+    def get_import_graph(self) -> Dict[Source, List[Source]]:
+        """Return the sources each bundled source imports"""
+        return {source_ir.source: [top_level.source for top_level in source_ir.top_levels
+                                   if isinstance(top_level, ImportIR)]
+                for source_ir in self.ir.program.sources}
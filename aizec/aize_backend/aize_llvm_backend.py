@@ -1,12 +1,19 @@
 from __future__ import annotations
 
 import itertools
-
+import math
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import llvmlite
 import llvmlite.ir as ir
 import llvmlite.binding as llvm
 
 from aizec.common import *
-from aizec.aize_common import MessageHandler
+from aizec.aize_common import MessageHandler, StageTimer
 
 from aizec.ir import IR, Extension
 from aizec.ir.nodes import *
@@ -14,13 +21,20 @@ from aizec.ir.nodes import *
 from aizec.analysis import *
 from aizec.ir_pass import IRTreePass, IRPassSequence, PassesRegister, PassAlias, PassScheduler
 
-from .aize_backend import CBackend, CLinker
+from .aize_backend import CBackend, CLinker, LinkingError, TargetError, OPT_LEVELS
+from .aize_build import BuildState
 
 
 class LLVMData(Extension):
     class GeneralData:
-        def __init__(self, mod: ir.Module):
+        def __init__(self, mod: ir.Module, machine: llvm.TargetMachine):
             self.mod = mod
+            self.machine = machine
+            """The target machine the passes lay out types for, which is the backend's unless a CPU was chosen"""
+            self.target_data = machine.target_data
+
+            self.llvm_types: Dict[TypeSymbol, ir.Type] = {}
+            """The LLVM type each type has been lowered to, which every module of the program can use"""
 
     def general(self, set_to: GeneralData = None) -> GeneralData:
         return super().general(set_to)
@@ -28,8 +42,14 @@ class LLVMData(Extension):
     def program(self, node: ProgramIR, set_to=None):
         raise NotImplementedError()
 
-    def source(self, node: SourceIR, set_to=None):
-        raise NotImplementedError()
+    class SourceData:
+        def __init__(self, mod: ir.Module):
+            self.mod = mod
+            self.is_prebuilt = False
+            """If the source's object file is reused from an earlier build, so its functions need no bodies"""
+
+    def source(self, node: SourceIR, set_to: SourceData = None) -> SourceData:
+        return super().source(node, set_to)
 
     class FunctionData:
         def __init__(self, llvm_func: ir.Function, code_entry: ir.Block):
@@ -120,17 +140,29 @@ PassesRegister.register(GenerateLLVM)
 
 @PassesRegister.register(to_sequences=[GenerateLLVM])
 class InitLLVM(IRTreePass):
+    fusable = True
+
     def __init__(self, aize_ir: IR):
         super().__init__(aize_ir)
 
         self.llvm: LLVMData = self.add_ext(LLVMData)
 
-        self.llvm.general(set_to=LLVMData.GeneralData(ir.Module()))
+        self.llvm.general(set_to=LLVMData.GeneralData(ir.Module(), get_target_machine()))
 
     @classmethod
     def get_required_extensions(cls) -> Set[Type[Extension]]:
         return set()
 
+    @classmethod
+    def get_added_extensions(cls) -> Set[Type[Extension]]:
+        return {LLVMData}
+
+    @contextmanager
+    def source_context(self, source: SourceIR):
+        # Every source gets its own module so it can be compiled to its own object file
+        self.llvm.source(source, set_to=LLVMData.SourceData(ir.Module(source.source_name)))
+        yield
+
     @classmethod
     def get_required_passes(cls) -> Set[PassAlias]:
         return set()
@@ -149,20 +181,44 @@ class IRLLVMPass(IRTreePass, ABC):
 
         self.builder = ir.IRBuilder()
 
+        self._source_mod: Optional[ir.Module] = None
+
     def get_size(self, type: ir.Type) -> int:
-        target = llvm.Target.from_default_triple()
-        machine = target.create_target_machine(codemodel='small')
-        return type.get_abi_size(machine.target_data)
+        return type.get_abi_size(self.llvm.general().target_data)
 
     @property
     def mod(self) -> ir.Module:
-        return self.llvm.general().mod
+        """The module of the source being visited, or the program's module (which holds main) outside of a source"""
+        if self._source_mod is None:
+            return self.llvm.general().mod
+        else:
+            return self._source_mod
+
+    def in_module(self, value: ir.Value, mod: ir.Module = None) -> ir.Value:
+        """Return value as it can be used from mod (self.mod by default), declaring it there if it is another module's function"""
+        if mod is None:
+            mod = self.mod
+        if isinstance(value, ir.Function) and value.module is not mod:
+            try:
+                return mod.get_global(value.name)
+            except KeyError:
+                return ir.Function(mod, value.ftype, value.name)
+        else:
+            return value
 
     def was_successful(self) -> bool:
         MessageHandler.flush_messages()
         return True
 
     def resolve_type(self, type: TypeSymbol) -> ir.Type:
+        llvm_types = self.llvm.general().llvm_types
+        try:
+            return llvm_types[type]
+        except KeyError:
+            llvm_type = llvm_types[type] = self.lower_type(type)
+            return llvm_type
+
+    def lower_type(self, type: TypeSymbol) -> ir.Type:
         if isinstance(type, IntTypeSymbol):
             llvm_type = ir.IntType(type.bit_size)
         elif isinstance(type, FunctionTypeSymbol):
@@ -180,23 +236,23 @@ class IRLLVMPass(IRTreePass, ABC):
             llvm_type = ir.LiteralStructType([discriminator, ir.ArrayType(ir.IntType(8), max_bytes)])
         elif isinstance(type, UnionVariantTypeSymbol):
             discriminator = ir.IntType(8)
-            this_bytes = self.get_size(self.resolve_type(type.contains))
             llvm_type = ir.LiteralStructType([discriminator, self.resolve_type(type.contains)])
         else:
             raise NotImplementedError(type)
         return llvm_type
 
-    def visit_program(self, program: ProgramIR):
-        for source in program.sources:
-            self.visit_source(source)
-
-    def visit_source(self, source: SourceIR):
-        for top_level in source.top_levels:
-            self.visit_top_level(top_level)
+    @contextmanager
+    def source_context(self, source: SourceIR):
+        self._source_mod = self.llvm.source(source).mod
+        yield
+        self._source_mod = None
 
 
 @PassesRegister.register(to_sequences=[GenerateLLVM])
 class DeclareFunctions(IRLLVMPass):
+    # Declaring a function only needs its own types and the modules InitLLVM creates, so both can run in one walk
+    fusable = True
+
     def __init__(self, aize_ir: IR):
         super().__init__(aize_ir)
 
@@ -212,16 +268,16 @@ class DeclareFunctions(IRLLVMPass):
         return {DefaultPasses, InitLLVM, MangleNames}
 
     def call_func_in_main(self, func: ir.Function):
-        ret = self._main_builder.call(func, [])
+        ret = self._main_builder.call(self.in_module(func, self.llvm.general().mod), [])
         self._last_ret = ret
 
-    def visit_program(self, program: ProgramIR):
+    @contextmanager
+    def program_context(self, program: ProgramIR):
         main_func = ir.Function(self.mod, ir.FunctionType(ir.IntType(32), []), "main")
         main_entry = main_func.append_basic_block("entry")
         self._main_builder.position_at_start(main_entry)
 
-        for source in program.sources:
-            self.visit_source(source)
+        yield
 
         self._main_builder.ret(self._last_ret)
 
@@ -324,6 +380,13 @@ class DefineFunctions(IRLLVMPass):
     def get_required_passes(cls) -> Set[PassAlias]:
         return {DefaultPasses, InitLLVM, DeclareFunctions, MangleNames}
 
+    def visit_source(self, source: SourceIR):
+        if self.llvm.source(source).is_prebuilt:
+            return
+        # Lambdas are internal to their module, so they only need to be numbered within it
+        self._lambda_counter = itertools.count()
+        super().visit_source(source)
+
     def visit_function(self, func: FunctionIR):
         llvm_func = self.llvm.function(func).llvm_func
         code_entry = self.llvm.function(func).code_entry
@@ -502,7 +565,7 @@ class DefineFunctions(IRLLVMPass):
         func = self.symbols.method_call(method_call).func
         decl = self.llvm.decl(func.declarer)
 
-        llvm_val = self.builder.call(decl.var_value, arg_vals)
+        llvm_val = self.builder.call(self.in_module(decl.var_value), arg_vals)
 
         self.llvm.expr(method_call, set_to=LLVMData.ExprData(None, llvm_val))
 
@@ -536,7 +599,7 @@ class DefineFunctions(IRLLVMPass):
             llvm_val = self.builder.load(var_ptr)
         else:
             var_ptr = None
-            llvm_val = decl_data.var_value
+            llvm_val = self.in_module(decl_data.var_value)
         self.llvm.expr(get_var, LLVMData.ExprData(var_ptr, llvm_val))
 
     def visit_set_var(self, set_var: SetVarIR):
@@ -589,7 +652,7 @@ class DefineFunctions(IRLLVMPass):
             llvm_val = self.builder.load(var_ptr)
         else:
             var_ptr = None
-            llvm_val = decl_data.var_value
+            llvm_val = self.in_module(decl_data.var_value)
 
         self.llvm.expr(get_static, set_to=LLVMData.ExprData(var_ptr, llvm_val))
 
@@ -656,6 +719,7 @@ class DefineFunctions(IRLLVMPass):
         llvm_func_type = cast(ir.PointerType, self.resolve_type(func_type)).pointee
 
         llvm_func = ir.Function(self.mod, llvm_func_type, f"<lambda {next(self._lambda_counter)}>")
+        llvm_func.linkage = 'internal'
         self.llvm.decl(lambda_, LLVMData.DeclData(llvm_func, is_ptr=False))
 
         prep = llvm_func.append_basic_block("prep")
@@ -691,21 +755,134 @@ class DefineFunctions(IRLLVMPass):
             raise Exception()
 
 
-class LLVMBackend(CBackend):
-    llvm.initialize()
-    llvm.initialize_native_target()
-    llvm.initialize_native_asmprinter()
+_llvm_initialized = False
+
+
+def initialize_llvm():
+    """Initialize LLVM's native target, once per process, the first time a backend needs it"""
+    global _llvm_initialized
+    if not _llvm_initialized:
+        llvm.initialize()
+        llvm.initialize_native_target()
+        llvm.initialize_native_asmprinter()
+        _llvm_initialized = True
+
+
+_target_machines: Dict[Tuple[str, str, str], llvm.TargetMachine] = {}
 
+
+def _create_target_machine(target: llvm.Target, cpu: str, features: str) -> Tuple[llvm.TargetMachine, List[str]]:
+    """
+    Create the target machine for target, cpu, and features, also returning what LLVM said it ignored of them.
+
+    LLVM only prints the CPUs and features it does not recognize to stderr, and then ignores them, so stderr is captured
+    while the machine is made.
+    """
+    sys.stderr.flush()
+    saved_stderr = os.dup(2)
+    with tempfile.TemporaryFile() as captured:
+        os.dup2(captured.fileno(), 2)
+        try:
+            machine = target.create_target_machine(cpu, features, codemodel='small')
+        finally:
+            os.dup2(saved_stderr, 2)
+            os.close(saved_stderr)
+        captured.seek(0)
+        lines = captured.read().decode(errors='replace').splitlines()
+
+    ignored = []
+    for line in lines:
+        if "is not a recognized" in line:
+            reason = line.split(" (ignoring")[0]
+            if reason not in ignored:
+                ignored.append(reason)
+        else:
+            print(line, file=sys.stderr)
+    return machine, ignored
+
+
+def get_target_machine(triple: str = None, cpu: str = '', features: str = '') -> llvm.TargetMachine:
+    """
+    Return the target machine for triple (or the default triple if it is None), cpu, and features.
+
+    Making a target machine is slow, so each is made once per process. One must not be used on two threads at once.
+    Raises ValueError if the target does not have cpu or one of features, which LLVM would otherwise ignore.
+    """
+    initialize_llvm()
+    if triple is None:
+        triple = llvm.get_default_triple()
+    key = triple, cpu, features
+    if key not in _target_machines:
+        target = llvm.Target.from_triple(triple)
+        machine, ignored = _create_target_machine(target, cpu, features)
+        if ignored:
+            raise ValueError("; ".join(ignored))
+        _target_machines[key] = machine
+    return _target_machines[key]
+
+
+@dataclass(frozen=True)
+class OptPreset:
+    """The settings of the LLVM pipeline an -O preset runs"""
+    opt_level: int
+    size_level: int
+    inlining_threshold: int
+    loop_vectorize: bool
+    slp_vectorize: bool
+    unroll_loops: bool
+
+
+# Chosen the way clang chooses them for each level
+OPT_PRESETS: Dict[str, OptPreset] = {
+    '0': OptPreset(opt_level=0, size_level=0, inlining_threshold=0,
+                   loop_vectorize=False, slp_vectorize=False, unroll_loops=False),
+    '1': OptPreset(opt_level=1, size_level=0, inlining_threshold=225,
+                   loop_vectorize=False, slp_vectorize=False, unroll_loops=False),
+    '2': OptPreset(opt_level=2, size_level=0, inlining_threshold=225,
+                   loop_vectorize=True, slp_vectorize=True, unroll_loops=True),
+    '3': OptPreset(opt_level=3, size_level=0, inlining_threshold=250,
+                   loop_vectorize=True, slp_vectorize=True, unroll_loops=True),
+    's': OptPreset(opt_level=2, size_level=1, inlining_threshold=75,
+                   loop_vectorize=True, slp_vectorize=True, unroll_loops=True),
+    'z': OptPreset(opt_level=2, size_level=2, inlining_threshold=25,
+                   loop_vectorize=False, slp_vectorize=True, unroll_loops=True),
+}
+assert OPT_PRESETS.keys() == set(OPT_LEVELS)
+
+
+class LLVMBackend(CBackend):
     def __init__(self, aize_ir: IR):
+        initialize_llvm()
         super().__init__(aize_ir)
-        self.llvm_ir = self.to_llvm(aize_ir)
         self.emit_llvm = False
 
-    @staticmethod
-    def to_llvm(aize_ir: IR) -> ir.Module:
-        PassScheduler(aize_ir, [GenerateLLVM]).run_scheduled()
-        llvm_ir = aize_ir.extensions[LLVMData].general().mod
-        return llvm_ir
+    def to_llvm(self, target: llvm.Target) -> Dict[SourceIR, str]:
+        """
+        Generate the LLVM modules for the program.
+
+        Prebuilt sources, and when building incrementally, sources whose object files can be reused, are only declared.
+        Returns the build key of each source that is not prebuilt, or an empty dict when not building incrementally.
+        """
+        PassScheduler(self.ir, [InitLLVM, DeclareFunctions]).run_scheduled()
+
+        llvm_data = self.ir.extensions[LLVMData]
+        for source in self.ir.prebuilt_sources:
+            llvm_data.source(source).is_prebuilt = True
+
+        keys: Dict[SourceIR, str] = {}
+        if self.build_state is not None:
+            cpu, features = self.get_cpu_and_features()
+            # The LLVM version is included since a different LLVM can generate different code for the same IR
+            llvm_version = ".".join(map(str, llvm.llvm_version_info))
+            settings = (f"opt_level={self.opt_level};triple={target.triple};cpu={cpu};features={features};"
+                        f"llvmlite={llvmlite.__version__};llvm={llvm_version}")
+            for source in self.get_built_sources():
+                key = keys[source] = self.build_state.get_key(source.source_name, settings)
+                if self.build_state.get_object(key) is not None:
+                    llvm_data.source(source).is_prebuilt = True
+
+        PassScheduler(self.ir, [DefineFunctions]).run_scheduled()
+        return keys
 
     def handle_option(self, option: str) -> bool:
         if option == 'emit-llvm':
@@ -714,11 +891,45 @@ class LLVMBackend(CBackend):
         else:
             return super().handle_option(option)
 
-    @staticmethod
-    def create_function_passes(llvm_mod: llvm.ModuleRef, machine: llvm.TargetMachine):
-        fpmb = llvm.create_pass_manager_builder()
-        fpmb.opt_level = 3
-        fpmb.inlining_threshold = 225
+    def get_cpu_and_features(self) -> Tuple[str, str]:
+        """Return the CPU name and feature string to compile for, with "native" replaced by the host's"""
+        cpu, features = self.target_cpu, self.target_features
+        if cpu == 'native':
+            cpu = llvm.get_host_cpu_name()
+            if not features:
+                features = 'native'
+        if features == 'native':
+            features = llvm.get_host_cpu_features().flatten()
+        return cpu, features
+
+    def get_target_machine(self, target: llvm.Target) -> llvm.TargetMachine:
+        """Return the target machine to compile for target with, for the chosen CPU and features"""
+        try:
+            return get_target_machine(target.triple, *self.get_cpu_and_features())
+        except ValueError as err:
+            MessageHandler.handle_message(TargetError(f"Cannot compile for the chosen CPU and features: {err}"))
+            MessageHandler.flush_messages()
+            raise
+
+    @property
+    def opt_preset(self) -> OptPreset:
+        return OPT_PRESETS[self.opt_level]
+
+    def create_pass_manager_builder(self) -> llvm.PassManagerBuilder:
+        """Create a builder of the pipeline of the opt_level preset, for the function passes and the module passes"""
+        preset = self.opt_preset
+        pmb = llvm.create_pass_manager_builder()
+        pmb.opt_level = preset.opt_level
+        pmb.size_level = preset.size_level
+        pmb.inlining_threshold = preset.inlining_threshold
+        pmb.loop_vectorize = preset.loop_vectorize
+        pmb.slp_vectorize = preset.slp_vectorize
+        pmb.disable_unroll_loops = not preset.unroll_loops
+        return pmb
+
+    def create_function_passes(self, llvm_mod: llvm.ModuleRef, machine: llvm.TargetMachine):
+        """Create the function pass manager for llvm_mod, which is made once and run on each of its functions"""
+        fpmb = self.create_pass_manager_builder()
 
         fpm = llvm.create_function_pass_manager(llvm_mod)
         machine.add_analysis_passes(fpm)
@@ -734,10 +945,8 @@ class LLVMBackend(CBackend):
 
         return fpm
 
-    @staticmethod
-    def create_module_passes(machine: llvm.TargetMachine):
-        pmb = llvm.create_pass_manager_builder()
-        pmb.inlining_threshold = 225
+    def create_module_passes(self, machine: llvm.TargetMachine):
+        pmb = self.create_pass_manager_builder()
 
         pm = llvm.ModulePassManager()
         machine.add_analysis_passes(pm)
@@ -745,6 +954,135 @@ class LLVMBackend(CBackend):
 
         return pm
 
+    @staticmethod
+    def print_module(mod: ir.Module) -> str:
+        """
+        Return mod as LLVM assembly, which is how a module built with llvmlite.ir is handed to LLVM.
+
+        llvmlite.ir cannot write bitcode or build a module in LLVM directly, so the text is the only way across. Each
+        instruction keeps the text it was printed as, so only the first time a module is printed is slow.
+        """
+        with StageTimer.stage("print_assembly"):
+            return str(mod)
+
+    @classmethod
+    def parse_module(cls, mod: ir.Module, target: llvm.Target, context: llvm.ContextRef = None) -> llvm.ModuleRef:
+        """Hand mod to LLVM, printing it once and parsing the text in context (the global context by default)"""
+        mod.triple = target.triple
+        text = cls.print_module(mod)
+        with StageTimer.stage("parse_assembly"):
+            return llvm.parse_assembly(text, context)
+
+    def optimize(self, llvm_mod: llvm.ModuleRef, machine: llvm.TargetMachine):
+        if self.opt_preset.opt_level >= 1:
+            with StageTimer.stage("function passes"):
+                fpm = self.create_function_passes(llvm_mod, machine)
+                fpm.initialize()
+                for func in llvm_mod.functions:
+                    if not func.is_declaration:
+                        fpm.run(func)
+                fpm.finalize()
+
+            with StageTimer.stage("module passes"):
+                pm = self.create_module_passes(machine)
+                pm.run(llvm_mod)
+
+    def compile_unit(self, mod: ir.Module, target: llvm.Target, machine: llvm.TargetMachine = None) -> Tuple[bytes, Optional[str]]:
+        """
+        Compile mod on its own, returning its object code and, if LLVM is being emitted, its optimized LLVM.
+
+        Each unit gets its own LLVM context, and unless machine is given, its own target machine, so units can be
+        compiled on separate threads.
+        """
+        context = llvm.create_context()
+        if machine is None:
+            machine = target.create_target_machine(*self.get_cpu_and_features(), codemodel='small')
+        llvm_mod = self.parse_module(mod, target, context)
+        self.optimize(llvm_mod, machine)
+        llvm_text = str(llvm_mod) if self.emit_llvm else None
+        with StageTimer.stage("emit_object"):
+            object_data = machine.emit_object(llvm_mod)
+        return object_data, llvm_text
+
+    def compile_units(self, mods: List[ir.Module], target: llvm.Target) -> List[Tuple[bytes, Optional[str]]]:
+        """Compile each module with compile_unit, using up to self.jobs threads, and return the results in order"""
+        if self.jobs == 1 or len(mods) <= 1:
+            machine = self.get_target_machine(target)
+            return [self.compile_unit(mod, target, machine) for mod in mods]
+        # LLVM does its work without holding the GIL, so the units really are compiled at the same time
+        with StageTimer.stage("compile units in parallel"), ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            compile_unit = StageTimer.in_current_stage(lambda mod: self.compile_unit(mod, target))
+            return list(pool.map(compile_unit, mods))
+
+    @staticmethod
+    def split_module(mod: ir.Module, parts: int) -> List[ir.Module]:
+        """
+        Split mod into up to parts modules that can be compiled separately, dividing the functions it defines between
+        them.
+
+        Each part declares the functions it uses from the others, and has its own copy of the internal functions.
+        """
+        defined = [value for value in mod.globals.values()
+                   if isinstance(value, ir.Function) and not value.is_declaration and value.linkage != 'internal']
+        parts = min(parts, len(defined))
+        if parts <= 1:
+            return [mod]
+
+        part_size = math.ceil(len(defined) / parts)
+        split_mods = []
+        for start in range(0, len(defined), part_size):
+            in_part = set(defined[start:start + part_size])
+            split_mod = ir.Module(f"{mod.name}.{len(split_mods)}")
+            split_mod.triple, split_mod.data_layout = mod.triple, mod.data_layout
+            for value in mod.globals.values():
+                if value in in_part or value.linkage == 'internal' or not isinstance(value, ir.Function) \
+                        or value.is_declaration:
+                    split_mod.add_global(value)
+                else:
+                    ir.Function(split_mod, value.ftype, value.name)
+            split_mods.append(split_mod)
+        return split_mods
+
+    def get_built_sources(self) -> List[SourceIR]:
+        """Return the sources compiled as part of this program, which are all but the prebuilt ones"""
+        return [source for source in self.ir.program.sources if source not in self.ir.prebuilt_sources]
+
+    def get_codegen_units(self) -> List[ir.Module]:
+        """Split the modules of the sources into about codegen_units units, so even a single large source is split up"""
+        llvm_data = self.ir.extensions[LLVMData]
+        mods = [llvm_data.source(source).mod for source in self.get_built_sources()]
+
+        def count_defined(mod: ir.Module) -> int:
+            return sum(isinstance(value, ir.Function) and not value.is_declaration for value in mod.globals.values())
+
+        unit_size = max(1, math.ceil(sum(count_defined(mod) for mod in mods) / self.codegen_units))
+        units = []
+        for mod in mods:
+            units.extend(self.split_module(mod, math.ceil(count_defined(mod) / unit_size)))
+        return units
+
+    def build_sources(self, keys: Dict[SourceIR, str], target: llvm.Target) -> List[Path]:
+        """Compile every source that has no reusable object file and return the object files of all of them"""
+        llvm_data = self.ir.extensions[LLVMData]
+        self.build_state.build_dir.mkdir(parents=True, exist_ok=True)
+
+        to_build = [source for source in self.get_built_sources() if not llvm_data.source(source).is_prebuilt]
+        built = self.compile_units([llvm_data.source(source).mod for source in to_build], target)
+        for source, (object_data, llvm_text) in zip(to_build, built):
+            key = keys[source]
+            if llvm_text is not None:
+                with self.build_state.object_path(key).with_suffix(".ll").open("w") as file:
+                    file.write(llvm_text)
+            self.build_state.store_object(key, object_data)
+
+        objects = []
+        for source in self.get_built_sources():
+            key = keys[source]
+            objects.append(self.build_state.object_path(key))
+            self.build_state.record(source.source_name, key)
+        self.build_state.save()
+        return objects
+
     def run_backend(self):
         if self.output_path is None:
             output_form = Path.cwd() / Path("a")
@@ -755,47 +1093,90 @@ class LLVMBackend(CBackend):
             output_path = self.output_path
 
         target = llvm.Target.from_default_triple()
-        machine = target.create_target_machine(codemodel='small')
-        self.llvm_ir.triple = target.triple
-
-        if self.emit_llvm:
-            llvm_file = self.output_path.with_suffix(".ll")
-            with llvm_file.open("w") as file:
-                file.write(str(self.llvm_ir))
+        # Made first, so a CPU or feature the target does not have is reported before any work is done
+        machine = self.get_target_machine(target)
 
-        llvm_mod = llvm.parse_assembly(str(self.llvm_ir))
+        with StageTimer.stage("build LLVM IR"):
+            keys = self.to_llvm(target)
+        llvm_data = self.ir.extensions[LLVMData]
 
-        if self.opt_level >= 1:
-            for func in llvm_mod.functions:
-                fpm = self.create_function_passes(llvm_mod, machine)
-                fpm.initialize()
-                fpm.run(func)
-                fpm.finalize()
-
-            pm = self.create_module_passes(machine)
-            pm.run(llvm_mod)
-
-        if self.emit_llvm:
-            llvm_file = self.output_path.with_suffix(".ll")
-            with llvm_file.open("w") as file:
-                file.write(str(llvm_mod))
+        if self.build_state is None and self.codegen_units > 1:
+            # Compiled as separate units, which gives up inlining between them to compile them in parallel
+            objects = []
+            built = self.compile_units([llvm_data.general().mod, *self.get_codegen_units()], target)
+        else:
+            llvm_mod = self.parse_module(llvm_data.general().mod, target)
+            if self.build_state is None:
+                objects = []
+                for source in self.get_built_sources():
+                    llvm_mod.link_in(self.parse_module(llvm_data.source(source).mod, target))
+            else:
+                objects = self.build_sources(keys, target)
 
-        object_data = machine.emit_object(llvm_mod)
+            self.optimize(llvm_mod, machine)
+            llvm_text = str(llvm_mod) if self.emit_llvm else None
 
-        if (temp_path := output_form.with_suffix(".o")).exists():
-            i = 0
-            while (temp_path := Path(str(output_form) + f"_{i}").with_suffix(".o")).exists():
-                i += 1
+            with StageTimer.stage("emit_object"):
+                built = [(machine.emit_object(llvm_mod), llvm_text)]
 
-        with temp_path.open("wb") as out:
-            out.write(object_data)
+        if self.ir.prebuilt_sources:
+            objects.append(self.get_bundle_object(target))
 
+        temp_paths = []
         try:
-            linker = self.linker_cls([temp_path], output_path)
-            linker.link_files()
+            for i, (object_data, llvm_text) in enumerate(built):
+                if llvm_text is not None:
+                    llvm_file = self.output_path.with_suffix(".ll" if i == 0 else f".{i}.ll")
+                    with llvm_file.open("w") as file:
+                        file.write(llvm_text)
+
+                if (temp_path := output_form.with_suffix(".o")).exists():
+                    n = 0
+                    while (temp_path := Path(str(output_form) + f"_{n}").with_suffix(".o")).exists():
+                        n += 1
+                with temp_path.open("wb") as out:
+                    out.write(object_data)
+                temp_paths.append(temp_path)
+
+            with StageTimer.stage("link"):
+                linker = self.linker_cls([*objects, *temp_paths], output_path)
+                linker.link_files()
         finally:
-            temp_path.unlink()
+            for temp_path in temp_paths:
+                temp_path.unlink()
+            MessageHandler.flush_messages()
+
+    def get_bundle_object(self, target: llvm.Target) -> Path:
+        """Return the object file of the std bundle the program's prebuilt sources are from"""
+        if self.std_bundle is None:
+            raise ValueError("The program has prebuilt sources, but no std bundle was set to link them from")
+        if self.std_bundle.triple != target.triple:
+            msg = LinkingError(f"The std bundle was built for {self.std_bundle.triple}, not {target.triple}; "
+                               f"build it again with --build-std-bundle")
+            MessageHandler.handle_message(msg)
             MessageHandler.flush_messages()
+        return self.std_bundle.object_path
+
+    def build_library(self) -> Tuple[bytes, str]:
+        """
+        Compile the code of every source, without a main function, into one object file for other programs to link.
+
+        Returns the object file and the target triple it was compiled for.
+        """
+        target = llvm.Target.from_default_triple()
+
+        machine = self.get_target_machine(target)
+
+        with StageTimer.stage("build LLVM IR"):
+            self.to_llvm(target)
+        llvm_data = self.ir.extensions[LLVMData]
+
+        llvm_mod = self.parse_module(ir.Module("library"), target)
+        for source in self.get_built_sources():
+            llvm_mod.link_in(self.parse_module(llvm_data.source(source).mod, target))
+        self.optimize(llvm_mod, machine)
+        with StageTimer.stage("emit_object"):
+            return machine.emit_object(llvm_mod), target.triple
 
     def run_output(self):
         return_code = CLinker.process_call([self.output_path])
@@ -1,2 +1,4 @@
 from .aize_error import MessageHandler, AizeMessage, ErrorLevel, Reporter, FailFlag, ThrownMessage
 from .aize_source import Position, TextPosition, Source, FileSource, StreamSource
+from .aize_timing import StageTimer, StageStats
+from .aize_files import write_atomic, fingerprint_modules
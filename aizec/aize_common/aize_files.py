@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+
+from aizec.common import *
+
+
+__all__ = ['write_atomic', 'fingerprint_modules']
+
+
+def write_atomic(path: Path, data: bytes):
+    """
+    Write data to path, creating its directory if needed, so that nothing reading path ever sees it partially written.
+
+    The data is written to a temporary file next to path, which then replaces path. Several compiles can share a cache,
+    bundle, or build directory, and each either sees the old file or the whole new one.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+_fingerprints: Dict[Tuple[Path, ...], str] = {}
+
+
+def fingerprint_modules(*dirs: Path) -> str:
+    """
+    Return a hex digest of every Python module in dirs and the directories under them.
+
+    Caches key their entries on this, so that changing the compiler's code means old entries are never looked up
+    again. The modules are only read once per process, since the compiler does not change while it runs.
+    """
+    if dirs not in _fingerprints:
+        digest = hashlib.sha256()
+        for top in dirs:
+            for path in sorted(top.rglob("*.py")):
+                digest.update(f"\0{top.name}/{path.relative_to(top).as_posix()}\0".encode())
+                digest.update(path.read_bytes())
+        _fingerprints[dirs] = digest.hexdigest()
+    return _fingerprints[dirs]
@@ -12,10 +12,16 @@ __all__ = [
 class Source:
     def __init__(self):
         self._lines: List[str] = []
+        self._text: Optional[str] = None
 
     def add_line(self, line: str):
         self._lines.append(line)
 
+    def add_lines_from_text(self):
+        """Register every line of the source's text, for when it is not being scanned"""
+        for line in self.get_text().split("\n"):
+            self.add_line(line)
+
     def get_line(self, index: int) -> str:
         """Return the line indexed by index (starting at 0)"""
         if index < 0:
@@ -34,6 +40,12 @@ class Source:
     def get_stream(self) -> IO:
         raise NotImplementedError()
 
+    def get_text(self) -> str:
+        """Return the full text of this source, reading the whole stream in one call the first time it is needed"""
+        if self._text is None:
+            self._text = self.get_stream().read()
+        return self._text
+
     def get_unique(self) -> Hashable:
         """Return a unique (hashable) identifier suitable for ensuring no source is parsed multiple times"""
         raise NotImplementedError()
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+
+from aizec.common import *
+
+
+__all__ = ['StageTimer', 'StageStats']
+
+
+T = TypeVar('T')
+
+
+class _PeakMemory:
+    """The peak memory of the process, in KiB, which can be reset to the memory in use now"""
+
+    name: str
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def read(self) -> int:
+        raise NotImplementedError()
+
+    def reset(self):
+        raise NotImplementedError()
+
+
+class _PeakResidentMemory(_PeakMemory):
+    """The peak resident memory (VmHWM), on Linux, where writing 5 to /proc/self/clear_refs resets it"""
+
+    name = "resident"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        try:
+            cls().reset()
+            cls().read()
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def read(self) -> int:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+        raise ValueError("No VmHWM in /proc/self/status")
+
+    def reset(self):
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+
+
+class _PeakPythonMemory(_PeakMemory):
+    """The peak memory of the Python heap, traced by tracemalloc, for where the resident memory cannot be reset"""
+
+    name = "python heap"
+
+    def __init__(self):
+        self._started = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+
+    def stop(self):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def read(self) -> int:
+        return tracemalloc.get_traced_memory()[1] // 1024
+
+    def reset(self):
+        tracemalloc.reset_peak()
+
+
+class _Peak:
+    __slots__ = ('kb',)
+
+    def __init__(self, kb: int):
+        self.kb = kb
+
+
+@dataclass
+class StageStats:
+    name: str
+    depth: int
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    peak_memory_kb: Optional[int] = None
+
+
+class StageTimer:
+    """
+    Records the wall time, CPU time, and peak memory of each stage of a compile.
+
+    Stages nest, and a stage entered more than once under the same parent (such as parsing each source) is recorded
+    once, with its times added up. Nothing is recorded until the timer is enabled.
+
+    CPU time is that of the thread in the stage. A stage run on several threads at once adds up the time of each, so
+    its times can be more than the time of the stage it is nested in.
+
+    The peak memory of a stage is the most memory the process used while it ran, over all its calls. It is the peak
+    resident memory where the kernel lets it be reset when a stage starts (Linux), and otherwise the peak of the Python
+    heap, traced with tracemalloc while the timer is enabled. A stage's peak is at least that of the stages nested in
+    it. Memory is process-wide, so a stage run alongside others also counts what they use. Stages recorded by
+    timed_iter have no peak, since their work is interleaved with their parent's.
+    """
+
+    _instance: StageTimer = None
+
+    def __init__(self):
+        self.enabled: bool = False
+        self.stages: Dict[Tuple[str, ...], StageStats] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        self._memory: Optional[_PeakMemory] = None
+        # The peaks of the stages running on any thread, which every reading of the peak memory is added to
+        self._peaks: List[_Peak] = []
+
+    @property
+    def _path(self) -> Tuple[str, ...]:
+        return getattr(self._local, 'path', ())
+
+    @_path.setter
+    def _path(self, path: Tuple[str, ...]):
+        self._local.path = path
+
+    @classmethod
+    def instance(cls) -> StageTimer:
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def enable(cls, enabled: bool = True):
+        timer = cls.instance()
+        timer.enabled = enabled
+        if enabled and timer._memory is None:
+            timer._memory = _PeakResidentMemory() if _PeakResidentMemory.is_available() else _PeakPythonMemory()
+            timer._memory.start()
+        elif not enabled and timer._memory is not None:
+            timer._memory.stop()
+            timer._memory = None
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        return cls.instance().enabled
+
+    @classmethod
+    def reset(cls):
+        timer = cls.instance()
+        timer.stages = {}
+        timer._path = ()
+        timer._peaks = []
+
+    def _register(self, path: Tuple[str, ...]):
+        with self._lock:
+            self.stages.setdefault(path, StageStats(path[-1], len(path) - 1))
+
+    def _update_peaks(self):
+        peak = self._memory.read()
+        for running in self._peaks:
+            running.kb = max(running.kb, peak)
+
+    def _start_peak(self) -> Optional[_Peak]:
+        if self._memory is None:
+            return None
+        with self._lock:
+            # The peak is about to be reset, so the stages already running take it first
+            self._update_peaks()
+            self._memory.reset()
+            peak = _Peak(self._memory.read())
+            self._peaks.append(peak)
+        return peak
+
+    def _end_peak(self, peak: Optional[_Peak]) -> Optional[int]:
+        if peak is None:
+            return None
+        with self._lock:
+            self._update_peaks()
+            self._peaks.remove(peak)
+        return peak.kb
+
+    def _record(self, path: Tuple[str, ...], wall: float, cpu: float, peak_memory: Optional[int] = None):
+        with self._lock:
+            stats = self.stages.get(path)
+            if stats is None:
+                stats = self.stages[path] = StageStats(path[-1], len(path) - 1)
+            stats.calls += 1
+            stats.wall += wall
+            stats.cpu += cpu
+            if peak_memory is not None:
+                stats.peak_memory_kb = max(stats.peak_memory_kb or 0, peak_memory)
+
+    @classmethod
+    @contextmanager
+    def stage(cls, name: str):
+        timer = cls.instance()
+        if not timer.enabled:
+            yield
+            return
+
+        parent_path = timer._path
+        path = timer._path = parent_path + (name,)
+        # Register the stage now, so it is listed before the stages nested in it
+        timer._register(path)
+        peak = timer._start_peak()
+        start_wall, start_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - start_wall, time.thread_time() - start_cpu
+            timer._record(path, wall, cpu, timer._end_peak(peak))
+            timer._path = parent_path
+
+    @classmethod
+    def timed_iter(cls, name: str, iterator: Iterator[T]) -> Iterator[T]:
+        """
+        Record the time spent getting each item from iterator as a stage nested in the current one.
+
+        This is for work that is interleaved with its stage's other work, like scanning the tokens a parser asks for.
+        """
+        timer = cls.instance()
+        if not timer.enabled:
+            return iterator
+        return timer._timed_iter(timer._path + (name,), iterator)
+
+    def _timed_iter(self, path: Tuple[str, ...], iterator: Iterator[T]) -> Iterator[T]:
+        self._register(path)
+        wall = cpu = 0.0
+        try:
+            while True:
+                start_wall, start_cpu = time.perf_counter(), time.thread_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    wall += time.perf_counter() - start_wall
+                    cpu += time.thread_time() - start_cpu
+                yield item
+        finally:
+            self._record(path, wall, cpu)
+
+    @classmethod
+    def in_current_stage(cls, func: Callable[..., T]) -> Callable[..., T]:
+        """Wrap func so the stages it enters, even on another thread, are nested in the current stage"""
+        timer = cls.instance()
+        path = timer._path
+
+        def run(*args, **kwargs) -> T:
+            outer_path = timer._path
+            timer._path = path
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timer._path = outer_path
+
+        return run
+
+    @classmethod
+    def get_stats(cls) -> List[StageStats]:
+        return list(cls.instance().stages.values())
+
+    @classmethod
+    def report(cls, out: IO):
+        memory = cls.instance()._memory
+        peak_header = "Peak RSS (MiB)" if memory is None or memory.name == "resident" else "Peak Heap (MiB)"
+        out.write(f"{'Stage':<40} {'Calls':>7} {'Wall (ms)':>11} {'CPU (ms)':>11} {peak_header:>15}\n")
+        for stats in cls.get_stats():
+            name = "  " * stats.depth + stats.name
+            peak = "-" if stats.peak_memory_kb is None else f"{stats.peak_memory_kb / 1024:.1f}"
+            out.write(f"{name:<40} {stats.calls:>7} {stats.wall * 1000:>11.2f} {stats.cpu * 1000:>11.2f} {peak:>15}\n")
+
+    @classmethod
+    def dump_json(cls, out: IO):
+        timer = cls.instance()
+        stages = [{"path": list(path), **asdict(stats)} for path, stats in timer.stages.items()]
+        memory = None if timer._memory is None else timer._memory.name
+        json.dump({"memory": memory, "stages": stages}, out, indent=2)
@@ -1,2 +1,3 @@
 from .aize_ast import ProgramAST, SourceAST
 from .aize_parser import AizeParser
+from .aize_cache import ParseCache, MemoryParseCache, dump_with_source, load_with_source
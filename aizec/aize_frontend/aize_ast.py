@@ -23,6 +23,21 @@ __all__ = [
 
 
 class ASTVisitor(ABC):
+    _top_level_dispatch: DispatchTable
+    _stmt_dispatch: DispatchTable
+    _expr_dispatch: DispatchTable
+    _type_dispatch: DispatchTable
+    _namespace_dispatch: DispatchTable
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Built once per visitor class, so visiting a node is a dict lookup on its type instead of an isinstance chain
+        cls._top_level_dispatch = DispatchTable(cls, _TOP_LEVEL_METHODS)
+        cls._stmt_dispatch = DispatchTable(cls, _STMT_METHODS)
+        cls._expr_dispatch = DispatchTable(cls, _EXPR_METHODS)
+        cls._type_dispatch = DispatchTable(cls, _TYPE_METHODS)
+        cls._namespace_dispatch = DispatchTable(cls, _NAMESPACE_METHODS)
+
     def __init__(self, program: ProgramAST):
         self.program = program
 
@@ -35,16 +50,11 @@ class ASTVisitor(ABC):
         pass
 
     def visit_top_level(self, top_level: TopLevelAST):
-        if isinstance(top_level, FunctionAST):
-            return self.visit_function(top_level)
-        elif isinstance(top_level, StructAST):
-            return self.visit_struct(top_level)
-        elif isinstance(top_level, ImportAST):
-            return self.visit_import(top_level)
-        elif isinstance(top_level, UnionAST):
-            return self.visit_union(top_level)
-        else:
-            raise TypeError(f"Expected a top-level node, got {top_level}")
+        try:
+            visit = self._top_level_dispatch[top_level.__class__]
+        except KeyError:
+            raise TypeError(f"Expected a top-level node, got {top_level}") from None
+        return visit(self, top_level)
 
     @abstractmethod
     def visit_union(self, union: UnionAST):
@@ -83,20 +93,11 @@ class ASTVisitor(ABC):
         pass
 
     def visit_stmt(self, stmt: StmtAST):
-        if isinstance(stmt, ReturnStmtAST):
-            return self.visit_return(stmt)
-        elif isinstance(stmt, IfStmtAST):
-            return self.visit_if(stmt)
-        elif isinstance(stmt, BlockStmtAST):
-            return self.visit_block(stmt)
-        elif isinstance(stmt, VarDeclStmtAST):
-            return self.visit_var_decl(stmt)
-        elif isinstance(stmt, ExprStmtAST):
-            return self.visit_expr_stmt(stmt)
-        elif isinstance(stmt, WhileStmtAST):
-            return self.visit_while(stmt)
-        else:
-            raise TypeError(f"Expected a stmt node, got {stmt}")
+        try:
+            visit = self._stmt_dispatch[stmt.__class__]
+        except KeyError:
+            raise TypeError(f"Expected a stmt node, got {stmt}") from None
+        return visit(self, stmt)
 
     @abstractmethod
     def visit_expr_stmt(self, stmt: ExprStmtAST):
@@ -123,38 +124,11 @@ class ASTVisitor(ABC):
         pass
 
     def visit_expr(self, expr: ExprAST):
-        if isinstance(expr, IntLiteralAST):
-            return self.visit_int(expr)
-        elif isinstance(expr, IntrinsicExprAST):
-            return self.visit_intrinsic(expr)
-        elif isinstance(expr, NewExprAST):
-            return self.visit_new(expr)
-        elif isinstance(expr, CallExprAST):
-            return self.visit_call(expr)
-        elif isinstance(expr, GetVarExprAST):
-            return self.visit_get_var(expr)
-        elif isinstance(expr, SetVarExprAST):
-            return self.visit_set_var(expr)
-        elif isinstance(expr, GetAttrExprAST):
-            return self.visit_get_attr(expr)
-        elif isinstance(expr, SetAttrExprAST):
-            return self.visit_set_attr(expr)
-        elif isinstance(expr, CompareExprAST):
-            return self.visit_cmp(expr)
-        elif isinstance(expr, ArithmeticExprAST):
-            return self.visit_arith(expr)
-        elif isinstance(expr, NegExprAST):
-            return self.visit_neg(expr)
-        elif isinstance(expr, GetStaticAttrExprAST):
-            return self.visit_static_attr_expr(expr)
-        elif isinstance(expr, LambdaExprAST):
-            return self.visit_lambda(expr)
-        elif isinstance(expr, TupleExprAST):
-            return self.visit_tuple(expr)
-        elif isinstance(expr, IsExprAST):
-            return self.visit_is(expr)
-        else:
-            raise TypeError(f"Expected a expr node, got {expr}")
+        try:
+            visit = self._expr_dispatch[expr.__class__]
+        except KeyError:
+            raise TypeError(f"Expected a expr node, got {expr}") from None
+        return visit(self, expr)
 
     @abstractmethod
     def visit_is(self, is_: IsExprAST):
@@ -217,10 +191,11 @@ class ASTVisitor(ABC):
         pass
 
     def visit_namespace(self, namespace: ExprAST):
-        if isinstance(namespace, GetVarExprAST):
-            return self.visit_get_namespace(namespace)
-        else:
+        try:
+            visit = self._namespace_dispatch[namespace.__class__]
+        except KeyError:
             return self.handle_malformed_namespace(namespace)
+        return visit(self, namespace)
 
     @abstractmethod
     def visit_get_namespace(self, namespace: GetVarExprAST):
@@ -235,16 +210,13 @@ class ASTVisitor(ABC):
         pass
 
     def visit_type(self, type: ExprAST):
-        if isinstance(type, GetVarExprAST):
-            return self.visit_get_type(type)
-        elif isinstance(type, LambdaExprAST):
-            return self.visit_func_type(type)
-        elif isinstance(type, TupleExprAST):
-            return self.visit_tuple_type(type)
-        elif type is None:
+        if type is None:
             return self.visit_no_type()
-        else:
+        try:
+            visit = self._type_dispatch[type.__class__]
+        except KeyError:
             return self.handle_malformed_type(type)
+        return visit(self, type)
 
     @abstractmethod
     def visit_no_type(self):
@@ -268,6 +240,8 @@ class ASTVisitor(ABC):
 
 
 class NodeAST:
+    __slots__ = ()
+
     def __eq__(self, other):
         return other is self
 
@@ -276,12 +250,16 @@ class NodeAST:
 
 
 class ProgramAST(NodeAST):
+    __slots__ = ('sources',)
+
     def __init__(self, sources: List[SourceAST]):
         super().__init__()
         self.sources = sources
 
 
 class SourceAST(NodeAST):
+    __slots__ = ('source', 'top_levels')
+
     def __init__(self, source: Source, top_levels: List[TopLevelAST]):
         super().__init__()
 
@@ -294,15 +272,19 @@ class SourceAST(NodeAST):
 
 
 class TextAST(NodeAST):
+    __slots__ = ('pos',)
+
     def __init__(self, pos: Position):
         self.pos = pos
 
 
 class TopLevelAST(TextAST):
-    pass
+    __slots__ = ()
 
 
 class StructAST(TopLevelAST):
+    __slots__ = ('name', 'body')
+
     def __init__(self, name: str, body: List[AggregateStmtAST], pos: Position):
         super().__init__(pos)
 
@@ -311,6 +293,8 @@ class StructAST(TopLevelAST):
 
 
 class UnionAST(TopLevelAST):
+    __slots__ = ('name', 'variants', 'funcs')
+
     def __init__(self, name: str, variants: List[VariantAST], funcs: List[AggregateFunctionAST], pos: Position):
         super().__init__(pos)
 
@@ -320,6 +304,8 @@ class UnionAST(TopLevelAST):
 
 
 class VariantAST(TopLevelAST):
+    __slots__ = ('name', 'type')
+
     def __init__(self, name: str, type: ExprAST, pos: Position):
         super().__init__(pos)
 
@@ -328,6 +314,8 @@ class VariantAST(TopLevelAST):
 
 
 class ImportAST(TopLevelAST):
+    __slots__ = ('anchor', 'path', 'source')
+
     def __init__(self, anchor: str, path: Path, pos: Position):
         super().__init__(pos)
 
@@ -337,6 +325,8 @@ class ImportAST(TopLevelAST):
 
 
 class FunctionAST(TopLevelAST):
+    __slots__ = ('name', 'params', 'ret', 'body', 'attributes')
+
     def __init__(self, name: str, params: List[ParamAST], ret: ExprAST, body: List[StmtAST], attributes: List[FunctionAttributeAST], pos: Position):
         super().__init__(pos)
 
@@ -348,10 +338,12 @@ class FunctionAST(TopLevelAST):
 
 
 class AggregateStmtAST(TextAST):
-    pass
+    __slots__ = ()
 
 
 class AggregateFieldAST(AggregateStmtAST):
+    __slots__ = ('name', 'annotation')
+
     def __init__(self, name: str, annotation: ExprAST, pos: Position):
         super().__init__(pos)
 
@@ -360,6 +352,8 @@ class AggregateFieldAST(AggregateStmtAST):
 
 
 class AggregateFunctionAST(AggregateStmtAST):
+    __slots__ = ('name', 'params', 'ret', 'body')
+
     def __init__(self, name: str, params: List[ParamAST], ret: ExprAST, attrs: List[FunctionAttributeAST], body: List[StmtAST], pos: Position):
         super().__init__(pos)
 
@@ -371,6 +365,8 @@ class AggregateFunctionAST(AggregateStmtAST):
 
 
 class ParamAST(TextAST):
+    __slots__ = ('name', 'annotation')
+
     def __init__(self, name: str, annotation: Optional[ExprAST], pos: Position):
         super().__init__(pos)
 
@@ -379,16 +375,20 @@ class ParamAST(TextAST):
 
 
 class FunctionAttributeAST(TextAST):
+    __slots__ = ('name',)
+
     def __init__(self, name: str, pos: Position):
         super().__init__(pos)
         self.name = name
 
 
 class StmtAST(TextAST):
-    pass
+    __slots__ = ()
 
 
 class IfStmtAST(StmtAST):
+    __slots__ = ('cond', 'then_do', 'else_do')
+
     def __init__(self, cond: ExprAST, then_do: StmtAST, else_do: StmtAST, pos: Position):
         super().__init__(pos)
 
@@ -398,6 +398,8 @@ class IfStmtAST(StmtAST):
 
 
 class WhileStmtAST(StmtAST):
+    __slots__ = ('cond', 'do')
+
     def __init__(self, cond: ExprAST, do: StmtAST, pos: Position):
         super().__init__(pos)
 
@@ -406,6 +408,8 @@ class WhileStmtAST(StmtAST):
 
 
 class BlockStmtAST(StmtAST):
+    __slots__ = ('body',)
+
     def __init__(self, body: List[StmtAST], pos: Position):
         super().__init__(pos)
 
@@ -413,6 +417,8 @@ class BlockStmtAST(StmtAST):
 
 
 class VarDeclStmtAST(StmtAST):
+    __slots__ = ('name', 'annotation', 'value')
+
     def __init__(self, name: str, annotation: ExprAST, value: ExprAST, pos: Position):
         super().__init__(pos)
 
@@ -422,6 +428,8 @@ class VarDeclStmtAST(StmtAST):
 
 
 class ReturnStmtAST(StmtAST):
+    __slots__ = ('value',)
+
     def __init__(self, value: ExprAST, pos: Position):
         super().__init__(pos)
 
@@ -429,6 +437,8 @@ class ReturnStmtAST(StmtAST):
 
 
 class ExprStmtAST(StmtAST):
+    __slots__ = ('value',)
+
     def __init__(self, value: ExprAST, pos: Position):
         super().__init__(pos)
 
@@ -436,10 +446,12 @@ class ExprStmtAST(StmtAST):
 
 
 class ExprAST(TextAST):
-    pass
+    __slots__ = ()
 
 
 class LambdaExprAST(ExprAST):
+    __slots__ = ('params', 'body')
+
     def __init__(self, params: List[ParamAST], body: ExprAST, pos: Position):
         super().__init__(pos)
 
@@ -448,6 +460,8 @@ class LambdaExprAST(ExprAST):
 
 
 class TupleExprAST(ExprAST):
+    __slots__ = ('items',)
+
     def __init__(self, items: List[ExprAST], pos: Position):
         super().__init__(pos)
 
@@ -455,6 +469,8 @@ class TupleExprAST(ExprAST):
 
 
 class IsExprAST(ExprAST):
+    __slots__ = ('expr', 'variant', 'to_var')
+
     def __init__(self, expr: ExprAST, variant: str, to_var: str, pos: Position):
         super().__init__(pos)
 
@@ -464,6 +480,8 @@ class IsExprAST(ExprAST):
 
 
 class GetVarExprAST(ExprAST):
+    __slots__ = ('var',)
+
     def __init__(self, var: str, pos: Position):
         super().__init__(pos)
 
@@ -471,6 +489,8 @@ class GetVarExprAST(ExprAST):
 
 
 class SetVarExprAST(ExprAST):
+    __slots__ = ('var', 'value')
+
     def __init__(self, var: str, value: ExprAST, pos: Position):
         super().__init__(pos)
 
@@ -479,6 +499,8 @@ class SetVarExprAST(ExprAST):
 
 
 class GetAttrExprAST(ExprAST):
+    __slots__ = ('obj', 'attr')
+
     def __init__(self, obj: ExprAST, attr: str, pos: Position):
         super().__init__(pos)
 
@@ -487,6 +509,8 @@ class GetAttrExprAST(ExprAST):
 
 
 class SetAttrExprAST(ExprAST):
+    __slots__ = ('obj', 'attr', 'value')
+
     def __init__(self, obj: ExprAST, attr: str, value: ExprAST, pos: Position):
         super().__init__(pos)
 
@@ -497,6 +521,8 @@ class SetAttrExprAST(ExprAST):
 
 # region Binary
 class BinaryExprAST(ExprAST):
+    __slots__ = ('op', 'left', 'right')
+
     def __init__(self, op: str, left: ExprAST, right: ExprAST, pos: Position):
         super().__init__(pos)
 
@@ -506,16 +532,18 @@ class BinaryExprAST(ExprAST):
 
 
 class CompareExprAST(BinaryExprAST):
-    pass
+    __slots__ = ()
 
 
 class ArithmeticExprAST(BinaryExprAST):
-    pass
+    __slots__ = ()
 # endregion
 
 
 # region Unary
 class UnaryExprAST(ExprAST):
+    __slots__ = ('right',)
+
     def __init__(self, right: ExprAST, pos: Position):
         super().__init__(pos)
 
@@ -523,19 +551,21 @@ class UnaryExprAST(ExprAST):
 
 
 class InvExprAST(UnaryExprAST):
-    pass
+    __slots__ = ()
 
 
 class NegExprAST(UnaryExprAST):
-    pass
+    __slots__ = ()
 
 
 class NotExprAST(UnaryExprAST):
-    pass
+    __slots__ = ()
 # endregion
 
 
 class GetStaticAttrExprAST(ExprAST):
+    __slots__ = ('namespace', 'attr')
+
     def __init__(self, namespace: ExprAST, attr: str, pos: Position):
         super().__init__(pos)
 
@@ -544,6 +574,8 @@ class GetStaticAttrExprAST(ExprAST):
 
 
 class NewExprAST(ExprAST):
+    __slots__ = ('type', 'args')
+
     def __init__(self, type: GetVarExprAST, args: List[ExprAST], pos: Position):
         super().__init__(pos)
 
@@ -552,6 +584,8 @@ class NewExprAST(ExprAST):
 
 
 class CallExprAST(ExprAST):
+    __slots__ = ('left', 'args')
+
     def __init__(self, left: ExprAST, args: List[ExprAST], pos: Position):
         super().__init__(pos)
 
@@ -560,6 +594,8 @@ class CallExprAST(ExprAST):
 
 
 class IntrinsicExprAST(ExprAST):
+    __slots__ = ('name', 'args')
+
     def __init__(self, name: str, args: List[ExprAST], pos: Position):
         super().__init__(pos)
 
@@ -568,6 +604,8 @@ class IntrinsicExprAST(ExprAST):
 
 
 class IntLiteralAST(ExprAST):
+    __slots__ = ('num',)
+
     def __init__(self, num: int, pos: Position):
         super().__init__(pos)
 
@@ -575,7 +613,51 @@ class IntLiteralAST(ExprAST):
 
 
 class StrLiteralAST(ExprAST):
+    __slots__ = ('s',)
+
     def __init__(self, s: str, pos: Position):
         super().__init__(pos)
 
         self.s = s
+
+
+# The visitor method for each kind of node, by the ASTVisitor method that dispatches to it
+_TOP_LEVEL_METHODS: Dict[type, str] = {
+    FunctionAST: 'visit_function',
+    StructAST: 'visit_struct',
+    ImportAST: 'visit_import',
+    UnionAST: 'visit_union',
+}
+_STMT_METHODS: Dict[type, str] = {
+    ReturnStmtAST: 'visit_return',
+    IfStmtAST: 'visit_if',
+    BlockStmtAST: 'visit_block',
+    VarDeclStmtAST: 'visit_var_decl',
+    ExprStmtAST: 'visit_expr_stmt',
+    WhileStmtAST: 'visit_while',
+}
+_EXPR_METHODS: Dict[type, str] = {
+    IntLiteralAST: 'visit_int',
+    IntrinsicExprAST: 'visit_intrinsic',
+    NewExprAST: 'visit_new',
+    CallExprAST: 'visit_call',
+    GetVarExprAST: 'visit_get_var',
+    SetVarExprAST: 'visit_set_var',
+    GetAttrExprAST: 'visit_get_attr',
+    SetAttrExprAST: 'visit_set_attr',
+    CompareExprAST: 'visit_cmp',
+    ArithmeticExprAST: 'visit_arith',
+    NegExprAST: 'visit_neg',
+    GetStaticAttrExprAST: 'visit_static_attr_expr',
+    LambdaExprAST: 'visit_lambda',
+    TupleExprAST: 'visit_tuple',
+    IsExprAST: 'visit_is',
+}
+_TYPE_METHODS: Dict[type, str] = {
+    GetVarExprAST: 'visit_get_type',
+    LambdaExprAST: 'visit_func_type',
+    TupleExprAST: 'visit_tuple_type',
+}
+_NAMESPACE_METHODS: Dict[type, str] = {
+    GetVarExprAST: 'visit_get_namespace',
+}
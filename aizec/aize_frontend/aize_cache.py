@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import pickle
+from collections import OrderedDict
+
+from aizec.common import *
+from aizec.aize_common import MessageHandler, Source, write_atomic, fingerprint_modules
+
+from .aize_ast import SourceAST
+
+
+__all__ = ['ParseCache', 'MemoryParseCache', 'dump_with_source', 'load_with_source']
+
+
+class _SourcePickler(pickle.Pickler):
+    def __init__(self, file: IO, source: Source):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.source = source
+
+    def persistent_id(self, obj: Any) -> Optional[str]:
+        if obj is self.source:
+            return "source"
+        return None
+
+
+class _SourceUnpickler(pickle.Unpickler):
+    def __init__(self, file: IO, source: Source):
+        super().__init__(file)
+        self.source = source
+
+    def persistent_load(self, pid: str) -> Source:
+        if pid == "source":
+            return self.source
+        raise pickle.UnpicklingError(f"Unknown persistent id {pid!r}")
+
+
+def dump_with_source(source: Source, obj: Any) -> bytes:
+    """Pickle obj, which may refer to source, so that load_with_source can swap in another Source for the same file"""
+    buffer = io.BytesIO()
+    _SourcePickler(buffer, source).dump(obj)
+    return buffer.getvalue()
+
+
+def load_with_source(source: Source, data: bytes) -> Any:
+    return _SourceUnpickler(io.BytesIO(data), source).load()
+
+
+class ParseCache:
+    """
+    Stores the SourceAST parsed from each source in a directory, so unchanged sources are not parsed again.
+
+    Entries are keyed by a hash of the source's text and of the frontend's own code, so editing either a source or the
+    parser means the old entries are simply never looked up again.
+    """
+
+    SUFFIX = ".ast"
+
+    def __init__(self, cache_dir: Optional[Path]):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def compiler_fingerprint() -> str:
+        """Return a digest of every module that decides what a parsed SourceAST looks like"""
+        aizec_dir = Path(__file__).absolute().parent.parent
+        return fingerprint_modules(aizec_dir / "aize_frontend", aizec_dir / "aize_common")
+
+    def get_key(self, source: Source) -> str:
+        digest = hashlib.sha256(self.compiler_fingerprint().encode())
+        digest.update(source.get_text().encode())
+        return digest.hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / (key + self.SUFFIX)
+
+    def _read_entry(self, key: str) -> Optional[bytes]:
+        try:
+            return self._entry_path(key).read_bytes()
+        except OSError:
+            return None
+
+    def _write_entry(self, key: str, data: bytes):
+        # Caching is best effort, so a cache directory which cannot be written to is ignored
+        try:
+            write_atomic(self._entry_path(key), data)
+        except OSError:
+            pass
+
+    def load(self, source: Source) -> Optional[SourceAST]:
+        """Return the cached SourceAST for source, or None if there isn't a usable one"""
+        data = self._read_entry(self.get_key(source))
+        if data is None:
+            return None
+        try:
+            source_ast = load_with_source(source, data)
+        except (EOFError, pickle.UnpicklingError, AttributeError, ImportError, RecursionError):
+            return None
+        if not isinstance(source_ast, SourceAST):
+            return None
+
+        # The lines are normally registered while scanning, and error messages need them
+        source.add_lines_from_text()
+        return source_ast
+
+    def store(self, source: Source, source_ast: SourceAST):
+        try:
+            data = dump_with_source(source, source_ast)
+        except (pickle.PicklingError, TypeError, AttributeError, RecursionError):
+            return
+        self._write_entry(self.get_key(source), data)
+
+    def parse(self, source: Source, parse: Callable[[Source], SourceAST]) -> SourceAST:
+        """Return the cached SourceAST for source, parsing it with parse and caching the result if needed"""
+        source_ast = self.load(source)
+        if source_ast is None:
+            message_count = len(MessageHandler.instance().messages)
+            source_ast = parse(source)
+            # Sources with errors are reparsed every time so their messages are always reported
+            if len(MessageHandler.instance().messages) == message_count and not getattr(source, 'has_errors', False):
+                self.store(source, source_ast)
+        return source_ast
+
+
+class MemoryParseCache(ParseCache):
+    """A ParseCache that keeps the most recently used entries in memory instead of in a directory"""
+
+    def __init__(self, max_entries: int = 1024):
+        super().__init__(None)
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+
+    def _read_entry(self, key: str) -> Optional[bytes]:
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    def _write_entry(self, key: str, data: bytes):
+        self._entries[key] = data
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import re
+from array import array
+from bisect import bisect_right
+from sys import intern
+
 from aizec.common import *
-from aizec.aize_common import AizeMessage, MessageHandler, ErrorLevel, Source, Position
+from aizec.aize_common import AizeMessage, MessageHandler, ErrorLevel, Source, Position, StageTimer
 
 from .aize_ast import *
 
 
-BASIC_TOKENS = Trie.from_list([
+BASIC_TOKEN_LIST = [
     "+", "+=",
     "-", "-=", "->",
     "/", "//",
@@ -20,7 +25,9 @@ BASIC_TOKENS = Trie.from_list([
     "(", ")", "[", "]", "{", "}",
     "=", ",", ".", ":", ";",
     "@", "::"
-])
+]
+
+BASIC_TOKENS = Trie.from_list(BASIC_TOKEN_LIST)
 
 BASIC_START = list(BASIC_TOKENS.children.keys())
 
@@ -50,38 +57,191 @@ class ParseError(AizeMessage):
         return f"ParseError({self.msg!r}, {self.pos!r})"
 
 
+TOKEN_KINDS: List[str] = []
+"""The type of every token kind, indexed by the kind's interned id"""
+
+_TOKEN_KIND_IDS: Dict[str, int] = {}
+
+
+def intern_kind(type: str) -> int:
+    """Return the small integer id standing for the token type, assigning a new one the first time a type is seen"""
+    try:
+        return _TOKEN_KIND_IDS[type]
+    except KeyError:
+        kind = _TOKEN_KIND_IDS[type] = len(TOKEN_KINDS)
+        TOKEN_KINDS.append(type)
+        return kind
+
+
 class Token:
+    """A view of a single token in a TokenStream, which creates its text and Position only when asked for them"""
+
+    __slots__ = ('stream', 'index', '_text', '_pos')
+
     DECIMAL_TYPE = "decimal-number"
     STRING_TYPE = "string-literal"
     IDENTIFIER_TYPE = "identifier"
+    EOF_TYPE = "<eof>"
 
-    def __init__(self, text: str, type: str, source: Source, line_no: int, columns: Tuple[int, int]):
-        self.text = text
-        self.type = type
+    def __init__(self, stream: TokenStream, index: int):
+        self.stream = stream
+        self.index = index
 
-        self.source = source
-        self.line_no = line_no
-        self.columns = columns
+        self._text: Optional[str] = None
+        self._pos: Optional[Position] = None
+
+    @property
+    def kind(self) -> int:
+        return self.stream.kinds[self.index]
 
-    def pos(self):
-        return Position.new_text(self.source, self.line_no, self.columns, False)
+    @property
+    def type(self) -> str:
+        return TOKEN_KINDS[self.stream.kinds[self.index]]
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.stream.text[self.stream.starts[self.index]:self.stream.ends[self.index]]
+            if self.stream.kinds[self.index] == IDENTIFIER_KIND:
+                # Names are compared and hashed by every lookup, which is quicker for interned strings
+                self._text = intern(self._text)
+        return self._text
+
+    @property
+    def source(self) -> Source:
+        return self.stream.source
+
+    @property
+    def line_no(self) -> int:
+        return self.stream.line_nos[self.index]
+
+    @property
+    def columns(self) -> Tuple[int, int]:
+        return self.stream.start_columns[self.index], self.stream.end_columns[self.index]
+
+    def pos(self) -> Position:
+        if self._pos is None:
+            self._pos = Position.new_text(self.source, self.line_no, self.columns, False)
+        return self._pos
 
     def __repr__(self):
         return f"Token({self.text!r}, {self.type!r})"
 
 
+for _type in [Token.EOF_TYPE, Token.DECIMAL_TYPE, Token.STRING_TYPE, Token.IDENTIFIER_TYPE, *BASIC_TOKEN_LIST, *KEYWORDS]:
+    intern_kind(_type)
+del _type
+
+
+class TokenStream:
+    """
+    The tokens of a Source, stored as parallel arrays of kinds, offsets, line numbers and columns.
+
+    Tokens are scanned as the stream is indexed, so scanning errors are still reported as the parser reaches them.
+    Indexing past the end gives the final <eof> token, and a stream can be indexed from the start again to replay it.
+    """
+
+    def __init__(self, source: Source, text: str, scanning: Iterator[Any] = None):
+        self.source = source
+        self.text = text
+
+        self.kinds = array('I')
+        self.starts = array('I')
+        self.ends = array('I')
+        self.line_nos = array('I')
+        self.start_columns = array('I')
+        self.end_columns = array('I')
+
+        self._scanning = scanning
+
+    def append(self, kind: int, start: int, end: int, line_no: int, start_column: int, end_column: int) -> int:
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.line_nos.append(line_no)
+        self.start_columns.append(start_column)
+        self.end_columns.append(end_column)
+        return len(self.kinds) - 1
+
+    def pop(self):
+        for column in (self.kinds, self.starts, self.ends, self.line_nos, self.start_columns, self.end_columns):
+            column.pop()
+
+    def is_scanned(self) -> bool:
+        return self._scanning is None
+
+    def scan_all(self) -> TokenStream:
+        while self._scanning is not None:
+            self._scan_next()
+        return self
+
+    def _scan_next(self):
+        try:
+            next(self._scanning)
+        except StopIteration:
+            self._scanning = None
+
+    def __len__(self):
+        return len(self.scan_all().kinds)
+
+    def __getitem__(self, index: int) -> Token:
+        while index >= len(self.kinds) and self._scanning is not None:
+            self._scan_next()
+        return Token(self, min(index, len(self.kinds) - 1))
+
+    def __iter__(self) -> Iterator[Token]:
+        index = 0
+        while True:
+            token = self[index]
+            yield token
+            if token.kind == EOF_KIND:
+                break
+            index += 1
+
+
+EOF_KIND = intern_kind(Token.EOF_TYPE)
+DECIMAL_KIND = intern_kind(Token.DECIMAL_TYPE)
+STRING_KIND = intern_kind(Token.STRING_TYPE)
+IDENTIFIER_KIND = intern_kind(Token.IDENTIFIER_TYPE)
+
+
 class SourceLoader:
+    """
+    Reads a Source in a single call and serves its characters by offset.
+
+    The lines of the source are indexed by their starting offsets and registered with the Source up front, so the
+    scanner never has to grow any strings while it walks the text.
+    """
+
     def __init__(self, source: Source):
         self.source = source
-        self.stream = source.get_stream()
 
-        self._loaded: str = ""
+        self.text: str = source.get_text()
+        self.line_offsets: List[int] = [0]
+        """The offset of the first character of each line, so line_offsets[n] is where the (n+1)th line starts"""
+
+        find = self.text.find
+        newline = find("\n")
+        while newline != -1:
+            self.line_offsets.append(newline + 1)
+            newline = find("\n", newline + 1)
+
+        for start, end in zip(self.line_offsets, self.line_offsets[1:]):
+            source.add_line(self.text[start:end-1])
+        source.add_line(self.text[self.line_offsets[-1]:])
+
+        self._length = len(self.text)
+        self._offset = 0
         self._is_done = False
-        self._line: str = ""
 
     @property
-    def _last(self):
-        return self._loaded[-1]
+    def offset(self) -> int:
+        """The number of characters that have been consumed with advance()"""
+        return self._offset
+
+    def line_of(self, offset: int) -> int:
+        """Return the (1-indexed) line number the character at offset is on"""
+        return bisect_right(self.line_offsets, offset)
 
     def is_done(self) -> bool:
         return self._is_done
@@ -89,25 +249,17 @@ class SourceLoader:
     def advance(self):
         if self._is_done:
             return
-        char = self.stream.read(1)
-        if char == '':
-            self.source.add_line(self._line)
+        self._offset += 1
+        if self._offset >= self._length:
             self._is_done = True
-        else:
-            if char == '\n':
-                self.source.add_line(self._line)
-                self._line = ""
-            else:
-                self._line += char
-            self._loaded += char
 
     def get_char(self, index: int):
-        while index >= len(self._loaded) and not self._is_done:
-            self.advance()
+        if index >= self._length:
+            self._is_done = True
         if self._is_done:
             return "\0"
         else:
-            return self._loaded[index]
+            return self.text[index]
 
 
 class Scanner:
@@ -120,11 +272,15 @@ class Scanner:
         self.line_index = 1
         """1-indexed position on the line (1 means self.curr is the first character of the line)"""
 
-        self._building_tokens: List[str] = []
+        self.tokens = TokenStream(source, self.loader.text, StageTimer.timed_iter("scan", self.scan()))
+
+    @classmethod
+    def scan_tokens(cls, source: Source) -> TokenStream:
+        return cls(source).tokens
 
     @classmethod
     def scan_source(cls, source: Source) -> Iterator[Token]:
-        scanner = Scanner(source)
+        scanner = cls(source)
         return scanner.iter_tokens()
 
     # region utility methods
@@ -136,8 +292,6 @@ class Scanner:
         return self.loader.get_char(self.index)
 
     def advance(self):
-        for i in range(len(self._building_tokens)):
-            self._building_tokens[i] += self.curr
         self.loader.advance()
         if not self.is_done():
             self.index += 1
@@ -149,7 +303,7 @@ class Scanner:
                 trie = BASIC_TOKENS.children[self.curr]
                 self.advance()
                 while self.curr in trie.children:
-                    trie = BASIC_TOKENS.children[self.curr]
+                    trie = trie.children[self.curr]
                     self.advance()
                 if not trie.is_leaf:
                     raise Exception("Token is not conclusive")
@@ -159,64 +313,79 @@ class Scanner:
 
     @contextmanager
     def start_token(self, type: Union[str, None] = None):
-        self._building_tokens.append("")
+        start = self.loader.offset
         start_line_no = self.line_no
         start_line_index = self.line_index
 
         token = Token.__new__(Token)
         yield token
 
-        text = self._building_tokens.pop()
+        end = self.loader.offset
         if type is None:
-            type = text
-        end_line_no = self.line_no
-        end_line_index = self.line_index
-
-        token.__init__(text, type, self.source, start_line_no, (start_line_index, end_line_index))
+            type = self.loader.text[start:end]
+        elif type == Token.IDENTIFIER_TYPE and self.loader.text[start:end] in KEYWORDS:
+            type = self.loader.text[start:end]
+
+        index = self.tokens.append(intern_kind(type), start, end, start_line_no, start_line_index, self.line_index)
+        token.__init__(self.tokens, index)
+
+    def drop_token(self, token: Token) -> Position:
+        """Remove the token scanned last, which must be token, from the stream and return its Position"""
+        pos = token.pos()
+        self.tokens.pop()
+        return pos
     # endregion
 
     def iter_tokens(self) -> Iterator[Token]:
+        index = 0
+        while True:
+            yield self.tokens[index]
+            index += 1
+
+    def scan(self) -> Iterator[None]:
+        """Append the tokens of the source to self.tokens, yielding after each one"""
         while not self.is_done():
             token = self.match_basic()
             if token:
-                yield token
+                yield
             else:
                 if self.curr in "0123456789":
-                    with self.start_token(Token.DECIMAL_TYPE) as token:
+                    with self.start_token(Token.DECIMAL_TYPE):
                         while self.curr in "0123456789":
                             self.advance()
-                    yield token
+                    yield
                 elif self.curr in IDENT_START:
-                    with self.start_token(Token.IDENTIFIER_TYPE) as token:
+                    with self.start_token(Token.IDENTIFIER_TYPE):
                         while self.curr in IDENT:
                             self.advance()
-                    if token.text in KEYWORDS:
-                        token.type = token.text
-                    yield token
+                    yield
                 elif self.curr == "\"":
                     with self.start_token(Token.STRING_TYPE) as token:
                         self.advance()
                         while self.curr != "\"":
                             if self.curr == "\\":
                                 self.advance()
-                            if self.curr == "\n":
-                                # TODO ERROR REPORTING
-                                assert False
+                            if self.curr == "\n" or self.is_done():
+                                is_terminated = False
+                                break
                             self.advance()
-                        if self.is_done():
-                            # TODO ERROR REPORTING
-                            assert False
-                        self.advance()
-                    yield token
+                        else:
+                            is_terminated = True
+                            self.advance()
+                    if is_terminated:
+                        yield
+                    else:
+                        MessageHandler.handle_message(ParseError("Unterminated string literal", self.drop_token(token)))
                 elif self.curr == "#":
                     with self.start_token("<comment>") as token:
                         self.advance()
-                        at_line_end = self.curr == '\n'
-                        if self.curr in (" ", "\n", "\0"):
+                        is_comment = self.curr in (" ", "\n", "\0")
+                        if is_comment:
                             while self.curr != '\n' and not self.is_done():
                                 self.advance()
-                            continue
-                    MessageHandler.handle_message(ParseError(f"Comment must be followed by a space or newline", token.pos()))
+                    pos = self.drop_token(token)
+                    if not is_comment:
+                        MessageHandler.handle_message(ParseError(f"Comment must be followed by a space or newline", pos))
                 elif self.curr == '\n':
                     self.advance()
                     self.line_no += 1
@@ -231,14 +400,98 @@ class Scanner:
                     with self.start_token("<unexpected characters>") as token:
                         while self.curr not in TOKENIZE_ABLE and not self.is_done():
                             self.advance()
-                    if len(token.text) == 1:
-                        MessageHandler.handle_message(ParseError(f"Cannot tokenize character '{token.text!s}'", token.pos()))
-                    elif len(token.text) > 1:
-                        MessageHandler.handle_message(ParseError(f"Cannot tokenize characters '{token.text!s}'", token.pos()))
+                    text = token.text
+                    pos = self.drop_token(token)
+                    if len(text) == 1:
+                        MessageHandler.handle_message(ParseError(f"Cannot tokenize character '{text!s}'", pos))
+                    elif len(text) > 1:
+                        MessageHandler.handle_message(ParseError(f"Cannot tokenize characters '{text!s}'", pos))
                     else:
                         raise ValueError(self.curr)
-        while True:
-            yield Token('<eof>', '<eof>', self.source, self.line_no, (self.line_index, self.line_index))
+        end = self.loader.offset
+        self.tokens.append(EOF_KIND, end, end, self.line_no, self.line_index, self.line_index)
+
+
+class RegexScanner(Scanner):
+    """
+    A Scanner that matches each token with a single compiled pattern instead of walking the source one character at a
+    time. It produces the same tokens, positions, and errors as Scanner.
+    """
+
+    TOKEN_PATTERN = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in [
+        ("basic", "|".join(re.escape(basic) for basic in sorted(BASIC_TOKEN_LIST, key=len, reverse=True))),
+        ("decimal", "[0-9]+"),
+        ("identifier", f"[{IDENT_START}][{IDENT}]*"),
+        ("string", r'"(?:[^"\\\n]|\\[^\n])*"'),
+        ("unterminated_string", r'"(?:[^"\\\n]|\\[^\n])*\\?'),
+        ("comment", r"#(?=[ \n\0]|\Z)[^\n]*"),
+        ("bad_comment", "#"),
+        ("newline", r"\n"),
+        ("whitespace", r"[ \t]+"),
+        ("null", r"\0"),
+        ("unexpected", f"[^{re.escape(TOKENIZE_ABLE)}]+"),
+    ]))
+
+    def __init__(self, source: Source):
+        super().__init__(source)
+
+        self._line_start = 0
+        """The offset of the first character of the current line"""
+
+    def column(self, offset: int) -> int:
+        """Return the column Scanner would report for the character at offset on the current line"""
+        column = offset - self._line_start + 1
+        # Scanner stops counting columns when it advances onto the end of the text
+        if offset == len(self.loader.text) and self._line_start < offset:
+            column -= 1
+        return column
+
+    def add_token(self, kind: int, start: int, end: int):
+        self.tokens.append(kind, start, end, self.line_no, self.column(start), self.column(end))
+
+    def make_pos(self, start: int, end: int) -> Position:
+        return Position.new_text(self.source, self.line_no, (self.column(start), self.column(end)), False)
+
+    def scan(self) -> Iterator[None]:
+        text = self.loader.text
+        match = self.TOKEN_PATTERN.match
+
+        offset = 0
+        while offset < len(text):
+            found = match(text, offset)
+            kind, start, offset = found.lastgroup, found.start(), found.end()
+            if kind == "basic":
+                self.add_token(intern_kind(found.group()), start, offset)
+                yield
+            elif kind == "decimal":
+                self.add_token(DECIMAL_KIND, start, offset)
+                yield
+            elif kind == "identifier":
+                ident = found.group()
+                self.add_token(intern_kind(ident) if ident in KEYWORDS else IDENTIFIER_KIND, start, offset)
+                yield
+            elif kind == "string":
+                self.add_token(STRING_KIND, start, offset)
+                yield
+            elif kind == "unterminated_string":
+                MessageHandler.handle_message(ParseError("Unterminated string literal", self.make_pos(start, offset)))
+            elif kind == "bad_comment":
+                MessageHandler.handle_message(ParseError(f"Comment must be followed by a space or newline", self.make_pos(start, offset)))
+            elif kind == "newline":
+                self.line_no += 1
+                self._line_start = offset
+            elif kind == "null":
+                offset = start
+                break
+            elif kind == "unexpected":
+                pos = self.make_pos(start, offset)
+                if offset - start == 1:
+                    MessageHandler.handle_message(ParseError(f"Cannot tokenize character '{found.group()!s}'", pos))
+                else:
+                    MessageHandler.handle_message(ParseError(f"Cannot tokenize characters '{found.group()!s}'", pos))
+
+        self.line_index = self.column(offset)
+        self.tokens.append(EOF_KIND, offset, offset, self.line_no, self.line_index, self.line_index)
 
 
 class SyncFlag(Exception):
@@ -252,22 +505,23 @@ class SyncPosition:
 
 
 class AizeParser:
-    def __init__(self, token_stream: Iterator[Token], source: Source):
-        self._token_stream: Iterator[Token] = token_stream
-        self.curr: Token = Token('<eof>', '<eof>', source, 1, (1, 1))
+    def __init__(self, tokens: TokenStream, source: Source):
+        self._tokens: TokenStream = tokens
+        self._index = 0
+        self.curr: Token = tokens[0]
         self.source = source
 
         self.sync_targets = []
 
         self._enable_assign = True
 
-        self._is_done = False
-        self.advance()
+        self._is_done = self.curr.kind == EOF_KIND
 
     @classmethod
-    def parse(cls, source: Source):
-        parser = cls(Scanner.scan_source(source), source)
-        parsed = parser.parse_source(source)
+    def parse(cls, source: Source, scanner: Type[Scanner] = Scanner):
+        with StageTimer.stage("parse"):
+            parser = cls(scanner.scan_tokens(source), source)
+            parsed = parser.parse_source(source)
         return parsed
 
     # region utility methods
@@ -299,8 +553,9 @@ class AizeParser:
         return match
 
     def advance(self) -> Token:
-        old, self.curr = self.curr, next(self._token_stream)
-        if self.curr.type == '<eof>':
+        self._index += 1
+        old, self.curr = self.curr, self._tokens[self._index]
+        if self.curr.kind == EOF_KIND:
             self._is_done = True
         return old
 
@@ -1,22 +1,27 @@
 from __future__ import annotations
 
 import io
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
 
 from aizec.common import *
 
-from aizec.aize_common import AizeMessage, MessageHandler, FailFlag, ErrorLevel, Reporter, Source, FileSource, Position, StreamSource
+from aizec.aize_common import AizeMessage, MessageHandler, FailFlag, ErrorLevel, Reporter, Source, FileSource, Position, StreamSource, StageTimer
 
-from aizec.aize_frontend import ProgramAST, SourceAST, AizeParser
+from aizec.aize_frontend import ProgramAST, SourceAST, AizeParser, ParseCache, dump_with_source, load_with_source
+from aizec.aize_frontend.aize_ast import ImportAST
 
 from aizec.ir import IR
 from aizec.ir_pass import PassScheduler, PassAlias
 
 from aizec.analysis import DefaultPasses, MangleNames
 
-from aizec.aize_backend import Backend, LLVMBackend
+from aizec.aize_backend import Backend, BuildState, StdBundle
 
+if TYPE_CHECKING:
+    from aizec.aize_backend import LLVMBackend
 
-__all__ = ['FrontendManager', 'IRManager', 'BackendManager',
+
+__all__ = ['FrontendManager', 'IRManager', 'BackendManager', 'build_std_bundle',
            'AizeFrontendError', 'AizeImportError', 'fail_callback']
 
 
@@ -45,16 +50,43 @@ def fail_callback(callback: Callable[[List[AizeMessage]], None]):
         callback(fail.fail_msgs)
 
 
+def _parse_file_in_worker(path: Path, cache_dir: Optional[Path]) -> Optional[bytes]:
+    """
+    Parse the file at path in a worker process.
+
+    Returns the pickled SourceAST together with every message reported while parsing it, or None if the file could not
+    be parsed here, in which case the main process parses it itself.
+    """
+    MessageHandler.set_config(err_out=io.StringIO(), throw_ge=ErrorLevel.NEVER, fail_ge=ErrorLevel.NEVER,
+                              immediate_flush_ge=ErrorLevel.NEVER)
+    MessageHandler.reset_errors()
+    try:
+        source = FileSource(path, path.open("r"))
+        if cache_dir is None:
+            source_ast = AizeParser.parse(source)
+        else:
+            source_ast = ParseCache(cache_dir).parse(source, AizeParser.parse)
+        return dump_with_source(source, (source_ast, MessageHandler.instance().messages))
+    except Exception:
+        return None
+
+
 class FrontendManager:
-    def __init__(self, project_dir: Path, std_dir: Path):
+    def __init__(self, project_dir: Path, std_dir: Path, cache: ParseCache = None, bundle: StdBundle = None):
         self.project_dir = project_dir
         self.std_dir = std_dir
+        self.cache: Optional[ParseCache] = cache
+        self.bundle: Optional[StdBundle] = bundle
+        """If given, std imports refer to the bundle's prebuilt sources rather than being parsed"""
 
         self._sources: Dict[Source, SourceAST] = {}
+        self._uses_bundle: bool = False
 
-    @staticmethod
-    def _parse_source(source: Source) -> SourceAST:
-        return AizeParser.parse(source)
+    def _parse_source(self, source: Source) -> SourceAST:
+        if self.cache is None:
+            return AizeParser.parse(source)
+        else:
+            return self.cache.parse(source, AizeParser.parse)
 
     def _fatal_error(self, msg: AizeMessage):
         MessageHandler.handle_message(msg)
@@ -84,7 +116,24 @@ class FrontendManager:
         return ProgramAST([ast for ast in self._sources.values()])
 
     def get_ir(self) -> IR:
-        return IR.from_ast(self.get_program_ast())
+        with StageTimer.stage("IR.from_ast"):
+            if self._uses_bundle:
+                return IR.from_ast(self.get_program_ast(), prebuilt=self.bundle.ir)
+            else:
+                return IR.from_ast(self.get_program_ast())
+
+    def get_import_graph(self) -> Dict[Source, List[Source]]:
+        """Return the sources each source imports, as found by trace_imports"""
+        graph = {source: [import_node.source for import_node in source_ast.imports if import_node.source is not None]
+                 for source, source_ast in self._sources.items()}
+        if self._uses_bundle:
+            graph.update(self.bundle.get_import_graph())
+        return graph
+
+    def _get_bundled_source(self, abs_path: Path) -> Optional[Source]:
+        if self.bundle is None:
+            return None
+        return self.bundle.get_source(abs_path)
 
     def add_source(self, source: Source):
         if source in self._sources:
@@ -94,7 +143,79 @@ class FrontendManager:
     def add_file(self, path: Path):
         self.add_source(self._make_file_source(path))
 
-    def trace_imports(self):
+    def _resolve_import(self, source: Source, import_node: ImportAST) -> Union[Path, AizeImportError]:
+        """Return the path import_node in source refers to, or the error to report if it cannot be imported"""
+        if import_node.anchor == 'std':
+            abs_path = self.std_dir / import_node.path
+        elif import_node.anchor == 'project':
+            abs_path = self.project_dir / import_node.path
+        elif import_node.anchor == 'local':
+            parsed_file = source.get_path()
+            if parsed_file is None:
+                return AizeImportError("Cannot use a local import from a non-file source", import_node.pos)
+            else:
+                abs_path = parsed_file.parent / import_node.path
+        else:
+            raise ValueError(f"Invalid anchor: {import_node.anchor}")
+
+        try:
+            abs_path = abs_path.resolve()
+        except FileNotFoundError:
+            return AizeImportError(f"Cannot open file {abs_path!s}", pos=import_node.pos)
+
+        if source.get_path() and abs_path == source.get_path().resolve():
+            return AizeImportError(f"A file cannot import itself", pos=import_node.pos)
+
+        return abs_path
+
+    def _parse_imports_in_parallel(self, jobs: int) -> Dict[Path, Tuple[Source, SourceAST, List[AizeMessage]]]:
+        """
+        Find and parse every file imported from the added sources with a pool of jobs worker processes.
+
+        Nothing is reported here; the messages from each file are returned for trace_imports to report in order.
+        """
+        prepared: Dict[Path, Tuple[Source, SourceAST, List[AizeMessage]]] = {}
+        found: Set[Path] = {source.get_path().resolve() for source in self._sources if source.get_path() is not None}
+        cache_dir = None if self.cache is None else self.cache.cache_dir
+
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            pending: Dict[Future, Path] = {}
+
+            def parse_imports(source: Source, source_ast: SourceAST):
+                for import_node in source_ast.imports:
+                    abs_path = self._resolve_import(source, import_node)
+                    if isinstance(abs_path, Path) and abs_path not in found and self._get_bundled_source(abs_path) is None:
+                        found.add(abs_path)
+                        pending[pool.submit(_parse_file_in_worker, abs_path, cache_dir)] = abs_path
+
+            for added_source, added_ast in self._sources.items():
+                parse_imports(added_source, added_ast)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    abs_path = pending.pop(future)
+                    parsed = future.result()
+                    if parsed is None:
+                        continue
+                    try:
+                        source = FileSource(abs_path, abs_path.open("r"))
+                    except OSError:
+                        continue
+                    source_ast, messages = load_with_source(source, parsed)
+                    source.add_lines_from_text()
+                    prepared[abs_path] = source, source_ast, messages
+                    parse_imports(source, source_ast)
+        return prepared
+
+    def trace_imports(self, jobs: int = 1):
+        """
+        Parse every source imported from the added sources, directly or indirectly.
+
+        With more than one job, the imported files are parsed in worker processes first. The import graph is then
+        walked in the same order as a sequential trace, and the messages from each file are reported when it is
+        reached, so the result and the order of messages do not depend on jobs.
+        """
         to_visit: List[Source] = [source for source in self._sources]
         traced: Set[Source] = set()
 
@@ -103,6 +224,16 @@ class FrontendManager:
                                                for source in self._sources
                                                if source.get_path() is not None}
 
+        if jobs > 1:
+            with StageTimer.stage("parse imports in parallel"):
+                prepared = self._parse_imports_in_parallel(jobs)
+        else:
+            prepared = {}
+        prepared_asts: Dict[Source, Tuple[SourceAST, List[AizeMessage]]] = {}
+        for abs_path, (prepared_source, prepared_ast, messages) in prepared.items():
+            created_sources[abs_path] = prepared_source
+            prepared_asts[prepared_source] = prepared_ast, messages
+
         while to_visit:
             source = to_visit.pop()
             if source in traced:
@@ -110,37 +241,29 @@ class FrontendManager:
 
             if source in parsed_sources:
                 source_ast = parsed_sources[source]
+            elif source in prepared_asts:
+                source_ast, messages = prepared_asts[source]
+                for msg in messages:
+                    MessageHandler.handle_message(msg)
+                # Parsing a source always ends with a flush, which fails the compile if the source had errors
+                MessageHandler.flush_messages()
+                parsed_sources[source] = source_ast
             else:
                 source_ast = parsed_sources[source] = self._parse_source(source)
 
             traced.add(source)
 
             for import_node in source_ast.imports:
-                if import_node.anchor == 'std':
-                    abs_path = self.std_dir / import_node.path
-                elif import_node.anchor == 'project':
-                    abs_path = self.project_dir / import_node.path
-                elif import_node.anchor == 'local':
-                    parsed_file = source.get_path()
-                    if parsed_file is None:
-                        msg = AizeImportError("Cannot use a local import from a non-file source", import_node.pos)
-                        MessageHandler.handle_message(msg)
-                        continue
-                    else:
-                        abs_path = parsed_file.parent / import_node.path
-                else:
-                    raise ValueError(f"Invalid anchor: {import_node.anchor}")
-
-                try:
-                    abs_path = abs_path.resolve()
-                except FileNotFoundError:
-                    msg = AizeImportError(f"Cannot open file {abs_path!s}", pos=import_node.pos)
-                    MessageHandler.handle_message(msg)
+                abs_path = self._resolve_import(source, import_node)
+                if isinstance(abs_path, AizeImportError):
+                    MessageHandler.handle_message(abs_path)
                     continue
 
-                if source.get_path() and abs_path == source.get_path().resolve():
-                    msg = AizeImportError(f"A file cannot import itself", pos=import_node.pos)
-                    MessageHandler.handle_message(msg)
+                bundled_source = self._get_bundled_source(abs_path)
+                if bundled_source is not None:
+                    # Already analyzed and compiled, along with everything it imports
+                    import_node.source = bundled_source
+                    self._uses_bundle = True
                     continue
 
                 if abs_path in created_sources:
@@ -182,14 +305,30 @@ class BackendManager(Generic[T]):
 
     @classmethod
     def create_llvm(cls, ir: IR) -> BackendManager[LLVMBackend]:
+        from aizec.aize_backend import LLVMBackend
         return cls(ir, LLVMBackend)
 
     def set_output(self, output: Optional[Path]):
         self.backend.set_output(output)
 
-    def set_opt_level(self, level: int):
+    def set_opt_level(self, level: Union[int, str]):
         self.backend.set_opt_level(level)
 
+    def set_jobs(self, jobs: int):
+        self.backend.set_jobs(jobs)
+
+    def set_codegen_units(self, units: int):
+        self.backend.set_codegen_units(units)
+
+    def set_target(self, cpu: str = '', features: str = ''):
+        self.backend.set_target(cpu, features)
+
+    def set_build_dir(self, build_dir: Path, import_graph: Dict[Source, List[Source]]):
+        self.backend.set_build_state(BuildState(build_dir, import_graph))
+
+    def set_std_bundle(self, bundle: Optional[StdBundle]):
+        self.backend.set_std_bundle(bundle)
+
     def set_option(self, option: str):
         if not self.backend.handle_option(option):
             # TODO signal message handler
@@ -200,3 +339,32 @@ class BackendManager(Generic[T]):
 
     def run_output(self):
         self.backend.run_output()
+
+
+def build_std_bundle(std_dir: Path, bundle_dir: Path, opt_level: str = '2', cpu: str = '', features: str = ''):
+    """
+    Analyze and compile every source in std_dir with the optimization preset opt_level for the given CPU and target
+    features, and save them as a StdBundle in bundle_dir
+    """
+    from aizec.ir.serialization import dump_ir
+
+    frontend = FrontendManager(std_dir, std_dir, None)
+    with StageTimer.stage("frontend"):
+        for path in sorted(std_dir.rglob("*.az")):
+            frontend.add_file(path)
+        frontend.trace_imports()
+
+    ir_manager = IRManager(frontend.get_ir())
+    ir_manager.schedule_default_passes()
+    ir_manager.schedule_mangling()
+    with StageTimer.stage("analysis"):
+        ir_manager.run_scheduled()
+    # Saved before the backend adds its own extension, which only the bundle's object file needs
+    ir_data = dump_ir(ir_manager.ir)
+
+    with StageTimer.stage("backend"):
+        backend = BackendManager.create_llvm(ir_manager.ir)
+        backend.set_opt_level(opt_level)
+        backend.set_target(cpu, features)
+        object_data, triple = backend.backend.build_library()
+    StdBundle.save(bundle_dir, std_dir, ir_data, object_data, triple, opt_level, cpu, features)
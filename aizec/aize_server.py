@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+
+from aizec.common import *
+
+
+__all__ = ['CompileRequest', 'CompileResponse', 'CompileServer', 'send_request']
+
+
+CompileRequest = Dict[str, Any]
+"""A compile sent to the server: {"argv": [...], "cwd": "..."}"""
+
+CompileResponse = Dict[str, Any]
+"""The result of a compile: {"status": int, "stdout": "...", "stderr": "...", "output": path or null}"""
+
+
+class _CompileHandler(socketserver.StreamRequestHandler):
+    server: CompileServer
+
+    def handle(self):
+        try:
+            request: CompileRequest = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        response = self.server.run_request(request)
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class CompileServer(socketserver.UnixStreamServer):
+    """
+    Compiles requests sent over a Unix socket in a single long-running process.
+
+    Requests are handled one at a time, since a compile changes the working directory and uses the global
+    MessageHandler. Whatever a compile writes to stdout or stderr is sent back to the client instead.
+    """
+
+    def __init__(self, socket_path: Path, compile: Callable[[List[str]], Tuple[int, Optional[Path]]]):
+        self.socket_path = socket_path
+        self.compile = compile
+
+        if socket_path.exists():
+            socket_path.unlink()
+        super().__init__(str(socket_path), _CompileHandler)
+
+    def run_request(self, request: CompileRequest) -> CompileResponse:
+        stdout, stderr = io.StringIO(), io.StringIO()
+        status, output = 1, None
+        old_cwd = os.getcwd()
+        try:
+            os.chdir(request["cwd"])
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                status, output = self.compile(request["argv"])
+            if output is not None:
+                output = output.absolute()
+        except SystemExit as exit_:
+            status = exit_.code if isinstance(exit_.code, int) else 1
+        except Exception as err:
+            stderr.write(f"Internal compiler error: {err!r}\n")
+        finally:
+            os.chdir(old_cwd)
+        return {
+            "status": status,
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue(),
+            "output": None if output is None else str(output),
+        }
+
+    def server_close(self):
+        super().server_close()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+
+def send_request(socket_path: Path, argv: List[str], cwd: Path) -> CompileResponse:
+    """Send a compile to the server listening at socket_path and wait for its result"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(socket_path))
+        with client.makefile("rwb") as stream:
+            stream.write(json.dumps({"argv": argv, "cwd": str(cwd)}).encode() + b"\n")
+            stream.flush()
+            return json.loads(stream.readline())
@@ -176,6 +176,8 @@ class TypeUnifier:
             (UnionVariantTypeSymbol, UnionTypeSymbol): self.unify_variant_union,
             (UnionTypeSymbol, UnionTypeSymbol): self.unify_union_union
         }
+        # What unifies each pair of types only depends on the types, so it is found once for each pair
+        self._unify_funcs: Dict[Tuple[TypeSymbol, TypeSymbol], UnifyFunc] = {}
 
         self._node_ctx: Optional[TextIR] = None
         self._type_decl_ctx: Optional[Position] = None
@@ -207,14 +209,30 @@ class TypeUnifier:
     def unify_type(self, expr: ExprIR, to_type: TypeSymbol, node: TextIR, type_decl: Position = None) -> ExprIR:
         with self._set_context(node, type_decl):
             from_type = self.symbols.expr(expr).return_type
-            if isinstance(from_type, ErroredTypeSymbol) or isinstance(to_type, ErroredTypeSymbol):
-                return expr
-            type_tuple = type(from_type), type(to_type)
-            if type_tuple in self.MAP:
-                return self.MAP[type_tuple](expr, from_type, to_type)
-            else:
-                self.report_error(f"Expected type {to_type}, got {from_type}", show_decl=True)
-                return expr
+            try:
+                unify_func = self._unify_funcs[from_type, to_type]
+            except KeyError:
+                unify_func = self._unify_funcs[from_type, to_type] = self._find_unify_func(from_type, to_type)
+            return unify_func(expr, from_type, to_type)
+
+    def _find_unify_func(self, from_type: TypeSymbol, to_type: TypeSymbol) -> Callable[[ExprIR, TypeSymbol, TypeSymbol], ExprIR]:
+        if isinstance(from_type, ErroredTypeSymbol) or isinstance(to_type, ErroredTypeSymbol):
+            return self.unify_same
+        type_tuple = type(from_type), type(to_type)
+        if type_tuple not in self.MAP:
+            return self.unify_mismatched
+        elif from_type is to_type:
+            # Since structural types are interned, this is also the case for equal tuple and function types
+            return self.unify_same
+        else:
+            return self.MAP[type_tuple]
+
+    def unify_same(self, expr: ExprIR, from_type: TypeSymbol, to_type: TypeSymbol) -> ExprIR:
+        return expr
+
+    def unify_mismatched(self, expr: ExprIR, from_type: TypeSymbol, to_type: TypeSymbol) -> ExprIR:
+        self.report_error(f"Expected type {to_type}, got {from_type}", show_decl=True)
+        return expr
 
     def unify_int_int(self, expr: ExprIR, from_type: IntTypeSymbol, to_type: IntTypeSymbol) -> ExprIR:
         from_bits, to_bits = from_type.bit_size, to_type.bit_size
@@ -298,28 +316,32 @@ class IRSymbolsPass(IRTreePass, ABC):
     def current_namespace(self) -> NamespaceSymbol:
         return self._table.current_namespace
 
+    def sources_to_analyze(self, program: ProgramIR) -> List[SourceIR]:
+        # Prebuilt sources were analyzed when they were built, and their symbols are already in the extensions
+        return [source for source in program.sources if source not in self.ir.prebuilt_sources]
+
     # region Type Checking Utils
-    def _lookup(self, type: str, name: str, node: TextIR, ns: NamespaceSymbol = None):
+    def _lookup(self, lookup: Callable[[NamespaceSymbol, str], Symbol], err_cls: Type[Symbol], name: str,
+                node: TextIR, ns: NamespaceSymbol = None):
         if ns is None:
             ns = self.current_namespace
-        err_cls = {"type": ErroredTypeSymbol, "value": ErroredVariableSymbol, "namespace": ErroredNamespaceSymbol}[type]
         try:
-            # noinspection PyArgumentList
-            resolved_symbol = ns.lookup(type, name)
+            resolved_symbol = lookup(ns, name)
         except FailedLookupError as err:
             msg = DefinitionError.name_undefined(node.pos, err.failed_name)
             MessageHandler.handle_message(msg)
+            # noinspection PyArgumentList
             resolved_symbol = err_cls(node, node.pos)
         return resolved_symbol
 
     def lookup_type(self, name: str, node: TextIR, in_namespace: NamespaceSymbol = None) -> TypeSymbol:
-        return self._lookup("type", name, node, in_namespace)
+        return self._lookup(NamespaceSymbol.lookup_type, ErroredTypeSymbol, name, node, in_namespace)
 
     def lookup_value(self, name: str, node: TextIR, in_namespace: NamespaceSymbol = None) -> VariableSymbol:
-        return self._lookup("value", name, node, in_namespace)
+        return self._lookup(NamespaceSymbol.lookup_value, ErroredVariableSymbol, name, node, in_namespace)
 
     def lookup_namespace(self, name: str, node: TextIR, in_namespace: NamespaceSymbol = None) -> NamespaceSymbol:
-        return self._lookup("namespace", name, node, in_namespace)
+        return self._lookup(NamespaceSymbol.lookup_namespace, ErroredNamespaceSymbol, name, node, in_namespace)
 
     def define_value(self, symbol: VariableSymbol, in_namespace: NamespaceSymbol = None):
         if in_namespace is None:
@@ -338,7 +360,7 @@ class IRSymbolsPass(IRTreePass, ABC):
         name = "<lambda>" if isinstance(func, LambdaIR) else func.name
         func.params = [self.visit_param(param) for param in func.params]
         func.ret = self.visit_type(func.ret)
-        func_type = FunctionTypeSymbol([self.typeof(param.type) for param in func.params], self.typeof(func.ret), func, func.pos)
+        func_type = FunctionTypeSymbol.get([self.typeof(param.type) for param in func.params], self.typeof(func.ret), func, func.pos)
         func_value = VariableSymbol(name, func, func_type, func.pos)
         func_namespace = NamespaceSymbol(f"function {name}", func, func.pos)
         self.current_namespace.define_namespace(func_namespace, visible=False)
@@ -353,14 +375,14 @@ class IRSymbolsPass(IRTreePass, ABC):
 
     def visit_tuple_type(self, type: TupleTypeIR):
         type.items = [self.visit_type(item) for item in type.items]
-        resolved_type = TupleTypeSymbol([self.typeof(item) for item in type.items], type, type.pos)
+        resolved_type = TupleTypeSymbol.get([self.typeof(item) for item in type.items], type, type.pos)
         self.symbols.type(type, set_to=SymbolData.TypeData(resolved_type))
         return type
 
     def visit_func_type(self, type: FuncTypeIR):
         type.params = [self.visit_type(param_type) for param_type in type.params]
         type.ret = self.visit_type(type.ret)
-        resolved_type = FunctionTypeSymbol([self.typeof(param_type) for param_type in type.params], self.typeof(type.ret), type, type.pos)
+        resolved_type = FunctionTypeSymbol.get([self.typeof(param_type) for param_type in type.params], self.typeof(type.ret), type, type.pos)
         self.symbols.type(type, SymbolData.TypeData(resolved_type))
         return type
 
@@ -377,8 +399,13 @@ class IRSymbolsPass(IRTreePass, ABC):
 class InitSymbols(IRSymbolsPass):
     def __init__(self, ir: IR):
         self.ir = ir
-        self.symbols: SymbolData = self.add_ext(SymbolData)
-        self.builtins: LiteralData = self.add_ext(LiteralData)
+        if ir.prebuilt_sources:
+            # The program's symbols are added to those of its prebuilt sources, so they share one set of builtins
+            self.symbols: SymbolData = self.get_ext(SymbolData)
+            self.builtins: LiteralData = self.get_ext(LiteralData)
+        else:
+            self.symbols: SymbolData = self.add_ext(SymbolData)
+            self.builtins: LiteralData = self.add_ext(LiteralData)
         super().__init__(ir)
 
     @classmethod
@@ -389,7 +416,17 @@ class InitSymbols(IRSymbolsPass):
     def get_required_extensions(cls) -> Set[Type[Extension]]:
         return set()
 
+    @classmethod
+    def get_added_extensions(cls) -> Set[Type[Extension]]:
+        return {SymbolData, LiteralData}
+
     def visit_program(self, program: ProgramIR):
+        if self.ir.prebuilt_sources:
+            with self.enter_namespace(self.symbols.program(program).builtins):
+                for source in self.sources_to_analyze(program):
+                    self.visit_source(source)
+            return
+
         builtin_namespace = NamespaceSymbol("program", program, Position.new_none())
         self.symbols.program(program, set_to=SymbolData.ProgramData(builtin_namespace))
 
@@ -437,7 +474,7 @@ class DeclareTypes(IRSymbolsPass):
 
     def visit_program(self, program: ProgramIR):
         with self.enter_namespace(self.symbols.program(program).builtins):
-            for source in program.sources:
+            for source in self.sources_to_analyze(program):
                 self.visit_source(source)
 
     def visit_source(self, source: SourceIR):
@@ -521,7 +558,7 @@ class DeclareFunctions(IRSymbolsPass):
 
     def visit_program(self, program: ProgramIR):
         with self.enter_namespace(self.symbols.program(program).builtins):
-            for source in program.sources:
+            for source in self.sources_to_analyze(program):
                 self.visit_source(source)
 
     def visit_source(self, source: SourceIR):
@@ -635,7 +672,7 @@ class ResolveSymbols(IRSymbolsPass):
 
     def visit_program(self, program: ProgramIR):
         with self.enter_namespace(self.symbols.program(program).builtins):
-            for source in program.sources:
+            for source in self.sources_to_analyze(program):
                 self.visit_source(source)
 
     def visit_source(self, source: SourceIR):
@@ -1068,7 +1105,7 @@ class ResolveSymbols(IRSymbolsPass):
         ret = self.symbols.expr(lambda_.body).return_type
 
         params = [self.symbols.type(param.type).resolved_type for param in lambda_.params]
-        func_type = FunctionTypeSymbol(params, ret, lambda_, lambda_.pos)
+        func_type = FunctionTypeSymbol.get(params, ret, lambda_, lambda_.pos)
 
         func_value = VariableSymbol("<lambda>", lambda_, func_type, lambda_.pos)
 
@@ -1094,7 +1131,7 @@ class ResolveSymbols(IRSymbolsPass):
         for item in tuple.items:
             self.visit_expr(item)
             items.append(self.typeof(item))
-        return_type = TupleTypeSymbol(items, tuple, tuple.pos)
+        return_type = TupleTypeSymbol.get(items, tuple, tuple.pos)
         self.symbols.expr(tuple, set_to=SymbolData.ExprData(return_type, False))
         return tuple
 
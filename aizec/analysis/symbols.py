@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+from sys import intern
+from weakref import WeakValueDictionary
+
 from aizec.common import *
 from aizec.aize_common import Position
 
@@ -11,6 +14,7 @@ __all__ = [
     'VariableSymbol', 'ErroredVariableSymbol',
     'NamespaceSymbol', 'ErroredNamespaceSymbol',
     'TypeSymbol', 'IntTypeSymbol', 'FunctionTypeSymbol', 'ErroredTypeSymbol', 'StructTypeSymbol', 'TupleTypeSymbol', 'UnionTypeSymbol', 'AggTypeSymbol', 'UnionVariantTypeSymbol',
+    'StructuralTypeSymbol',
     'SymbolTable',
     'FailedLookupError', 'DuplicateSymbolError'
 ]
@@ -43,7 +47,7 @@ class Symbol:
     """
 
     def __init__(self, name: str, declarer: NodeIR, pos: Position):
-        self.name: str = name
+        self.name: str = intern(name)
         """The name of this symbol, typically what it is called in its parent namespace"""
 
         self.namespace: Union[NamespaceSymbol, None] = None
@@ -177,16 +181,60 @@ class IntTypeSymbol(TypeSymbol):
         return self.name
 
 
-class TupleTypeSymbol(TypeSymbol):
+class StructuralTypeSymbol(TypeSymbol, ABC):
+    """
+    A type which is defined by the types it is made of, rather than by a declaration.
+
+    Types made with get() are interned, so every equal type made that way is the same object, and is compatible with
+    itself without comparing what it is made of. The first declarer and position a type is made with are the ones it
+    keeps.
+    """
+
+    # Each subclass gets its own table, keyed by the types its instances are made of
+    _interned: WeakValueDictionary
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._interned = WeakValueDictionary()
+
+    @abstractmethod
+    def _key(self) -> Tuple[Any, ...]:
+        pass
+
+    @classmethod
+    def _intern(cls, type: StructuralTypeSymbol) -> StructuralTypeSymbol:
+        return cls._interned.setdefault(type._key(), type)
+
+    @classmethod
+    def _ir_loaded(cls, types: List[StructuralTypeSymbol]):
+        # Called when types are loaded from an IR file, so the types made after from the loaded ones are the same
+        for type in types:
+            cls._intern(type)
+
+
+class TupleTypeSymbol(StructuralTypeSymbol):
     def __init__(self, items: List[TypeSymbol], declarer: NodeIR, pos: Position):
         super().__init__("<tuple type>", declarer, pos)
         self.items = items
 
+    @classmethod
+    def get(cls, items: List[TypeSymbol], declarer: NodeIR, pos: Position) -> TupleTypeSymbol:
+        """Get the interned tuple type of items, making it if it does not exist"""
+        type = cls._interned.get(tuple(items))
+        if type is None:
+            type = cls._intern(cls(items, declarer, pos))
+        return type
+
+    def _key(self) -> Tuple[Any, ...]:
+        return tuple(self.items)
+
     @classmethod
     def get_cls_name(cls) -> str:
         return "a tuple"
 
     def is_super_of(self, sub: TypeSymbol) -> bool:
+        if sub is self:
+            return True
         if not isinstance(sub, TupleTypeSymbol):
             return False
         if len(self.items) != len(sub.items):
@@ -197,17 +245,30 @@ class TupleTypeSymbol(TypeSymbol):
         return f"({', '.join(str(item) for item in self.items)})"
 
 
-class FunctionTypeSymbol(TypeSymbol):
+class FunctionTypeSymbol(StructuralTypeSymbol):
     def __init__(self, params: List[TypeSymbol], ret: TypeSymbol, declarer: NodeIR, pos: Position):
         super().__init__("<function type>", declarer, pos)
         self.params = params
         self.ret = ret
 
+    @classmethod
+    def get(cls, params: List[TypeSymbol], ret: TypeSymbol, declarer: NodeIR, pos: Position) -> FunctionTypeSymbol:
+        """Get the interned type of functions taking params and returning ret, making it if it does not exist"""
+        type = cls._interned.get((*params, ret))
+        if type is None:
+            type = cls._intern(cls(params, ret, declarer, pos))
+        return type
+
+    def _key(self) -> Tuple[Any, ...]:
+        return (*self.params, self.ret)
+
     @classmethod
     def get_cls_name(cls) -> str:
         return "a function"
 
     def is_super_of(self, sub: TypeSymbol) -> bool:
+        if sub is self:
+            return True
         if not isinstance(sub, FunctionTypeSymbol):
             return False
         if len(self.params) != len(sub.params):
@@ -264,6 +325,36 @@ class NamespaceSymbol(Symbol):
         else:
             raise Exception()
 
+    def _lookup(self, table: str, name: str, here: bool, nearest: bool) -> Symbol:
+        """
+        Look name up in the table (value_symbols, type_symbols, or namespace_symbols) of this namespace or its parents.
+
+        This is the general form of the lookups, which they only fall back to when asked for more than the nearest
+        symbol.
+        """
+        if here:
+            try:
+                return getattr(self, table)[name]
+            except KeyError:
+                raise FailedLookupError(name) from None
+        elif not nearest:
+            for namespace in self.parents(nearest_first=False):
+                if name in getattr(namespace, table):
+                    return getattr(namespace, table)[name]
+            raise FailedLookupError(name)
+        else:
+            return self._walk(table, name)
+
+    def _walk(self, table: str, name: str) -> Symbol:
+        # Follows the parent links rather than building the list of parents, since this runs for every name used
+        namespace = self
+        while namespace is not None:
+            symbol = getattr(namespace, table).get(name)
+            if symbol is not None:
+                return symbol
+            namespace = namespace.namespace
+        raise FailedLookupError(name)
+
     def lookup_type(self, name: str, *, here: bool = False, nearest: bool = True) -> TypeSymbol:
         """
         Lookup a TypeSymbol with the given name in the current namespace, if it was marked with visible when it was defined.
@@ -279,26 +370,14 @@ class NamespaceSymbol(Symbol):
         Raises:
             FailedLookupError: If the name was not found.
         """
-        if here:
-            lookup_chain = [self]
-        else:
-            lookup_chain = self.parents(nearest_first=nearest)
-
-        for namespace in lookup_chain:
-            if name in namespace.type_symbols:
-                return namespace.type_symbols[name]
-        raise FailedLookupError(name)
+        if here or not nearest:
+            return self._lookup('type_symbols', name, here, nearest)
+        return self._walk('type_symbols', name)
 
     def lookup_value(self, name: str, *, here: bool = False, nearest: bool = True) -> VariableSymbol:
-        if here:
-            lookup_chain = [self]
-        else:
-            lookup_chain = self.parents(nearest_first=nearest)
-
-        for namespace in lookup_chain:
-            if name in namespace.value_symbols:
-                return namespace.value_symbols[name]
-        raise FailedLookupError(name)
+        if here or not nearest:
+            return self._lookup('value_symbols', name, here, nearest)
+        return self._walk('value_symbols', name)
 
     def lookup_namespace(self, name: str, *, here: bool = False, nearest: bool = True) -> NamespaceSymbol:
         """
@@ -315,15 +394,9 @@ class NamespaceSymbol(Symbol):
         Raises:
             FailedLookupError: If the name was not found.
         """
-        if here:
-            lookup_chain = [self]
-        else:
-            lookup_chain = self.parents(nearest_first=nearest)
-
-        for namespace in lookup_chain:
-            if name in namespace.namespace_symbols:
-                return namespace.namespace_symbols[name]
-        raise FailedLookupError(name)
+        if here or not nearest:
+            return self._lookup('namespace_symbols', name, here, nearest)
+        return self._walk('namespace_symbols', name)
 
     def define_value(self, value: VariableSymbol, as_name: str = None, visible: bool = True):
         """
@@ -341,6 +414,7 @@ class NamespaceSymbol(Symbol):
             as_name = value.name
 
         if visible:
+            as_name = intern(as_name)
             if as_name in self.value_symbols:
                 raise DuplicateSymbolError(value, self.value_symbols[as_name])
             else:
@@ -352,6 +426,7 @@ class NamespaceSymbol(Symbol):
             as_name = type.name
 
         if visible:
+            as_name = intern(as_name)
             if as_name in self.type_symbols:
                 raise DuplicateSymbolError(type, self.type_symbols[as_name])
             else:
@@ -363,6 +438,7 @@ class NamespaceSymbol(Symbol):
             as_name = namespace.name
 
         if visible:
+            as_name = intern(as_name)
             if as_name in self.namespace_symbols:
                 raise DuplicateSymbolError(namespace, self.namespace_symbols[as_name])
             else:
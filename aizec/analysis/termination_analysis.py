@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import zlib
+
 from aizec.common import *
 from aizec.aize_common import AizeMessage, Reporter, MessageHandler, ErrorLevel, Position
 
@@ -13,12 +15,15 @@ from .default_analysis import DefaultPasses
 
 
 class MangleNames(IRTreePass):
+    fusable = True
+
     def __init__(self, ir: IR):
         super().__init__(ir)
 
         self.symbols = self.get_ext(SymbolData)
 
         self.source_nums: Dict[Path, int] = {}
+        self._used_source_nums: Set[int] = set()
 
     @classmethod
     def get_required_passes(cls) -> Set[PassAlias]:
@@ -45,7 +50,7 @@ class MangleNames(IRTreePass):
                 if path in self.source_nums:
                     num = self.source_nums[path]
                 else:
-                    num = self.source_nums[path] = len(self.source_nums)
+                    num = self.source_nums[path] = self.get_source_num(path)
                 return f"{self.mangle_symbol(symbol.namespace)}_S{num}"
             elif symbol.name.startswith("function"):
                 func_name = symbol.name[6:].lstrip()
@@ -55,13 +60,14 @@ class MangleNames(IRTreePass):
         else:
             raise Exception(symbol)
 
-    def visit_program(self, program: ProgramIR):
-        for source in program.sources:
-            self.visit_source(source)
-
-    def visit_source(self, source: SourceIR):
-        for top_level in source.top_levels:
-            self.visit_top_level(top_level)
+    def get_source_num(self, path: Path) -> int:
+        # Derived from the path rather than the order sources are found in, so a source's names are the same in every
+        # program that contains it and its object file can be reused between builds
+        num = zlib.crc32(str(path).encode())
+        while num in self._used_source_nums:
+            num += 1
+        self._used_source_nums.add(num)
+        return num
 
     def visit_function(self, func: FunctionIR):
         symbol = self.symbols.function(func).symbol
@@ -33,3 +33,22 @@ def all_subclasses(cls: type) -> Set[type]:
     from operator import or_
 
     return reduce(or_, map(all_subclasses, cls.__subclasses__()), set(cls.__subclasses__()))
+
+
+class DispatchTable(dict):
+    """
+    Maps each node type to the visitor method for it, as an unbound function.
+
+    Node types that were not registered use the method of their closest registered base class, which is looked up the
+    first time they are visited and then cached.
+    """
+
+    def __init__(self, visitor_cls: type, methods: Dict[type, str]):
+        super().__init__((node_type, getattr(visitor_cls, method)) for node_type, method in methods.items())
+
+    def __missing__(self, node_type: type) -> Callable:
+        for base in node_type.__mro__[1:]:
+            if base in self:
+                visit = self[node_type] = self[base]
+                return visit
+        raise KeyError(node_type)
@@ -18,11 +18,40 @@ class IR:
     def __init__(self, program: ProgramIR):
         self.program = program
         self.extensions: Dict[Type[Extension], Extension] = {}
+        self.node_ids: NodeIds = NodeIds()
         self.ran_passes: Set = set()
+        self.prebuilt_sources: Set[SourceIR] = set()
+        """Sources that were analyzed and compiled ahead of time, such as those of the std bundle"""
 
     @classmethod
-    def from_ast(cls, program: ProgramAST) -> IR:
-        return cls(CreateIR(program).visit_program(program))
+    def from_ast(cls, program: ProgramAST, prebuilt: IR = None) -> IR:
+        """
+        Create the IR of program.
+
+        If prebuilt is given, it is the analyzed IR of sources compiled ahead of time, and program's sources are added to
+        it after its own. Imports of prebuilt's sources refer to them, and the passes are run again for the new sources.
+        """
+        if prebuilt is None:
+            return cls(CreateIR(program).visit_program(program))
+
+        creator = CreateIR(program)
+        creator.sources.update((source_ir.source, source_ir) for source_ir in prebuilt.program.sources)
+        new_sources = creator.visit_program(program).sources
+        prebuilt.prebuilt_sources.update(prebuilt.program.sources)
+        prebuilt.program.sources.extend(new_sources)
+        prebuilt.ran_passes = set()
+        return prebuilt
+
+    def save(self, path: Path):
+        """Save this IR, its extensions, and the passes run on it to path, so it can be loaded without analyzing it again"""
+        from .serialization import dump_ir
+        path.write_bytes(dump_ir(self))
+
+    @classmethod
+    def load(cls, path: Path) -> IR:
+        """Load an IR saved with IR.save, raising IRFormatError if path does not hold one this compiler can load"""
+        from .serialization import load_ir
+        return load_ir(path.read_bytes())
 
 
 # region IR Creator
@@ -41,7 +70,8 @@ class CreateIR(ASTVisitor):
         return program
 
     def visit_source(self, source: SourceAST):
-        source_ir = SourceIR([self.visit_top_level(top_level) for top_level in source.top_levels], source.source.get_name())
+        source_ir = SourceIR([self.visit_top_level(top_level) for top_level in source.top_levels], source.source.get_name(),
+                             source.source)
         self.sources[source.source] = source_ir
         return source_ir
 
@@ -9,180 +9,314 @@ if __name__ != '__main__':
 T = TypeVar('T')
 
 
+_KINDS: Dict[str, int] = {}
+
+
+def kind_index(kind: str) -> int:
+    """Return the index of the data of the given kind in Extension._node_data"""
+    return _KINDS.setdefault(kind, len(_KINDS))
+
+
+(
+    _TEXT,
+    _PROGRAM,
+    _SOURCE,
+    _TOP_LEVEL,
+    _IMPORT,
+    _FUNCTION,
+    _STRUCT,
+    _UNION,
+    _VARIANT,
+    _AGG_FUNC,
+    _AGG_FIELD,
+    _PARAM,
+    _FUNC_ATTR,
+    _STMT,
+    _IF_STMT,
+    _WHILE_STMT,
+    _VAR_DECL,
+    _BLOCK,
+    _RETURN,
+    _EXPR_STMT,
+    _EXPR,
+    _IS,
+    _COMPARE,
+    _ARITHMETIC,
+    _NEGATE,
+    _TUPLE,
+    _NEW,
+    _CALL,
+    _METHOD_CALL,
+    _GET_VAR,
+    _SET_VAR,
+    _GET_ATTR,
+    _SET_ATTR,
+    _INTRINSIC,
+    _GET_STATIC_ATTR_EXPR,
+    _CAST_INT,
+    _CAST_UNION,
+    _LAMBDA,
+    _INT,
+    _ANNOTATION,
+    _TYPE,
+    _GENERATED_TYPE,
+    _GET_TYPE,
+    _FUNC_TYPE,
+    _TUPLE_TYPE,
+    _NO_TYPE,
+    _MALFORMED_TYPE,
+    _NAMESPACE,
+    _GET_NAMESPACE,
+    _MALFORMED_NAMESPACE,
+) = [kind_index(kind) for kind in [
+    'text',
+    'program',
+    'source',
+    'top_level',
+    'import_',
+    'function',
+    'struct',
+    'union',
+    'variant',
+    'agg_func',
+    'agg_field',
+    'param',
+    'func_attr',
+    'stmt',
+    'if_stmt',
+    'while_stmt',
+    'var_decl',
+    'block',
+    'return_',
+    'expr_stmt',
+    'expr',
+    'is_',
+    'compare',
+    'arithmetic',
+    'negate',
+    'tuple',
+    'new',
+    'call',
+    'method_call',
+    'get_var',
+    'set_var',
+    'get_attr',
+    'set_attr',
+    'intrinsic',
+    'get_static_attr_expr',
+    'cast_int',
+    'cast_union',
+    'lambda_',
+    'int',
+    'annotation',
+    'type',
+    'generated_type',
+    'get_type',
+    'func_type',
+    'tuple_type',
+    'no_type',
+    'malformed_type',
+    'namespace',
+    'get_namespace',
+    'malformed_namespace',
+]]
+
+
 class Extension:
-    def __init__(self, _general_data: Any, node_data: Dict[NodeIR, Dict[str, Any]]):
+    """
+    Data attached to the nodes of an IR by a pass.
+
+    Each kind of data is kept in a list indexed by node id, so looking it up is two list reads. Nodes are given their
+    id by the IR's NodeIds the first time any extension stores data for them.
+    """
+
+    def __init__(self, _general_data: Any, node_ids: NodeIds):
         self._general_data: Any = _general_data
-        self._node_data: Dict[NodeIR, Dict[str, Any]] = node_data
+        self._node_ids: NodeIds = node_ids
+        self._node_data: List[List[Any]] = [[] for _ in _KINDS]
 
     @classmethod
-    def create(cls: Type[E]) -> E:
-        return cls(None, {})
+    def create(cls: Type[E], node_ids: NodeIds) -> E:
+        """Create an empty extension for the IR whose nodes are numbered by node_ids"""
+        return cls(None, node_ids)
 
     def general(self, set_to: T = None) -> Optional[T]:
         if set_to is not None:
             self._general_data = set_to
         return self._general_data
 
-    def _get_data(self, node: NodeIR, type: str, set_to: T) -> T:
+    def _get_data(self, node: NodeIR, kind: int, set_to: T) -> T:
+        node_id = node.node_id
         if set_to is not None:
-            self._node_data.setdefault(node, {})[type] = set_to
-        try:
-            return self._node_data[node][type]
-        except KeyError:
-            raise ValueError(f"The node of type {node.__class__.__qualname__} has no extensions of type {self.__class__.__qualname__} for class {type!r}") from None
+            if node_id < 0:
+                node_id = self._node_ids.assign(node)
+            while kind >= len(self._node_data):
+                self._node_data.append([])
+            data = self._node_data[kind]
+            if node_id >= len(data):
+                data.extend([None] * (self._node_ids.count - len(data)))
+            data[node_id] = set_to
+            return set_to
+
+        if 0 <= node_id and kind < len(self._node_data):
+            data = self._node_data[kind]
+            if node_id < len(data) and data[node_id] is not None:
+                return data[node_id]
+        kind_name = next(name for name, index in _KINDS.items() if index == kind)
+        raise ValueError(f"The node of type {node.__class__.__qualname__} has no extensions of type {self.__class__.__qualname__} for class {kind_name!r}")
 
     def text(self, node: TextIR, set_to: T = None) -> T:
-        return self._get_data(node, 'text', set_to)
+        return self._get_data(node, _TEXT, set_to)
 
     def program(self, node: ProgramIR, set_to: T = None) -> T:
-        return self._get_data(node, 'program', set_to)
+        return self._get_data(node, _PROGRAM, set_to)
 
     def source(self, node: SourceIR, set_to: T = None) -> T:
-        return self._get_data(node, 'source', set_to)
+        return self._get_data(node, _SOURCE, set_to)
 
     def top_level(self, node: TopLevelIR, set_to: T = None) -> T:
-        return self._get_data(node, 'top_level', set_to)
+        return self._get_data(node, _TOP_LEVEL, set_to)
 
     def import_(self, node: ImportIR, set_to: T = None) -> T:
-        return self._get_data(node, 'import_', set_to)
+        return self._get_data(node, _IMPORT, set_to)
 
     def function(self, node: FunctionIR, set_to: T = None) -> T:
-        return self._get_data(node, 'function', set_to)
+        return self._get_data(node, _FUNCTION, set_to)
 
     def struct(self, node: StructIR, set_to: T = None) -> T:
-        return self._get_data(node, 'struct', set_to)
+        return self._get_data(node, _STRUCT, set_to)
 
     def union(self, node: UnionIR, set_to: T = None) -> T:
-        return self._get_data(node, 'union', set_to)
+        return self._get_data(node, _UNION, set_to)
 
     def variant(self, node: VariantIR, set_to: T = None) -> T:
-        return self._get_data(node, 'variant', set_to)
+        return self._get_data(node, _VARIANT, set_to)
 
     def agg_func(self, node: AggFuncIR, set_to: T = None) -> T:
-        return self._get_data(node, 'agg_func', set_to)
+        return self._get_data(node, _AGG_FUNC, set_to)
 
     def agg_field(self, node: AggFieldIR, set_to: T = None) -> T:
-        return self._get_data(node, 'agg_field', set_to)
+        return self._get_data(node, _AGG_FIELD, set_to)
 
     def param(self, node: ParamIR, set_to: T = None) -> T:
-        return self._get_data(node, 'param', set_to)
+        return self._get_data(node, _PARAM, set_to)
 
     def func_attr(self, node: FuncAttrIR, set_to: T = None) -> T:
-        return self._get_data(node, 'func_attr', set_to)
+        return self._get_data(node, _FUNC_ATTR, set_to)
 
     def stmt(self, node: StmtIR, set_to: T = None) -> T:
-        return self._get_data(node, 'stmt', set_to)
+        return self._get_data(node, _STMT, set_to)
 
     def if_stmt(self, node: IfStmtIR, set_to: T = None) -> T:
-        return self._get_data(node, 'if_stmt', set_to)
+        return self._get_data(node, _IF_STMT, set_to)
 
     def while_stmt(self, node: WhileStmtIR, set_to: T = None) -> T:
-        return self._get_data(node, 'while_stmt', set_to)
+        return self._get_data(node, _WHILE_STMT, set_to)
 
     def var_decl(self, node: VarDeclIR, set_to: T = None) -> T:
-        return self._get_data(node, 'var_decl', set_to)
+        return self._get_data(node, _VAR_DECL, set_to)
 
     def block(self, node: BlockIR, set_to: T = None) -> T:
-        return self._get_data(node, 'block', set_to)
+        return self._get_data(node, _BLOCK, set_to)
 
     def return_(self, node: ReturnIR, set_to: T = None) -> T:
-        return self._get_data(node, 'return_', set_to)
+        return self._get_data(node, _RETURN, set_to)
 
     def expr_stmt(self, node: ExprStmtIR, set_to: T = None) -> T:
-        return self._get_data(node, 'expr_stmt', set_to)
+        return self._get_data(node, _EXPR_STMT, set_to)
 
     def expr(self, node: ExprIR, set_to: T = None) -> T:
-        return self._get_data(node, 'expr', set_to)
+        return self._get_data(node, _EXPR, set_to)
 
     def is_(self, node: IsIR, set_to: T = None) -> T:
-        return self._get_data(node, 'is_', set_to)
+        return self._get_data(node, _IS, set_to)
 
     def compare(self, node: CompareIR, set_to: T = None) -> T:
-        return self._get_data(node, 'compare', set_to)
+        return self._get_data(node, _COMPARE, set_to)
 
     def arithmetic(self, node: ArithmeticIR, set_to: T = None) -> T:
-        return self._get_data(node, 'arithmetic', set_to)
+        return self._get_data(node, _ARITHMETIC, set_to)
 
     def negate(self, node: NegateIR, set_to: T = None) -> T:
-        return self._get_data(node, 'negate', set_to)
+        return self._get_data(node, _NEGATE, set_to)
 
     def tuple(self, node: TupleIR, set_to: T = None) -> T:
-        return self._get_data(node, 'tuple', set_to)
+        return self._get_data(node, _TUPLE, set_to)
 
     def new(self, node: NewIR, set_to: T = None) -> T:
-        return self._get_data(node, 'new', set_to)
+        return self._get_data(node, _NEW, set_to)
 
     def call(self, node: CallIR, set_to: T = None) -> T:
-        return self._get_data(node, 'call', set_to)
+        return self._get_data(node, _CALL, set_to)
 
     def method_call(self, node: MethodCallIR, set_to: T = None) -> T:
-        return self._get_data(node, 'method_call', set_to)
+        return self._get_data(node, _METHOD_CALL, set_to)
 
     def get_var(self, node: GetVarIR, set_to: T = None) -> T:
-        return self._get_data(node, 'get_var', set_to)
+        return self._get_data(node, _GET_VAR, set_to)
 
     def set_var(self, node: SetVarIR, set_to: T = None) -> T:
-        return self._get_data(node, 'set_var', set_to)
+        return self._get_data(node, _SET_VAR, set_to)
 
     def get_attr(self, node: GetAttrIR, set_to: T = None) -> T:
-        return self._get_data(node, 'get_attr', set_to)
+        return self._get_data(node, _GET_ATTR, set_to)
 
     def set_attr(self, node: SetAttrIR, set_to: T = None) -> T:
-        return self._get_data(node, 'set_attr', set_to)
+        return self._get_data(node, _SET_ATTR, set_to)
 
     def intrinsic(self, node: IntrinsicIR, set_to: T = None) -> T:
-        return self._get_data(node, 'intrinsic', set_to)
+        return self._get_data(node, _INTRINSIC, set_to)
 
     def get_static_attr_expr(self, node: GetStaticAttrExprIR, set_to: T = None) -> T:
-        return self._get_data(node, 'get_static_attr_expr', set_to)
+        return self._get_data(node, _GET_STATIC_ATTR_EXPR, set_to)
 
     def cast_int(self, node: CastIntIR, set_to: T = None) -> T:
-        return self._get_data(node, 'cast_int', set_to)
+        return self._get_data(node, _CAST_INT, set_to)
 
     def cast_union(self, node: CastUnionIR, set_to: T = None) -> T:
-        return self._get_data(node, 'cast_union', set_to)
+        return self._get_data(node, _CAST_UNION, set_to)
 
     def lambda_(self, node: LambdaIR, set_to: T = None) -> T:
-        return self._get_data(node, 'lambda_', set_to)
+        return self._get_data(node, _LAMBDA, set_to)
 
     def int(self, node: IntIR, set_to: T = None) -> T:
-        return self._get_data(node, 'int', set_to)
+        return self._get_data(node, _INT, set_to)
 
     def annotation(self, node: AnnotationIR, set_to: T = None) -> T:
-        return self._get_data(node, 'annotation', set_to)
+        return self._get_data(node, _ANNOTATION, set_to)
 
     def type(self, node: TypeIR, set_to: T = None) -> T:
-        return self._get_data(node, 'type', set_to)
+        return self._get_data(node, _TYPE, set_to)
 
     def generated_type(self, node: GeneratedTypeIR, set_to: T = None) -> T:
-        return self._get_data(node, 'generated_type', set_to)
+        return self._get_data(node, _GENERATED_TYPE, set_to)
 
     def get_type(self, node: GetTypeIR, set_to: T = None) -> T:
-        return self._get_data(node, 'get_type', set_to)
+        return self._get_data(node, _GET_TYPE, set_to)
 
     def func_type(self, node: FuncTypeIR, set_to: T = None) -> T:
-        return self._get_data(node, 'func_type', set_to)
+        return self._get_data(node, _FUNC_TYPE, set_to)
 
     def tuple_type(self, node: TupleTypeIR, set_to: T = None) -> T:
-        return self._get_data(node, 'tuple_type', set_to)
+        return self._get_data(node, _TUPLE_TYPE, set_to)
 
     def no_type(self, node: NoTypeIR, set_to: T = None) -> T:
-        return self._get_data(node, 'no_type', set_to)
+        return self._get_data(node, _NO_TYPE, set_to)
 
     def malformed_type(self, node: MalformedTypeIR, set_to: T = None) -> T:
-        return self._get_data(node, 'malformed_type', set_to)
+        return self._get_data(node, _MALFORMED_TYPE, set_to)
 
     def namespace(self, node: NamespaceIR, set_to: T = None) -> T:
-        return self._get_data(node, 'namespace', set_to)
+        return self._get_data(node, _NAMESPACE, set_to)
 
     def get_namespace(self, node: GetNamespaceIR, set_to: T = None) -> T:
-        return self._get_data(node, 'get_namespace', set_to)
+        return self._get_data(node, _GET_NAMESPACE, set_to)
 
     def malformed_namespace(self, node: MalformedNamespaceIR, set_to: T = None) -> T:
-        return self._get_data(node, 'malformed_namespace', set_to)
+        return self._get_data(node, _MALFORMED_NAMESPACE, set_to)
 
     def ext(self, node: NodeIR, type: str, set_to: T = None) -> T:
-        return self._get_data(node, type, set_to)
+        return self._get_data(node, kind_index(type), set_to)
 
 
 E = TypeVar('E', bound=Extension)
@@ -5,6 +5,7 @@ from aizec.aize_common import Position, Source
 
 
 __all__ = [
+    'NodeIds',
     'NodeIR', 'TextIR',
     'ProgramIR', 'SourceIR',
     'TopLevelIR', 'FunctionIR', 'StructIR', 'ImportIR', 'UnionIR',
@@ -23,34 +24,62 @@ __all__ = [
 
 # region Base Nodes
 class NodeIR:
-    pass
+    __slots__ = ('node_id',)
+
+    def __init__(self):
+        self.node_id: int = -1
+        """The node's index in its IR's extension data, or -1 until it is given one"""
+
+
+class NodeIds:
+    """Hands out the dense ids of the nodes of one IR"""
+
+    def __init__(self):
+        self.count: int = 0
+
+    def assign(self, node: NodeIR) -> int:
+        node.node_id = node_id = self.count
+        self.count += 1
+        return node_id
 
 
 class TextIR(NodeIR):
+    __slots__ = ('pos',)
+
     def __init__(self, pos: Position):
+        super().__init__()
         self.pos = pos
 # endregion
 
 
 # region Program Nodes
 class ProgramIR(NodeIR):
+    __slots__ = ('sources',)
+
     def __init__(self, sources: List[SourceIR]):
+        super().__init__()
         self.sources = sources
 
 
 class SourceIR(NodeIR):
-    def __init__(self, top_levels: List[TopLevelIR], source_name: str):
+    __slots__ = ('top_levels', 'source_name', 'source')
+
+    def __init__(self, top_levels: List[TopLevelIR], source_name: str, source: Source = None):
+        super().__init__()
         self.top_levels = top_levels
         self.source_name = source_name
+        self.source: Optional[Source] = source
 # endregion
 
 
 # region Top Level Nodes
 class TopLevelIR(TextIR):
-    pass
+    __slots__ = ()
 
 
 class ImportIR(TopLevelIR):
+    __slots__ = ('source', 'path', 'source_ir')
+
     def __init__(self, source: Source, path: Path, pos: Position):
         super().__init__(pos)
         self.source = source
@@ -60,6 +89,8 @@ class ImportIR(TopLevelIR):
 
 
 class FunctionIR(TopLevelIR):
+    __slots__ = ('name', 'params', 'ret', 'body', 'attrs')
+
     def __init__(self, name: str, params: List[ParamIR], ret: TypeIR, body: List[StmtIR], attrs: List[FuncAttrIR], pos: Position):
         super().__init__(pos)
         self.name = name
@@ -70,6 +101,8 @@ class FunctionIR(TopLevelIR):
 
 
 class StructIR(TopLevelIR):
+    __slots__ = ('name', 'fields', 'funcs')
+
     def __init__(self, name: str, fields: List[AggFieldIR], funcs: List[AggFuncIR], pos: Position):
         super().__init__(pos)
 
@@ -79,6 +112,8 @@ class StructIR(TopLevelIR):
 
 
 class UnionIR(TopLevelIR):
+    __slots__ = ('name', 'variants', 'funcs')
+
     def __init__(self, name: str, variants: List[VariantIR], funcs: List[AggFuncIR], pos: Position):
         super().__init__(pos)
 
@@ -88,6 +123,8 @@ class UnionIR(TopLevelIR):
 
 
 class VariantIR(TextIR):
+    __slots__ = ('name', 'contains')
+
     def __init__(self, name: str, contains: TypeIR, pos: Position):
         super().__init__(pos)
 
@@ -97,6 +134,8 @@ class VariantIR(TextIR):
 
 # region Aggregate Statement Nodes
 class AggFieldIR(TextIR):
+    __slots__ = ('name', 'type')
+
     def __init__(self, name: str, type: TypeIR, pos: Position):
         super().__init__(pos)
         self.name = name
@@ -104,6 +143,8 @@ class AggFieldIR(TextIR):
 
 
 class AggFuncIR(TextIR):
+    __slots__ = ('name', 'params', 'ret', 'body')
+
     def __init__(self, name: str, params: List[ParamIR], ret: TypeIR, body: List[StmtIR], pos: Position):
         super().__init__(pos)
 
@@ -117,6 +158,8 @@ class AggFuncIR(TextIR):
 
 # region Function Other Node
 class ParamIR(TextIR):
+    __slots__ = ('name', 'type')
+
     def __init__(self, name: str, type: TypeIR, pos: Position):
         super().__init__(pos)
         self.name = name
@@ -124,6 +167,8 @@ class ParamIR(TextIR):
 
 
 class FuncAttrIR(TextIR):
+    __slots__ = ('name',)
+
     def __init__(self, name: str, pos: Position):
         super().__init__(pos)
         self.name = name
@@ -132,10 +177,12 @@ class FuncAttrIR(TextIR):
 
 # region Statement Nodes
 class StmtIR(TextIR):
-    pass
+    __slots__ = ()
 
 
 class VarDeclIR(StmtIR):
+    __slots__ = ('name', 'ann', 'value')
+
     def __init__(self, name: str, ann: AnnotationIR, value: ExprIR, pos: Position):
         super().__init__(pos)
         self.name = name
@@ -144,12 +191,16 @@ class VarDeclIR(StmtIR):
 
 
 class BlockIR(StmtIR):
+    __slots__ = ('stmts',)
+
     def __init__(self, stmts: List[StmtIR], pos: Position):
         super().__init__(pos)
         self.stmts = stmts
 
 
 class IfStmtIR(StmtIR):
+    __slots__ = ('cond', 'then_do', 'else_do')
+
     def __init__(self, cond: ExprIR, then_do: StmtIR, else_do: StmtIR, pos: Position):
         super().__init__(pos)
         self.cond = cond
@@ -158,6 +209,8 @@ class IfStmtIR(StmtIR):
 
 
 class WhileStmtIR(StmtIR):
+    __slots__ = ('cond', 'while_do')
+
     def __init__(self, cond: ExprIR, while_do: StmtIR, pos: Position):
         super().__init__(pos)
 
@@ -166,12 +219,16 @@ class WhileStmtIR(StmtIR):
 
 
 class ExprStmtIR(StmtIR):
+    __slots__ = ('expr',)
+
     def __init__(self, expr: ExprIR, pos: Position):
         super().__init__(pos)
         self.expr = expr
 
 
 class ReturnIR(StmtIR):
+    __slots__ = ('expr',)
+
     def __init__(self, expr: ExprIR, pos: Position):
         super().__init__(pos)
         self.expr = expr
@@ -180,10 +237,12 @@ class ReturnIR(StmtIR):
 
 # region Expression Nodes
 class ExprIR(TextIR):
-    pass
+    __slots__ = ()
 
 
 class IsIR(ExprIR):
+    __slots__ = ('expr', 'variant', 'to_var')
+
     def __init__(self, expr: ExprIR, variant: str, to_var: str, pos: Position):
         super().__init__(pos)
 
@@ -193,6 +252,8 @@ class IsIR(ExprIR):
 
 
 class CompareIR(ExprIR):
+    __slots__ = ('op', 'left', 'right')
+
     def __init__(self, op: str, left: ExprIR, right: ExprIR, pos: Position):
         super().__init__(pos)
         self.op = op
@@ -201,6 +262,8 @@ class CompareIR(ExprIR):
 
 
 class ArithmeticIR(ExprIR):
+    __slots__ = ('op', 'left', 'right')
+
     def __init__(self, op: str, left: ExprIR, right: ExprIR, pos: Position):
         super().__init__(pos)
         self.op = op
@@ -209,12 +272,16 @@ class ArithmeticIR(ExprIR):
 
 
 class NegateIR(ExprIR):
+    __slots__ = ('right',)
+
     def __init__(self, right: ExprIR, pos: Position):
         super().__init__(pos)
         self.right = right
 
 
 class NewIR(ExprIR):
+    __slots__ = ('type', 'arguments')
+
     def __init__(self, type: GetTypeIR, arguments: List[ExprIR], pos: Position):
         super().__init__(pos)
 
@@ -223,6 +290,8 @@ class NewIR(ExprIR):
 
 
 class CallIR(ExprIR):
+    __slots__ = ('callee', 'arguments')
+
     def __init__(self, callee: ExprIR, arguments: List[ExprIR], pos: Position):
         super().__init__(pos)
         self.callee = callee
@@ -230,6 +299,8 @@ class CallIR(ExprIR):
 
 
 class MethodCallIR(ExprIR):
+    __slots__ = ('obj', 'attr', 'arguments')
+
     def __init__(self, obj: ExprIR, attr: str, arguments: List[ExprIR], pos: Position):
         super().__init__(pos)
         self.obj = obj
@@ -238,12 +309,16 @@ class MethodCallIR(ExprIR):
 
 
 class GetVarIR(ExprIR):
+    __slots__ = ('var_name',)
+
     def __init__(self, var_name: str, pos: Position):
         super().__init__(pos)
         self.var_name = var_name
 
 
 class SetVarIR(ExprIR):
+    __slots__ = ('var_name', 'value')
+
     def __init__(self, var_name: str, value: ExprIR, pos: Position):
         super().__init__(pos)
         self.var_name = var_name
@@ -251,6 +326,8 @@ class SetVarIR(ExprIR):
 
 
 class GetAttrIR(ExprIR):
+    __slots__ = ('obj', 'attr')
+
     def __init__(self, obj: ExprIR, attr: str, pos: Position):
         super().__init__(pos)
 
@@ -259,6 +336,8 @@ class GetAttrIR(ExprIR):
 
 
 class GetStaticAttrExprIR(ExprIR):
+    __slots__ = ('namespace', 'attr')
+
     def __init__(self, namespace: NamespaceIR, attr: str, pos: Position):
         super().__init__(pos)
 
@@ -267,6 +346,8 @@ class GetStaticAttrExprIR(ExprIR):
 
 
 class SetAttrIR(ExprIR):
+    __slots__ = ('obj', 'attr', 'value')
+
     def __init__(self, obj: ExprIR, attr: str, value: ExprIR, pos: Position):
         super().__init__(pos)
 
@@ -276,6 +357,8 @@ class SetAttrIR(ExprIR):
 
 
 class IntrinsicIR(ExprIR):
+    __slots__ = ('name', 'args')
+
     def __init__(self, name: str, args: List[ExprIR], pos: Position):
         super().__init__(pos)
 
@@ -284,6 +367,8 @@ class IntrinsicIR(ExprIR):
 
 
 class CastIntIR(ExprIR):
+    __slots__ = ('expr', 'type')
+
     def __init__(self, expr: ExprIR, type: TypeIR, pos: Position):
         super().__init__(pos)
 
@@ -292,6 +377,8 @@ class CastIntIR(ExprIR):
 
 
 class CastUnionIR(ExprIR):
+    __slots__ = ('expr', 'to_union', 'from_variant')
+
     def __init__(self, expr: ExprIR, to_union: TypeIR, from_variant: TypeIR, pos: Position):
         super().__init__(pos)
 
@@ -301,6 +388,8 @@ class CastUnionIR(ExprIR):
 
 
 class LambdaIR(ExprIR):
+    __slots__ = ('params', 'body')
+
     def __init__(self, params: List[ParamIR], body: ExprIR, pos: Position):
         super().__init__(pos)
 
@@ -309,6 +398,8 @@ class LambdaIR(ExprIR):
 
 
 class TupleIR(ExprIR):
+    __slots__ = ('items',)
+
     def __init__(self, items: List[ExprIR], pos: Position):
         super().__init__(pos)
 
@@ -316,6 +407,8 @@ class TupleIR(ExprIR):
 
 
 class IntIR(ExprIR):
+    __slots__ = ('num',)
+
     def __init__(self, num: int, pos: Position):
         super().__init__(pos)
         self.num = num
@@ -324,10 +417,12 @@ class IntIR(ExprIR):
 
 # region Namespace Nodes
 class NamespaceIR(TextIR):
-    pass
+    __slots__ = ()
 
 
 class GetNamespaceIR(NamespaceIR):
+    __slots__ = ('name',)
+
     def __init__(self, name: str, pos: Position):
         super().__init__(pos)
 
@@ -335,6 +430,8 @@ class GetNamespaceIR(NamespaceIR):
 
 
 class MalformedNamespaceIR(NamespaceIR):
+    __slots__ = ()
+
     def __init__(self, pos: Position):
         super().__init__(pos)
 # endregion
@@ -342,6 +439,8 @@ class MalformedNamespaceIR(NamespaceIR):
 
 # region Annotation Node
 class AnnotationIR(TextIR):
+    __slots__ = ('type',)
+
     def __init__(self, type: TypeIR, pos: Position):
         super().__init__(pos)
         self.type = type
@@ -350,22 +449,30 @@ class AnnotationIR(TextIR):
 
 # region Type Nodes
 class TypeIR(TextIR):
+    __slots__ = ()
+
     def __init__(self, pos: Position):
         super().__init__(pos)
 
 
 class MalformedTypeIR(TypeIR):
+    __slots__ = ()
+
     def __init__(self, pos: Position):
         super().__init__(pos)
 
 
 class GetTypeIR(TypeIR):
+    __slots__ = ('name',)
+
     def __init__(self, name: str, pos: Position):
         super().__init__(pos)
         self.name = name
 
 
 class FuncTypeIR(TypeIR):
+    __slots__ = ('params', 'ret')
+
     def __init__(self, params: List[TypeIR], ret: TypeIR, pos: Position):
         super().__init__(pos)
         self.params = params
@@ -373,6 +480,8 @@ class FuncTypeIR(TypeIR):
 
 
 class TupleTypeIR(TypeIR):
+    __slots__ = ('items',)
+
     def __init__(self, items: List[TypeIR], pos: Position):
         super().__init__(pos)
 
@@ -380,11 +489,15 @@ class TupleTypeIR(TypeIR):
 
 
 class NoTypeIR(TypeIR):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(Position.new_none())
 
 
 class GeneratedTypeIR(TypeIR):
+    __slots__ = ()
+
     def __init__(self, pos: Position):
         super().__init__(pos)
 # endregion
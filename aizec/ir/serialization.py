@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+import gc
+import importlib
+import io
+import marshal
+import struct
+from array import array
+from collections import deque
+from itertools import repeat
+from operator import attrgetter
+from pathlib import PurePath
+from sys import intern, version_info
+
+from aizec.common import *
+
+from . import IR
+from .extensions import Extension, _KINDS, kind_index
+
+
+__all__ = ['IRFormatError', 'dump_ir', 'load_ir']
+
+
+class IRFormatError(ValueError):
+    pass
+
+
+MAGIC = b"AIZEIR"
+VERSION = 2
+# The payload is written with marshal, whose format can change between Python versions, so the header records the
+# version of Python that saved it after the format version
+_HEADER = struct.Struct("<6sHBB")
+_PYTHON = version_info[:2]
+
+# How the values of a column are stored
+_NONE, _REF, _STR, _INT, _BOOL, _REF_LIST, _INT_TUPLE, _ANY = range(8)
+# The tags of the values in _ANY columns which are not stored as themselves
+_TAG_STR, _TAG_REF, _TAG_LIST, _TAG_TUPLE, _TAG_DICT, _TAG_PATH, _TAG_MISSING = range(7)
+
+_PLAIN_TYPES = frozenset([type(None), bool, int, float])
+_LEAF_TYPES = _PLAIN_TYPES | {str}
+_MISSING = object()
+
+
+def _class_name(cls: type) -> str:
+    if not cls.__module__.startswith("aizec.") or "<locals>" in cls.__qualname__:
+        raise IRFormatError(f"Cannot save objects of type {cls.__module__}.{cls.__qualname__}")
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+def _resolve_class(name: str) -> type:
+    module_name, _, qualname = name.partition(":")
+    if not module_name.startswith("aizec."):
+        raise IRFormatError(f"Refusing to load objects of type {name}")
+    try:
+        obj = importlib.import_module(module_name)
+        for attr in qualname.split("."):
+            obj = getattr(obj, attr)
+    except (ImportError, AttributeError):
+        raise IRFormatError(f"No type {name} to load") from None
+    if not isinstance(obj, type):
+        raise IRFormatError(f"{name} is not a type")
+    return obj
+
+
+def _slot_names(cls: type) -> List[str]:
+    names = []
+    for klass in reversed(cls.__mro__):
+        slots = klass.__dict__.get('__slots__', ())
+        for name in [slots] if isinstance(slots, str) else slots:
+            if name not in ('__dict__', '__weakref__') and name not in names:
+                names.append(name)
+    return names
+
+
+class _Writer:
+    """
+    Flattens everything reachable from an IR into tables.
+
+    Objects are grouped by class, and each attribute of a class is stored as one column with an entry per object. A
+    column whose values all have one shape (say, all strings or all object references) is stored as a packed array.
+    """
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+
+        self._seen: Dict[int, Any] = {}
+        self._fields: Dict[type, List[str]] = {}
+        self._get_fields: Dict[type, Callable[[Any], Iterable[Any]]] = {}
+        self._groups: Dict[type, List[Any]] = {}
+        self._ids: Dict[int, int] = {}
+
+    def string(self, string: str) -> int:
+        try:
+            return self._string_ids[string]
+        except KeyError:
+            string_id = self._string_ids[string] = len(self.strings)
+            self.strings.append(string)
+            return string_id
+
+    # region Finding Objects
+    def add_roots(self, roots: Iterable[Any]):
+        seen, groups, get_fields = self._seen, self._groups, self._get_fields
+        # Every value is pushed, and the ones that aren't objects are skipped when popped, which is faster than
+        # checking them before pushing
+        stack = list(roots)
+        while stack:
+            value = stack.pop()
+            value_type = type(value)
+            if value_type in _LEAF_TYPES:
+                continue
+            elif value_type is list or value_type is tuple:
+                stack.extend(value)
+            elif value_type is dict:
+                stack.extend(value.keys())
+                stack.extend(value.values())
+            elif id(value) not in seen:
+                try:
+                    get = get_fields[value_type]
+                except KeyError:
+                    get = self._add_class(value_type)
+                if get is not None:
+                    seen[id(value)] = value
+                    groups[value_type].append(value)
+                    stack.extend(get(value))
+
+    def _add_class(self, cls: type) -> Optional[Callable[[Any], Iterable[Any]]]:
+        """Return a function getting the attributes of an object of class cls, or None if they aren't stored as objects"""
+        if issubclass(cls, (PurePath, io.IOBase)):
+            get = None
+        else:
+            _class_name(cls)
+            fields = self._fields[cls] = _slot_names(cls)
+            self._groups[cls] = []
+            if cls.__dictoffset__ == 0:
+                get_slots = attrgetter(*fields) if fields else (lambda obj: ())
+                get = (lambda obj: (get_slots(obj),)) if len(fields) == 1 else get_slots
+            else:
+                known = set(fields)
+                slots = fields.copy()
+
+                def get(obj: Any) -> Iterable[Any]:
+                    attrs = obj.__dict__
+                    if not known.issuperset(attrs):
+                        fields.extend(name for name in attrs if name not in known)
+                        known.update(attrs)
+                    if slots:
+                        return [*(getattr(obj, name, None) for name in slots), *attrs.values()]
+                    return attrs.values()
+
+        self._get_fields[cls] = get
+        return get
+    # endregion
+
+    def number_objects(self):
+        next_id = 0
+        for objects in self._groups.values():
+            for obj in objects:
+                self._ids[id(obj)] = next_id
+                next_id += 1
+        # References to None are stored as the index after the last object
+        self._ids[id(None)] = next_id
+
+    def ref(self, obj: Any) -> int:
+        return self._ids[id(obj)]
+
+    # region Encoding
+    def encode_column(self, values: List[Any]) -> tuple:
+        types = set(map(type, values))
+        none_type = type(None)
+        if types <= {none_type}:
+            return _NONE, len(values)
+        elif types == {str}:
+            return _STR, array('i', map(self.string, values)).tobytes()
+        elif types == {bool}:
+            return _BOOL, bytes(values)
+        elif types == {int}:
+            return _INT, values
+        elif types - {none_type} <= self._groups.keys():
+            return _REF, array('i', map(self._ids.__getitem__, map(id, values))).tobytes()
+        elif types == {list} and all(type(item) in self._groups for items in values for item in items):
+            lengths = array('i', map(len, values))
+            flat = array('i', [self._ids[id(item)] for items in values for item in items])
+            return _REF_LIST, lengths.tobytes(), flat.tobytes()
+        elif types == {tuple} and len(set(map(len, values))) == 1 and len(values[0]) > 0 \
+                and all(type(item) is int for items in values for item in items):
+            return _INT_TUPLE, len(values[0]), [item for items in values for item in items]
+        else:
+            return _ANY, [self.encode_any(value) for value in values]
+
+    def encode_any(self, value: Any) -> Any:
+        value_type = type(value)
+        if value_type in _PLAIN_TYPES:
+            return value
+        elif value_type is str:
+            return _TAG_STR, self.string(value)
+        elif value is _MISSING:
+            return (_TAG_MISSING,)
+        elif value_type is list:
+            return _TAG_LIST, [self.encode_any(item) for item in value]
+        elif value_type is tuple:
+            return _TAG_TUPLE, [self.encode_any(item) for item in value]
+        elif value_type is dict:
+            return _TAG_DICT, [self.encode_any(part) for item in value.items() for part in item]
+        elif isinstance(value, PurePath):
+            return _TAG_PATH, self.string(str(value))
+        elif isinstance(value, io.IOBase):
+            # Streams (like those of sources) can't be saved, and aren't needed once the source's text is read
+            return None
+        else:
+            return _TAG_REF, self._ids[id(value)]
+
+    def encode_objects(self) -> Tuple[List[str], List[int], List[List[Tuple[int, tuple]]]]:
+        class_names, counts, class_columns = [], [], []
+        for cls, objects in self._groups.items():
+            class_names.append(_class_name(cls))
+            counts.append(len(objects))
+            columns = []
+            for name in self._fields[cls]:
+                try:
+                    values = list(map(attrgetter(name), objects))
+                except AttributeError:
+                    values = [getattr(obj, name, _MISSING) for obj in objects]
+                columns.append((self.string(name), self.encode_column(values)))
+            class_columns.append(columns)
+        return class_names, counts, class_columns
+    # endregion
+
+
+class _Reader:
+    def __init__(self, strings: List[str]):
+        self.strings = strings
+        self.refs: List[Any] = []
+
+    def decode_column(self, column: tuple) -> List[Any]:
+        kind = column[0]
+        if kind == _NONE:
+            return [None] * column[1]
+        elif kind == _STR:
+            return list(map(self.strings.__getitem__, array('i', column[1])))
+        elif kind == _BOOL:
+            return list(map(bool, column[1]))
+        elif kind == _INT:
+            return column[1]
+        elif kind == _REF:
+            return list(map(self.refs.__getitem__, array('i', column[1])))
+        elif kind == _REF_LIST:
+            flat = list(map(self.refs.__getitem__, array('i', column[2])))
+            lists, start = [], 0
+            for length in array('i', column[1]):
+                lists.append(flat[start:start + length])
+                start += length
+            return lists
+        elif kind == _INT_TUPLE:
+            items = iter(column[2])
+            return list(zip(*[items] * column[1]))
+        elif kind == _ANY:
+            return [self.decode_any(value) for value in column[1]]
+        else:
+            raise IRFormatError(f"Unknown column kind {kind}")
+
+    def decode_any(self, value: Any) -> Any:
+        if type(value) is not tuple:
+            return value
+        tag = value[0]
+        if tag == _TAG_STR:
+            return self.strings[value[1]]
+        elif tag == _TAG_REF:
+            return self.refs[value[1]]
+        elif tag == _TAG_LIST:
+            return [self.decode_any(item) for item in value[1]]
+        elif tag == _TAG_TUPLE:
+            return tuple(self.decode_any(item) for item in value[1])
+        elif tag == _TAG_DICT:
+            parts = [self.decode_any(part) for part in value[1]]
+            return dict(zip(parts[::2], parts[1::2]))
+        elif tag == _TAG_PATH:
+            return Path(self.strings[value[1]])
+        elif tag == _TAG_MISSING:
+            return _MISSING
+        else:
+            raise IRFormatError(f"Unknown value tag {tag}")
+
+    def load_objects(self, class_names: List[str], counts: List[int], class_columns: List[List[Tuple[int, tuple]]]):
+        classes, groups = [], []
+        for class_name, count in zip(class_names, counts):
+            cls = _resolve_class(class_name)
+            objects = list(map(cls.__new__, repeat(cls, count)))
+            classes.append(cls)
+            groups.append(objects)
+            self.refs.extend(objects)
+        # References to None are stored as the index after the last object
+        self.refs.append(None)
+
+        for objects, columns in zip(groups, class_columns):
+            for name_id, column in columns:
+                name = self.strings[name_id]
+                values = self.decode_column(column)
+                if column[0] == _ANY:
+                    for obj, value in zip(objects, values):
+                        if value is not _MISSING:
+                            setattr(obj, name, value)
+                else:
+                    # Runs in C, which matters with a column for every attribute of every node
+                    deque(map(setattr, objects, repeat(name), values), maxlen=0)
+
+        # A class can fix up its instances just loaded, such as the interned types adding them to their table
+        for cls, objects in zip(classes, groups):
+            if hasattr(cls, '_ir_loaded'):
+                cls._ir_loaded(objects)
+
+
+def _pass_name(ir_pass: Any) -> str:
+    from aizec.ir_pass import IRPassSequence
+    if isinstance(ir_pass, IRPassSequence):
+        return "sequence:" + ir_pass.name
+    return _class_name(ir_pass)
+
+
+def _resolve_pass(name: str) -> Any:
+    from aizec.ir_pass import PassesRegister
+    if name.startswith("sequence:"):
+        try:
+            return PassesRegister.get_pass(name[len("sequence:"):])
+        except KeyError:
+            raise IRFormatError(f"No pass sequence {name[len('sequence:'):]} is registered") from None
+    return _resolve_class(name)
+
+
+@contextmanager
+def _gc_paused():
+    # Every object made or walked here lives on, so the collections they would set off can only waste time
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def dump_ir(ir: IR) -> bytes:
+    """Return ir, with its extensions and the passes run on it, in the binary IR format"""
+    with _gc_paused():
+        return _dump_ir(ir)
+
+
+def _dump_ir(ir: IR) -> bytes:
+    writer = _Writer()
+    extensions = list(ir.extensions.values())
+    writer.add_roots([ir.program, *(ext._general_data for ext in extensions), *(ext._node_data for ext in extensions)])
+    writer.number_objects()
+
+    kind_names = {index: name for name, index in _KINDS.items()}
+    encoded_extensions = []
+    for ext in extensions:
+        columns = [(kind_names[kind], writer.encode_column(data)) for kind, data in enumerate(ext._node_data) if data]
+        encoded_extensions.append((_class_name(type(ext)), writer.encode_any(ext._general_data), columns))
+    class_names, counts, class_columns = writer.encode_objects()
+    ran_passes = sorted(_pass_name(ir_pass) for ir_pass in ir.ran_passes)
+
+    payload = (writer.strings, class_names, counts, class_columns, writer.ref(ir.program), ir.node_ids.count,
+               encoded_extensions, ran_passes)
+    return _HEADER.pack(MAGIC, VERSION, *_PYTHON) + marshal.dumps(payload)
+
+
+def load_ir(data: bytes) -> IR:
+    """Load an IR saved by dump_ir"""
+    with _gc_paused():
+        return _load_ir(data)
+
+
+def _load_ir(data: bytes) -> IR:
+    if len(data) < _HEADER.size:
+        raise IRFormatError("Not an IR file")
+    magic, version, *python = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise IRFormatError("Not an IR file")
+    if version != VERSION:
+        raise IRFormatError(f"The IR file has format version {version}, but version {VERSION} is supported")
+    if tuple(python) != _PYTHON:
+        raise IRFormatError(f"The IR file was saved by Python {python[0]}.{python[1]}, but can only be loaded by the same version")
+    try:
+        payload = marshal.loads(memoryview(data)[_HEADER.size:])
+        strings, class_names, counts, class_columns, program_ref, node_count, extensions, ran_passes = payload
+    except (EOFError, ValueError, TypeError):
+        raise IRFormatError("The IR file is corrupt") from None
+
+    # Interned like the names they were saved from, so lookups in the loaded IR are as quick
+    reader = _Reader(list(map(intern, strings)))
+    try:
+        reader.load_objects(class_names, counts, class_columns)
+        ir = IR(reader.refs[program_ref])
+        ir.node_ids.count = node_count
+        for class_name, general, columns in extensions:
+            ext_type = _resolve_class(class_name)
+            if not issubclass(ext_type, Extension):
+                raise IRFormatError(f"{class_name} is not an extension")
+            ext = ext_type.create(ir.node_ids)
+            ext._general_data = reader.decode_any(general)
+            for kind_name, column in columns:
+                kind = kind_index(kind_name)
+                while kind >= len(ext._node_data):
+                    ext._node_data.append([])
+                ext._node_data[kind] = reader.decode_column(column)
+            ir.extensions[ext_type] = ext
+    except (IndexError, AttributeError, TypeError):
+        raise IRFormatError("The IR file is corrupt") from None
+    ir.ran_passes = {_resolve_pass(name) for name in ran_passes}
+    return ir
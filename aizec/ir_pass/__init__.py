@@ -1 +1 @@
-from .aize_ir_pass import IRPass, IRTreePass, IRPassSequence, PassScheduler, PassesRegister, PassAlias
+from .aize_ir_pass import IRPass, IRTreePass, IRPassSequence, FusedTreePasses, PassScheduler, SchedulingError, PassesRegister, PassAlias
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
 from abc import ABCMeta
+from collections import deque
+from contextlib import ExitStack
 
 from aizec.common import *
+from aizec.aize_common import StageTimer
 
 from aizec.ir import IR, Extension
 from aizec.ir.nodes import *
@@ -11,7 +14,69 @@ from aizec.ir.nodes import *
 E = TypeVar('E', bound=Extension)
 
 
+# The visitor method for each kind of node, by the IRVisitor method that dispatches to it
+_TOP_LEVEL_METHODS: Dict[type, str] = {
+    FunctionIR: 'visit_function',
+    StructIR: 'visit_struct',
+    ImportIR: 'visit_import',
+    UnionIR: 'visit_union',
+}
+_STMT_METHODS: Dict[type, str] = {
+    ReturnIR: 'visit_return',
+    IfStmtIR: 'visit_if',
+    WhileStmtIR: 'visit_while',
+    BlockIR: 'visit_block',
+    VarDeclIR: 'visit_var_decl',
+    ExprStmtIR: 'visit_expr_stmt',
+}
+_EXPR_METHODS: Dict[type, str] = {
+    IntIR: 'visit_int',
+    IntrinsicIR: 'visit_intrinsic',
+    NewIR: 'visit_new',
+    CallIR: 'visit_call',
+    MethodCallIR: 'visit_method_call',
+    GetVarIR: 'visit_get_var',
+    SetVarIR: 'visit_set_var',
+    GetAttrIR: 'visit_get_attr',
+    SetAttrIR: 'visit_set_attr',
+    CompareIR: 'visit_compare',
+    ArithmeticIR: 'visit_arithmetic',
+    NegateIR: 'visit_negate',
+    GetStaticAttrExprIR: 'visit_get_static_attr_expr',
+    CastIntIR: 'visit_cast_int',
+    CastUnionIR: 'visit_cast_union',
+    LambdaIR: 'visit_lambda',
+    TupleIR: 'visit_tuple',
+    IsIR: 'visit_is',
+}
+_TYPE_METHODS: Dict[type, str] = {
+    GetTypeIR: 'visit_get_type',
+    NoTypeIR: 'visit_no_type',
+    FuncTypeIR: 'visit_func_type',
+    TupleTypeIR: 'visit_tuple_type',
+}
+_NAMESPACE_METHODS: Dict[type, str] = {
+    GetNamespaceIR: 'visit_get_namespace',
+    MalformedNamespaceIR: 'visit_malformed_namespace',
+}
+
+
 class IRVisitor(ABC):
+    _top_level_dispatch: DispatchTable
+    _stmt_dispatch: DispatchTable
+    _expr_dispatch: DispatchTable
+    _type_dispatch: DispatchTable
+    _namespace_dispatch: DispatchTable
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Built once per visitor class, so visiting a node is a dict lookup on its type instead of an isinstance chain
+        cls._top_level_dispatch = DispatchTable(cls, _TOP_LEVEL_METHODS)
+        cls._stmt_dispatch = DispatchTable(cls, _STMT_METHODS)
+        cls._expr_dispatch = DispatchTable(cls, _EXPR_METHODS)
+        cls._type_dispatch = DispatchTable(cls, _TYPE_METHODS)
+        cls._namespace_dispatch = DispatchTable(cls, _NAMESPACE_METHODS)
+
     @abstractmethod
     def visit_program(self, program: ProgramIR):
         pass
@@ -21,16 +86,11 @@ class IRVisitor(ABC):
         pass
 
     def visit_top_level(self, top_level: TopLevelIR):
-        if isinstance(top_level, FunctionIR):
-            return self.visit_function(top_level)
-        elif isinstance(top_level, StructIR):
-            return self.visit_struct(top_level)
-        elif isinstance(top_level, ImportIR):
-            return self.visit_import(top_level)
-        elif isinstance(top_level, UnionIR):
-            return self.visit_union(top_level)
-        else:
-            raise TypeError(f"Expected a top-level node, got {top_level}")
+        try:
+            visit = self._top_level_dispatch[top_level.__class__]
+        except KeyError:
+            raise TypeError(f"Expected a top-level node, got {top_level}") from None
+        return visit(self, top_level)
 
     @abstractmethod
     def visit_import(self, imp: ImportIR):
@@ -61,20 +121,11 @@ class IRVisitor(ABC):
         pass
 
     def visit_stmt(self, stmt: StmtIR):
-        if isinstance(stmt, ReturnIR):
-            return self.visit_return(stmt)
-        elif isinstance(stmt, IfStmtIR):
-            return self.visit_if(stmt)
-        elif isinstance(stmt, WhileStmtIR):
-            return self.visit_while(stmt)
-        elif isinstance(stmt, BlockIR):
-            return self.visit_block(stmt)
-        elif isinstance(stmt, VarDeclIR):
-            return self.visit_var_decl(stmt)
-        elif isinstance(stmt, ExprStmtIR):
-            return self.visit_expr_stmt(stmt)
-        else:
-            raise TypeError(f"Expected a stmt node, got {stmt}")
+        try:
+            visit = self._stmt_dispatch[stmt.__class__]
+        except KeyError:
+            raise TypeError(f"Expected a stmt node, got {stmt}") from None
+        return visit(self, stmt)
 
     @abstractmethod
     def visit_if(self, if_: IfStmtIR):
@@ -101,44 +152,11 @@ class IRVisitor(ABC):
         pass
 
     def visit_expr(self, expr: ExprIR):
-        if isinstance(expr, IntIR):
-            return self.visit_int(expr)
-        elif isinstance(expr, IntrinsicIR):
-            return self.visit_intrinsic(expr)
-        elif isinstance(expr, NewIR):
-            return self.visit_new(expr)
-        elif isinstance(expr, CallIR):
-            return self.visit_call(expr)
-        elif isinstance(expr, MethodCallIR):
-            return self.visit_method_call(expr)
-        elif isinstance(expr, GetVarIR):
-            return self.visit_get_var(expr)
-        elif isinstance(expr, SetVarIR):
-            return self.visit_set_var(expr)
-        elif isinstance(expr, GetAttrIR):
-            return self.visit_get_attr(expr)
-        elif isinstance(expr, SetAttrIR):
-            return self.visit_set_attr(expr)
-        elif isinstance(expr, CompareIR):
-            return self.visit_compare(expr)
-        elif isinstance(expr, ArithmeticIR):
-            return self.visit_arithmetic(expr)
-        elif isinstance(expr, NegateIR):
-            return self.visit_negate(expr)
-        elif isinstance(expr, GetStaticAttrExprIR):
-            return self.visit_get_static_attr_expr(expr)
-        elif isinstance(expr, CastIntIR):
-            return self.visit_cast_int(expr)
-        elif isinstance(expr, CastUnionIR):
-            return self.visit_cast_union(expr)
-        elif isinstance(expr, LambdaIR):
-            return self.visit_lambda(expr)
-        elif isinstance(expr, TupleIR):
-            return self.visit_tuple(expr)
-        elif isinstance(expr, IsIR):
-            return self.visit_is(expr)
-        else:
-            raise TypeError(f"Expected a expr node, got {expr}")
+        try:
+            visit = self._expr_dispatch[expr.__class__]
+        except KeyError:
+            raise TypeError(f"Expected a expr node, got {expr}") from None
+        return visit(self, expr)
 
     @abstractmethod
     def visit_is(self, is_: IsIR):
@@ -217,16 +235,11 @@ class IRVisitor(ABC):
         pass
 
     def visit_type(self, type: TypeIR):
-        if isinstance(type, GetTypeIR):
-            return self.visit_get_type(type)
-        elif isinstance(type, NoTypeIR):
-            return self.visit_no_type(type)
-        elif isinstance(type, FuncTypeIR):
-            return self.visit_func_type(type)
-        elif isinstance(type, TupleTypeIR):
-            return self.visit_tuple_type(type)
-        else:
-            raise TypeError(f"Expected a type node, got {type}")
+        try:
+            visit = self._type_dispatch[type.__class__]
+        except KeyError:
+            raise TypeError(f"Expected a type node, got {type}") from None
+        return visit(self, type)
 
     @abstractmethod
     def visit_tuple_type(self, type: TupleTypeIR):
@@ -245,12 +258,11 @@ class IRVisitor(ABC):
         pass
 
     def visit_namespace(self, namespace: NamespaceIR):
-        if isinstance(namespace, GetNamespaceIR):
-            return self.visit_get_namespace(namespace)
-        elif isinstance(namespace, MalformedNamespaceIR):
-            return self.visit_malformed_namespace(namespace)
-        else:
-            raise TypeError(f"Expected a namespace node, got {namespace}")
+        try:
+            visit = self._namespace_dispatch[namespace.__class__]
+        except KeyError:
+            raise TypeError(f"Expected a namespace node, got {namespace}") from None
+        return visit(self, namespace)
 
     @abstractmethod
     def visit_get_namespace(self, namespace: GetNamespaceIR):
@@ -273,6 +285,15 @@ class IRPass(ABC):
     def run_pass(self, ir: IR):
         pass
 
+    def get_required_passes(self) -> Set[PassAlias]:
+        return set()
+
+    def get_required_extensions(self) -> Set[Type[Extension]]:
+        return set()
+
+    def get_added_extensions(self) -> Set[Type[Extension]]:
+        return set()
+
 
 # region Metaclass Magic
 class IRPassMetaclass(IRPass, ABC, ABCMeta):
@@ -304,6 +325,11 @@ class IRPassClass:
 
 
 class IRTreePass(IRVisitor, IRPassClass, ABC):
+    # A fusable pass can be run in the same walk as the fusable passes scheduled with it. Its walk must be made of
+    # program_context, source_context, and visit_top_level, and its work on a top level may only depend on the passes
+    # it requires having finished with that same top level.
+    fusable: bool = False
+
     def __init__(self, ir: IR):
         self.ir = ir
 
@@ -320,9 +346,10 @@ class IRTreePass(IRVisitor, IRPassClass, ABC):
         pass
 
     @classmethod
-    def can_run(cls, ir: IR) -> bool:
-        if ir.ran_passes.issuperset(cls.get_required_passes()) \
-                and set(ir.extensions.keys()).issuperset(cls.get_required_extensions()):
+    def can_run(cls, ir: IR, also_ran: Set[PassAlias] = frozenset()) -> bool:
+        extensions = set(ir.extensions.keys()).union(*(ir_pass.get_added_extensions() for ir_pass in also_ran))
+        if ir.ran_passes.union(also_ran).issuperset(cls.get_required_passes()) \
+                and extensions.issuperset(cls.get_required_extensions()):
             return True
         else:
             return False
@@ -337,9 +364,14 @@ class IRTreePass(IRVisitor, IRPassClass, ABC):
     def get_required_extensions(cls) -> Set[Type[Extension]]:
         pass
 
+    @classmethod
+    def get_added_extensions(cls) -> Set[Type[Extension]]:
+        """The extensions this pass adds to the IR, so the passes requiring them are scheduled after it"""
+        return set()
+
     def add_ext(self, ext_type: Type[E]) -> E:
         ext_type: Type[Extension]
-        ext = ext_type.create()
+        ext = ext_type.create(self.ir.node_ids)
         self.ir.extensions[ext_type] = ext
         return ext
 
@@ -352,11 +384,23 @@ class IRTreePass(IRVisitor, IRPassClass, ABC):
         except KeyError:
             raise ValueError(f"Extension {ext_type} has not been added to the ir yet. Specify that requirement.")
 
+    @contextmanager
+    def program_context(self, program: ProgramIR):
+        yield
+
+    @contextmanager
+    def source_context(self, source: SourceIR):
+        yield
+
     def visit_program(self, program: ProgramIR):
-        pass
+        with self.program_context(program):
+            for source in program.sources:
+                self.visit_source(source)
 
     def visit_source(self, source: SourceIR):
-        pass
+        with self.source_context(source):
+            for top_level in source.top_levels:
+                self.visit_top_level(top_level)
 
     def visit_import(self, imp: ImportIR):
         pass
@@ -479,7 +523,20 @@ class IRPassSequence(IRPass):
         self.passes: List[IRPass] = [] if passes is None else passes
 
     def can_run(self, ir: IR) -> bool:
-        return any(ir_pass.can_run(ir) for ir_pass in self.passes)
+        return ir.ran_passes.issuperset(self.get_required_passes()) \
+            and set(ir.extensions.keys()).issuperset(self.get_required_extensions())
+
+    def get_required_passes(self) -> Set[PassAlias]:
+        # Only the requirements from outside the sequence, as the sequence orders its own passes
+        contained = set(_contained_passes(self))
+        return {required for ir_pass in self.passes for required in ir_pass.get_required_passes()} - contained
+
+    def get_required_extensions(self) -> Set[Type[Extension]]:
+        required = set().union(*(ir_pass.get_required_extensions() for ir_pass in self.passes))
+        return required - self.get_added_extensions()
+
+    def get_added_extensions(self) -> Set[Type[Extension]]:
+        return set().union(*(ir_pass.get_added_extensions() for ir_pass in self.passes))
 
     def add_pass(self, ir_pass: IRPass):
         self.passes.append(ir_pass)
@@ -491,9 +548,57 @@ class IRPassSequence(IRPass):
         ir.ran_passes.add(self)
 
 
+class FusedTreePasses(IRPass):
+    """Runs several fusable tree passes in one walk of the program, visiting each top level with each pass in order"""
+
+    def __init__(self, passes: List[Type[IRTreePass]]):
+        super().__init__(" + ".join(ir_pass.name for ir_pass in passes))
+        self.passes: List[Type[IRTreePass]] = passes
+
+    def can_run(self, ir: IR) -> bool:
+        return all(ir_pass.can_run(ir, also_ran=set(self.passes[:i])) for i, ir_pass in enumerate(self.passes))
+
+    def get_required_passes(self) -> Set[PassAlias]:
+        return set().union(*(ir_pass.get_required_passes() for ir_pass in self.passes)) - set(self.passes)
+
+    def get_required_extensions(self) -> Set[Type[Extension]]:
+        required = set().union(*(ir_pass.get_required_extensions() for ir_pass in self.passes))
+        return required - self.get_added_extensions()
+
+    def get_added_extensions(self) -> Set[Type[Extension]]:
+        return set().union(*(ir_pass.get_added_extensions() for ir_pass in self.passes))
+
+    def run_pass(self, ir: IR):
+        # Creating a pass can add the extensions the passes after it need, so they are created in order
+        passes = [pass_class(ir) for pass_class in self.passes]
+
+        program = ir.program
+        with ExitStack() as program_contexts:
+            for ir_pass in passes:
+                program_contexts.enter_context(ir_pass.program_context(program))
+            for source in program.sources:
+                with ExitStack() as source_contexts:
+                    for ir_pass in passes:
+                        source_contexts.enter_context(ir_pass.source_context(source))
+                    for top_level in source.top_levels:
+                        for ir_pass in passes:
+                            ir_pass.visit_top_level(top_level)
+
+        for ir_pass in passes:
+            if ir_pass.was_successful():
+                ir.ran_passes.add(ir_pass.__class__)
+
+
 PassAlias = Union[IRPass, Type[IRTreePass]]
 
 
+def _contained_passes(ir_pass: PassAlias) -> Iterator[PassAlias]:
+    yield ir_pass
+    if isinstance(ir_pass, IRPassSequence):
+        for contained in ir_pass.passes:
+            yield from _contained_passes(contained)
+
+
 class PassesRegister:
     _instance_ = None
 
@@ -542,7 +647,19 @@ class PassesRegister:
         return cls._instance()._passes[name]
 
 
+class SchedulingError(ValueError):
+    pass
+
+
 class PassScheduler:
+    """
+    Runs passes in an order that meets their requirements.
+
+    The order is planned once, by sorting the graph of which scheduled passes require which (directly, or through the
+    extensions they add) so each pass comes after the passes it requires. Passes keep the order they were scheduled in
+    where their requirements allow it, and neighbouring fusable passes are fused into one walk.
+    """
+
     def __init__(self, ir: IR, scheduled_passes: List[PassAlias]):
         self.ir = ir
         self.scheduled_passes: List[PassAlias] = scheduled_passes
@@ -554,13 +671,101 @@ class PassScheduler:
             self.scheduled_passes.append(ir_pass)
             return True
 
+    @staticmethod
+    def is_fusable(ir_pass: PassAlias) -> bool:
+        return isinstance(ir_pass, type) and issubclass(ir_pass, IRTreePass) and ir_pass.fusable
+
+    def build_graph(self) -> Dict[PassAlias, List[PassAlias]]:
+        """Map each scheduled pass to the scheduled passes that must run before it"""
+        providers: Dict[Union[PassAlias, Type[Extension]], PassAlias] = {}
+        for ir_pass in self.scheduled_passes:
+            for contained in _contained_passes(ir_pass):
+                providers[contained] = ir_pass
+            for ext in ir_pass.get_added_extensions():
+                providers.setdefault(ext, ir_pass)
+
+        graph: Dict[PassAlias, List[PassAlias]] = {}
+        for ir_pass in self.scheduled_passes:
+            before = graph[ir_pass] = []
+            for required in ir_pass.get_required_passes():
+                if required in self.ir.ran_passes:
+                    continue
+                try:
+                    before.append(providers[required])
+                except KeyError:
+                    raise SchedulingError(f"{ir_pass.name} requires {required.name}, "
+                                          f"which has not been run or scheduled") from None
+            for ext in ir_pass.get_required_extensions():
+                if ext in self.ir.extensions or ext in ir_pass.get_added_extensions():
+                    continue
+                try:
+                    before.append(providers[ext])
+                except KeyError:
+                    raise SchedulingError(f"{ir_pass.name} requires the extension {ext.__name__}, "
+                                          f"which no run or scheduled pass adds") from None
+        return graph
+
+    def plan(self) -> List[PassAlias]:
+        """Return the scheduled passes in the order they will be run, with neighbouring fusable passes fused"""
+        graph = self.build_graph()
+
+        dependents: Dict[PassAlias, List[PassAlias]] = {ir_pass: [] for ir_pass in graph}
+        waiting: Dict[PassAlias, int] = {}
+        for ir_pass, before in graph.items():
+            before = set(before)
+            waiting[ir_pass] = len(before)
+            for required in before:
+                dependents[required].append(ir_pass)
+
+        ready = deque(ir_pass for ir_pass in self.scheduled_passes if waiting[ir_pass] == 0)
+        order: List[PassAlias] = []
+        while ready:
+            ir_pass = ready.popleft()
+            order.append(ir_pass)
+            for dependent in dependents[ir_pass]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+
+        if len(order) < len(graph):
+            cycle = self._find_cycle(graph, {ir_pass for ir_pass, count in waiting.items() if count > 0})
+            raise SchedulingError(f"The scheduled passes require each other in a cycle: "
+                                  f"{' -> '.join(ir_pass.name for ir_pass in cycle)}")
+
+        return self._fuse(order)
+
+    def _find_cycle(self, graph: Dict[PassAlias, List[PassAlias]], unordered: Set[PassAlias]) -> List[PassAlias]:
+        # Every pass left unordered is waiting on another unordered pass, so following them must come back around
+        ir_pass = next(ir_pass for ir_pass in self.scheduled_passes if ir_pass in unordered)
+        path: List[PassAlias] = []
+        seen: Dict[PassAlias, int] = {}
+        while ir_pass not in seen:
+            seen[ir_pass] = len(path)
+            path.append(ir_pass)
+            ir_pass = next(required for required in graph[ir_pass] if required in unordered)
+        return path[seen[ir_pass]:] + [ir_pass]
+
+    def _fuse(self, order: List[PassAlias]) -> List[PassAlias]:
+        steps: List[PassAlias] = []
+        group: List[Type[IRTreePass]] = []
+        for ir_pass in order + [None]:
+            if ir_pass is not None and self.is_fusable(ir_pass):
+                group.append(ir_pass)
+                continue
+            if len(group) == 1:
+                steps.append(group[0])
+            elif len(group) > 1:
+                steps.append(FusedTreePasses(group))
+            group = []
+            if ir_pass is not None:
+                steps.append(ir_pass)
+        return steps
+
     def run_scheduled(self):
-        while len(self.scheduled_passes) > 0:
-            for i in range(len(self.scheduled_passes)):
-                ir_pass = self.scheduled_passes[i]
-                if ir_pass.can_run(self.ir):
-                    ir_pass.run_pass(self.ir)
-                    self.scheduled_passes.pop(i)
-                    break
-            else:
-                raise ValueError("No passes can be run due to their requirements.")
+        steps = self.plan()
+        self.scheduled_passes.clear()
+        for step in steps:
+            if not step.can_run(self.ir):
+                raise SchedulingError(f"{step.name} cannot be run, as a pass it requires did not succeed")
+            with StageTimer.stage(step.name):
+                step.run_pass(self.ir)
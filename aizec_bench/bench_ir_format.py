@@ -0,0 +1,63 @@
+"""
+Compare saving and loading an analyzed IR in the binary IR format with pickling it.
+
+Run from the repository root:
+
+    python aizec_bench/bench_ir_format.py [functions]
+
+Prints the size of each and the best time of several runs to save and to load it.
+"""
+import io
+import pickle
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from aizec.aize_common import StreamSource, MessageHandler, ErrorLevel
+from aizec.aize_frontend import AizeParser, ProgramAST
+from aizec.analysis import DefaultPasses
+from aizec.ir import IR
+from aizec.ir.serialization import dump_ir, load_ir
+from aizec.ir_pass import PassScheduler
+
+from bench_memory import make_program
+
+
+RUNS = 3
+
+
+def best_time(func, arg) -> tuple:
+    times = []
+    result = None
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        result = func(arg)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    MessageHandler.set_config(fail_ge=ErrorLevel.ERROR)
+
+    source_ast = AizeParser.parse(StreamSource("<bench>", io.StringIO(make_program(functions))))
+    ir = IR.from_ast(ProgramAST([source_ast]))
+    PassScheduler(ir, [DefaultPasses]).run_scheduled()
+    print(f"{functions} functions, {ir.node_ids.count} nodes")
+
+    formats = {
+        "ir format": (dump_ir, load_ir),
+        "pickle": (lambda obj: pickle.dumps(obj, pickle.HIGHEST_PROTOCOL), pickle.loads),
+    }
+    print(f"{'Format':<12} {'Size (MiB)':>11} {'Save (ms)':>11} {'Load (ms)':>11}")
+    for name, (dump, load) in formats.items():
+        save_time, data = best_time(dump, ir)
+        load_time, _ = best_time(load, data)
+        print(f"{name:<12} {len(data) / 1024 / 1024:>11.1f} {save_time * 1000:>11.1f} {load_time * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Measure handing a module built with llvmlite.ir to LLVM, which is done by printing it as text and parsing the text.
+
+Run from the repository root:
+
+    python aizec_bench/bench_llvm_handoff.py [functions]
+
+The module has as many small functions as given (50000 by default), shaped like the ones the compiler generates.
+"print" is LLVMBackend.print_module, "parse" is parsing what it printed, and "bitcode write" and "bitcode read" are
+turning the parsed module into bitcode and back, for comparison.
+"""
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+import llvmlite.ir as ir
+import llvmlite.binding as llvm
+
+from aizec.aize_backend.aize_llvm_backend import LLVMBackend, initialize_llvm
+
+
+def make_module(functions: int) -> ir.Module:
+    mod = ir.Module("bench")
+    int32 = ir.IntType(32)
+    pair = ir.LiteralStructType([ir.IntType(8), ir.LiteralStructType([int32, ir.IntType(64)])])
+    func_type = ir.FunctionType(int32, [int32, pair])
+    prev = None
+    for n in range(functions):
+        func = ir.Function(mod, func_type, f"func{n}")
+        entry = func.append_basic_block("entry")
+        then = func.append_basic_block("then")
+        done = func.append_basic_block("done")
+        builder = ir.IRBuilder(entry)
+        num, value = func.args
+        slot = builder.alloca(pair)
+        builder.store(value, slot)
+        total = builder.add(num, ir.Constant(int32, n))
+        builder.cbranch(builder.icmp_signed(">", total, ir.Constant(int32, 0)), then, done)
+        builder.position_at_end(then)
+        if prev is not None:
+            total = builder.call(prev, [total, builder.load(slot)])
+        builder.branch(done)
+        builder.position_at_end(done)
+        result = builder.phi(int32)
+        result.add_incoming(num, entry)
+        result.add_incoming(total, then)
+        builder.ret(result)
+        prev = func
+    return mod
+
+
+def timed(label: str, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"{label:<24} {(time.perf_counter() - start) * 1000:>10.1f} ms")
+    return result
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    initialize_llvm()
+    mod = make_module(functions)
+    mod.triple = llvm.get_default_triple()
+
+    text = timed("print", LLVMBackend.print_module, mod)
+    llvm_mod = timed("parse", llvm.parse_assembly, text)
+    bitcode = timed("bitcode write", llvm_mod.as_bitcode)
+    timed("bitcode read", llvm.parse_bitcode, bitcode)
+    print(f"{'text size':<24} {len(text) / 2 ** 20:>10.1f} MiB")
+    print(f"{'bitcode size':<24} {len(bitcode) / 2 ** 20:>10.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
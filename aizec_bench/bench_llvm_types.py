@@ -0,0 +1,70 @@
+"""
+Measure generating LLVM IR for a program whose functions pass unions around, which lowers the same types many times.
+
+Run from the repository root:
+
+    python aizec_bench/bench_llvm_types.py [functions]
+
+Prints the best time of several runs of the GenerateLLVM passes on a program analyzed once.
+"""
+import io
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from aizec.aize_common import StreamSource, MessageHandler, ErrorLevel
+from aizec.aize_frontend import AizeParser, ProgramAST
+from aizec.analysis import DefaultPasses, MangleNames
+from aizec.aize_backend.aize_llvm_backend import InitLLVM, DeclareFunctions, DefineFunctions, initialize_llvm
+from aizec.ir import IR
+from aizec.ir_pass import PassScheduler
+
+
+UNION = """
+union Shape {
+    Circle = int32;
+    Square = int64;
+    Pair = (int32, int64);
+}
+"""
+
+FUNCTION = """
+def pass{n}(s: Shape, t: Shape, n: int32) -> Shape {{
+    var u: Shape = s;
+    if (n > 0) {{
+        u = t;
+    }}
+    var v: Shape = u;
+    return v;
+}}
+"""
+
+RUNS = 3
+
+
+def make_program(functions: int) -> str:
+    return UNION + "".join(FUNCTION.format(n=n) for n in range(functions))
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    MessageHandler.set_config(fail_ge=ErrorLevel.ERROR)
+    initialize_llvm()
+
+    times = []
+    for _ in range(RUNS):
+        source_ast = AizeParser.parse(StreamSource("<bench>", io.StringIO(make_program(functions))))
+        ir = IR.from_ast(ProgramAST([source_ast]))
+        PassScheduler(ir, [DefaultPasses, MangleNames]).run_scheduled()
+
+        start = time.perf_counter()
+        PassScheduler(ir, [InitLLVM, DeclareFunctions, DefineFunctions]).run_scheduled()
+        times.append(time.perf_counter() - start)
+    print(f"{'generate LLVM IR':<24} {min(times) * 1000:>10.1f} ms ({functions} functions)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Measure name lookups, on their own and as part of analyzing a program full of name references.
+
+Run from the repository root:
+
+    python aizec_bench/bench_lookup.py [functions]
+
+"lookup" times NamespaceSymbol lookups from a function's namespace of a local, a global, and a builtin type.
+"analysis" times the default analysis passes on a synthetic program where every statement refers to several locals,
+globals, and types.
+"""
+import io
+import sys
+import time
+import timeit
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from aizec.aize_common import StreamSource, MessageHandler, ErrorLevel, Position
+from aizec.aize_frontend import AizeParser, ProgramAST
+from aizec.analysis import DefaultPasses
+from aizec.analysis.symbols import NamespaceSymbol, VariableSymbol, IntTypeSymbol
+from aizec.ir import IR
+from aizec.ir_pass import PassScheduler
+
+
+FUNCTION = """
+def func{n}(a: int32, b: int32) -> int32 {{
+    var total: int32 = a + b;
+    var count: int32 = 0;
+    while (count < a) {{
+        total = total + func{prev}(count, b) * a;
+        count = count + 1;
+    }}
+    if (total > b) {{
+        return total - func{prev}(a, count);
+    }}
+    return total + count + a + b;
+}}
+"""
+
+LOOKUP_RUNS = 200_000
+
+
+def make_program(functions: int) -> str:
+    return "".join(FUNCTION.format(n=n, prev=max(n - 1, 0)) for n in range(functions))
+
+
+def time_lookups():
+    pos = Position.new_none()
+    builtins = NamespaceSymbol("program", None, pos)
+    builtins.define_type(IntTypeSymbol("int32", True, 32, None, pos))
+    source = NamespaceSymbol("source <bench>", None, pos)
+    builtins.define_namespace(source, visible=False)
+    for n in range(100):
+        source.define_value(VariableSymbol(f"func{n}", None, None, pos))
+    function = NamespaceSymbol("function func0", None, pos)
+    source.define_namespace(function, visible=False)
+    for name in ["a", "b", "total", "count"]:
+        function.define_value(VariableSymbol(name, None, None, pos))
+
+    for label, lookup, name in [("local", function.lookup_value, "count"),
+                                ("global", function.lookup_value, "func50"),
+                                ("builtin type", function.lookup_type, "int32")]:
+        seconds = min(timeit.repeat(lambda: lookup(name), number=LOOKUP_RUNS, repeat=5))
+        print(f"{'lookup ' + label:<28} {seconds / LOOKUP_RUNS * 1e9:>10.1f} ns")
+
+
+def time_analysis(functions: int):
+    MessageHandler.set_config(fail_ge=ErrorLevel.ERROR)
+    source_ast = AizeParser.parse(StreamSource("<bench>", io.StringIO(make_program(functions))))
+    ir = IR.from_ast(ProgramAST([source_ast]))
+
+    start = time.perf_counter()
+    PassScheduler(ir, [DefaultPasses]).run_scheduled()
+    print(f"{'analysis':<28} {(time.perf_counter() - start) * 1000:>10.1f} ms ({functions} functions)")
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    time_lookups()
+    time_analysis(functions)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure the memory used by the AST and IR of a large synthetic program.
+
+Run from the repository root:
+
+    python aizec_bench/bench_memory.py [functions]
+
+Prints the number of AST and IR nodes, the bytes they take up (including any per-instance __dict__), and the peak RSS
+of the process after each stage.
+
+With the default 100000 functions (24.1 MiB of source, 4000001 AST and 4100002 IR nodes), on Python 3.11.7, before
+and after the node classes were given __slots__:
+
+    stage    node bytes (MiB)    peak RSS (MiB)
+             before   after      before   after
+    AST       569.9   203.7      1931.4  1638.0
+    IR        583.6   239.6      2713.9  1886.8
+
+"Before" was measured by running this script unchanged in a checkout of the commit just before the __slots__ change.
+"""
+import gc
+import io
+import sys
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from aizec.aize_common import StreamSource, MessageHandler, ErrorLevel
+from aizec.aize_frontend import AizeParser, ProgramAST
+from aizec.aize_frontend.aize_ast import NodeAST
+from aizec.ir import IR
+from aizec.ir.nodes import NodeIR
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+FUNCTION = """
+def func{n}(n: int32, m: int32) -> int32 {{
+    var total: int32 = n * {n} + m;
+    while (total > 100) {{
+        total = total - (m + 1);
+    }}
+    if (total < 0) {{
+        return func{n}(0 - total, m);
+    }} else {{
+        return total;
+    }}
+}}
+"""
+
+
+def make_program(functions: int) -> str:
+    return "".join(FUNCTION.format(n=n) for n in range(functions))
+
+
+def peak_rss_mib() -> str:
+    if resource is None:
+        return "-"
+    return f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}"
+
+
+def node_stats(node_type: type) -> tuple:
+    count = size = 0
+    for obj in gc.get_objects():
+        if isinstance(obj, node_type):
+            count += 1
+            size += sys.getsizeof(obj)
+            if hasattr(obj, "__dict__"):
+                size += sys.getsizeof(obj.__dict__)
+    return count, size
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    MessageHandler.set_config(fail_ge=ErrorLevel.ERROR)
+
+    text = make_program(functions)
+    print(f"{functions} functions, {len(text) / 1024 / 1024:.1f} MiB of source")
+    print(f"{'start':>10}: peak RSS {peak_rss_mib()} MiB")
+
+    source_ast = AizeParser.parse(StreamSource("<bench>", io.StringIO(text)))
+    count, size = node_stats(NodeAST)
+    print(f"{'AST':>10}: {count} nodes, {size / 1024 / 1024:.1f} MiB, peak RSS {peak_rss_mib()} MiB")
+
+    ir = IR.from_ast(ProgramAST([source_ast]))
+    count, size = node_stats(NodeIR)
+    print(f"{'IR':>10}: {count} nodes, {size / 1024 / 1024:.1f} MiB, peak RSS {peak_rss_mib()} MiB")
+
+
+if __name__ == '__main__':
+    main()
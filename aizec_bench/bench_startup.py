@@ -0,0 +1,46 @@
+"""
+Measure how long it takes to start the compiler, with and without the LLVM backend.
+
+Run from the repository root:
+
+    python aizec_bench/bench_startup.py [runs]
+
+"frontend" only imports what a parse or check needs; "backend" also imports and initializes llvmlite, as a full
+compile does.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from pathlib import Path
+
+
+REPO_DIR = Path(__file__).absolute().parent.parent
+
+CASES = {
+    "frontend": "import aizec.__main__",
+    "backend": "import aizec.__main__; from aizec.aize_backend.aize_llvm_backend import initialize_llvm; initialize_llvm()",
+}
+
+
+def time_startup(code: str, runs: int) -> list:
+    env = {**os.environ, "PYTHONPATH": str(REPO_DIR)}
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], env=env, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    for name, code in CASES.items():
+        times = time_startup(code, runs)
+        print(f"{name:>10}: median {statistics.median(times) * 1000:7.1f} ms, min {min(times) * 1000:7.1f} ms ({runs} runs)")
+
+
+if __name__ == '__main__':
+    main()
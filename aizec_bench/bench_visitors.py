@@ -0,0 +1,81 @@
+"""
+Measure how many IR nodes per second each pass visits, on a synthetic program.
+
+Run from the repository root:
+
+    python aizec_bench/bench_visitors.py [functions]
+
+Runs the analysis passes, MangleNames, and the passes that generate LLVM IR, and prints the time each took and its
+throughput in IR nodes per second. "dispatch" is a visitor that does nothing but dispatch each statement, expression,
+and type node to its (empty) visit method, which measures IRVisitor's own overhead.
+"""
+import gc
+import io
+import sys
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from aizec.aize_common import StreamSource, MessageHandler, ErrorLevel, StageTimer
+from aizec.aize_frontend import AizeParser, ProgramAST
+from aizec.aize_backend.aize_llvm_backend import InitLLVM, DeclareFunctions, DefineFunctions, initialize_llvm
+from aizec.analysis import DefaultPasses, MangleNames
+from aizec.ir import IR
+from aizec.ir.nodes import NodeIR, StmtIR, ExprIR, TypeIR
+from aizec.ir_pass import PassScheduler
+from aizec.ir_pass.aize_ir_pass import IRVisitor
+
+from bench_memory import make_program
+
+
+def count_nodes() -> int:
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, NodeIR))
+
+
+NullVisitor = type("NullVisitor", (IRVisitor,), {name: lambda self, node=None: None for name in IRVisitor.__abstractmethods__})
+
+
+def time_dispatch() -> tuple:
+    visitor = NullVisitor()
+    nodes = [(visitor.visit_stmt, obj) if isinstance(obj, StmtIR) else
+             (visitor.visit_expr, obj) if isinstance(obj, ExprIR) else
+             (visitor.visit_type, obj)
+             for obj in gc.get_objects() if isinstance(obj, (StmtIR, ExprIR, TypeIR))]
+    gc.collect()
+    start = time.perf_counter()
+    for visit, node in nodes:
+        visit(node)
+    return len(nodes), time.perf_counter() - start
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    MessageHandler.set_config(fail_ge=ErrorLevel.ERROR)
+    initialize_llvm()
+
+    source_ast = AizeParser.parse(StreamSource("<bench>", io.StringIO(make_program(functions))))
+    ir = IR.from_ast(ProgramAST([source_ast]))
+    nodes = count_nodes()
+    print(f"{functions} functions, {nodes} IR nodes")
+    dispatched, dispatch_wall = time_dispatch()
+
+    # Keep collections of the (long-lived) program out of the pass timings
+    gc.collect()
+    gc.freeze()
+
+    StageTimer.enable()
+    for passes in [[DefaultPasses], [MangleNames], [InitLLVM, DeclareFunctions, DefineFunctions]]:
+        PassScheduler(ir, passes).run_scheduled()
+
+    print(f"{'Pass':<28} {'Time (ms)':>10} {'Nodes/s':>12}")
+    print(f"{'dispatch':<28} {dispatch_wall * 1000:>10.1f} {dispatched / dispatch_wall:>12,.0f}")
+    for stats in StageTimer.get_stats():
+        if stats.name == "DefaultPasses":
+            continue
+        print(f"{stats.name:<28} {stats.wall * 1000:>10.1f} {nodes / stats.wall:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
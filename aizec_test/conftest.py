@@ -0,0 +1,46 @@
+import pytest
+
+import aizec
+from aizec.aize_backend import StdBundle
+from aizec.aize_common.aize_error import MessageHandler, ErrorLevel
+from aizec.aize_run import FrontendManager, IRManager
+from aizec.common import Callable, Optional, Path, Tuple
+
+
+STD_DIR = Path(aizec.__file__).parent / "std"
+
+
+@pytest.fixture
+def analyze(tmp_path: Path) -> Callable[..., Tuple[FrontendManager, IRManager]]:
+    """
+    Return a function which analyzes the main.az of a project and asserts no errors were reported.
+
+    The function writes program to main.az first if it is given. The project is tmp_path unless another is given.
+    """
+    MessageHandler.reset_config()
+    MessageHandler.set_config(throw_ge=ErrorLevel.NEVER, fail_ge=ErrorLevel.NEVER)
+    MessageHandler.reset_errors()
+
+    def analyze(program: str = None, *, project: Path = None, std_dir: Path = STD_DIR,
+                bundle: Optional[StdBundle] = None, mangle: bool = False) -> Tuple[FrontendManager, IRManager]:
+        if project is None:
+            project = tmp_path
+        if program is not None:
+            (project / "main.az").write_text(program)
+
+        frontend = FrontendManager(project, std_dir, None, bundle)
+        frontend.add_file(project / "main.az")
+        frontend.trace_imports()
+        ir_manager = IRManager(frontend.get_ir())
+        ir_manager.schedule_default_passes()
+        if mangle:
+            ir_manager.schedule_mangling()
+        ir_manager.run_scheduled()
+
+        errors = [msg for msg in MessageHandler.instance().messages if msg.level >= ErrorLevel.ERROR]
+        assert errors == [], [getattr(msg, 'msg', msg) for msg in errors]
+        return frontend, ir_manager
+
+    yield analyze
+    MessageHandler.reset_config()
+    MessageHandler.reset_errors()
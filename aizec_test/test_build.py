@@ -0,0 +1,427 @@
+import subprocess
+from io import StringIO
+
+import pytest
+import llvmlite.ir as ir
+import llvmlite.binding as llvm
+
+from aizec.aize_backend.aize_build import BuildState
+from aizec.aize_backend import OPT_LEVELS
+from aizec.aize_backend.aize_llvm_backend import LLVMBackend, OPT_PRESETS, initialize_llvm, get_target_machine
+from aizec.aize_backend.aize_bundle import StdBundle
+from aizec.aize_common.aize_error import MessageHandler, FailFlag
+from aizec.aize_common.aize_source import Source, StreamSource
+from aizec.aize_run import BackendManager, build_std_bundle
+from aizec.common import Dict, List, Path
+from aizec.ir import IR
+from aizec.ir.nodes import FunctionIR, ProgramIR
+
+
+def build_program(ir: IR, output: Path, *, jobs: int = 1, codegen_units: int = 1, build_dir: Path = None,
+                  import_graph: Dict[Source, List[Source]] = None, bundle: StdBundle = None):
+    """Build the analyzed program ir into output, incrementally in build_dir if it is given with the import graph"""
+    backend = BackendManager.create_llvm(ir)
+    backend.set_output(output)
+    backend.set_jobs(jobs)
+    backend.set_codegen_units(codegen_units)
+    if build_dir is not None:
+        backend.set_build_dir(build_dir, import_graph)
+    backend.set_std_bundle(bundle)
+    backend.run_backend()
+
+
+def make_graph(a: str, b: str, c: str):
+    sources = {name: StreamSource(name, StringIO(text)) for name, text in [("a", a), ("b", b), ("c", c)]}
+    return {sources["a"]: [sources["b"]], sources["b"]: [sources["c"]], sources["c"]: []}
+
+
+class TestBuildState:
+    def test_keys_follow_transitive_imports(self, tmp_path):
+        before = BuildState(tmp_path, make_graph("a", "b", "c"))
+        after = BuildState(tmp_path, make_graph("a", "b", "c changed"))
+
+        assert before.get_key("a", "") != after.get_key("a", "")
+        assert before.get_key("b", "") != after.get_key("b", "")
+        assert before.get_key("c", "") != after.get_key("c", "")
+
+    def test_importers_do_not_change_keys(self, tmp_path):
+        before = BuildState(tmp_path, make_graph("a", "b", "c"))
+        after = BuildState(tmp_path, make_graph("a changed", "b", "c"))
+
+        assert before.get_key("a", "") != after.get_key("a", "")
+        assert before.get_key("b", "") == after.get_key("b", "")
+        assert before.get_key("c", "") == after.get_key("c", "")
+
+    def test_settings_change_keys(self, tmp_path):
+        state = BuildState(tmp_path, make_graph("a", "b", "c"))
+        assert state.get_key("a", "opt_level=0") != state.get_key("a", "opt_level=1")
+
+    def test_state_is_saved(self, tmp_path):
+        state = BuildState(tmp_path, make_graph("a", "b", "c"))
+        key = state.get_key("a", "")
+        assert state.get_object(key) is None
+        state.store_object(key, b"object")
+        state.record("a", key)
+        state.save()
+
+        reloaded = BuildState(tmp_path, make_graph("a", "b", "c"))
+        assert reloaded.get_object(key) == state.object_path(key)
+        assert reloaded.recorded["a"]["imports"] == ["b"]
+
+    def test_unused_objects_are_pruned(self, tmp_path):
+        before = BuildState(tmp_path, make_graph("a", "b", "c"))
+        for name in "abc":
+            before.record(name, before.get_key(name, ""))
+            before.store_object(before.get_key(name, ""), b"object")
+        before.save()
+
+        after = BuildState(tmp_path, make_graph("a", "b changed", "c"))
+        for name in "ab":
+            after.record(name, after.get_key(name, ""))
+            after.store_object(after.get_key(name, ""), b"object")
+        after.save()
+
+        assert sorted(path.name for path in tmp_path.glob("*.o")) == sorted(
+            after.object_path(after.get_key(name, "")).name for name in "abc"
+        )
+
+
+UTIL = """
+def value() -> int32 {
+    return 20;
+}
+"""
+
+OTHER = """
+def value() -> int32 {
+    return 3;
+}
+"""
+
+INCREMENTAL_PROGRAM = """
+import "<local>/util.az";
+import "<local>/other.az";
+
+@entry
+def main() -> int32 {
+    return util::value() + other::value();
+}
+"""
+
+
+class TestIncrementalBuild:
+    @pytest.fixture
+    def project(self, tmp_path: Path) -> Path:
+        project = tmp_path / "project"
+        project.mkdir()
+        (project / "main.az").write_text(INCREMENTAL_PROGRAM)
+        (project / "util.az").write_text(UTIL)
+        (project / "other.az").write_text(OTHER)
+        return project
+
+    @staticmethod
+    def build(analyze, project: Path, build_dir: Path) -> Dict[str, Path]:
+        """Build the project and return the object file of each of its sources"""
+        frontend, ir_manager = analyze(project=project, mangle=True)
+        build_program(ir_manager.ir, project / "main.exe",
+                      build_dir=build_dir, import_graph=frontend.get_import_graph())
+        recorded = BuildState(build_dir, {}).recorded
+        return {Path(name).name: build_dir / recorded[name]["object"] for name in recorded}
+
+    def test_edit_rebuilds_importers(self, analyze, tmp_path: Path, project: Path):
+        first = self.build(analyze, project, tmp_path / "build")
+        assert subprocess.run([str(project / "main.exe")]).returncode == 23
+        built_at = {name: path.stat().st_mtime_ns for name, path in first.items()}
+
+        second = self.build(analyze, project, tmp_path / "build")
+        assert second == first
+        assert {name: path.stat().st_mtime_ns for name, path in second.items()} == built_at
+
+        (project / "util.az").write_text(UTIL.replace("20", "30"))
+        third = self.build(analyze, project, tmp_path / "build")
+        assert subprocess.run([str(project / "main.exe")]).returncode == 33
+        rebuilt = {name for name in third if third[name] != first[name]}
+        assert rebuilt == {"main.az", "util.az"}
+        assert third["other.az"].stat().st_mtime_ns == built_at["other.az"]
+        assert sorted((tmp_path / "build").glob("*.o")) == sorted(third.values())
+
+
+LAMBDA_HELPER = """
+import "<std>/io.az";
+
+def triple(n: int32) -> int32 {
+    return ((x: int32) -> x * 3)(n);
+}
+
+def report(n: int32) -> int32 {
+    return ((x: int32) -> io::print_int(x))(n);
+}
+"""
+
+LAMBDA_PROGRAM = """
+import "<local>/helper.az";
+
+def add_one(n: int32) -> int32 {
+    return ((x: int32) -> x + 1)(n);
+}
+
+@entry
+def main() -> int32 {
+    helper::report(add_one(5));
+    helper::report(helper::triple(4));
+    return add_one(helper::triple(7)) + ((x: int32) -> x - 2)(10);
+}
+"""
+
+
+class TestParallelCodegen:
+    @pytest.fixture
+    def compiled_units(self, tmp_path: Path, monkeypatch) -> List[int]:
+        """Write the program, and return a list which the number of units of each compile_units call is added to"""
+        (tmp_path / "main.az").write_text(LAMBDA_PROGRAM)
+        (tmp_path / "helper.az").write_text(LAMBDA_HELPER)
+        compiled_units = []
+        compile_units = LLVMBackend.compile_units
+
+        def count_units(backend: LLVMBackend, mods: List[ir.Module], target: llvm.Target):
+            compiled_units.append(len(mods))
+            return compile_units(backend, mods, target)
+        monkeypatch.setattr(LLVMBackend, "compile_units", count_units)
+        return compiled_units
+
+    def test_jobs_do_not_change_the_program(self, analyze, compiled_units: List[int], tmp_path: Path):
+        build_program(analyze(mangle=True)[1].ir, tmp_path / "serial.exe")
+        build_program(analyze(mangle=True)[1].ir, tmp_path / "parallel.exe", jobs=4)
+        assert compiled_units == []
+        assert (tmp_path / "parallel.exe").read_bytes() == (tmp_path / "serial.exe").read_bytes()
+
+    def test_units_behave_like_one_module(self, analyze, compiled_units: List[int], tmp_path: Path):
+        build_program(analyze(mangle=True)[1].ir, tmp_path / "serial.exe")
+        build_program(analyze(mangle=True)[1].ir, tmp_path / "parallel.exe", jobs=4, codegen_units=4)
+        assert sum(compiled_units) > 2
+
+        serial = subprocess.run([str(tmp_path / "serial.exe")], capture_output=True)
+        parallel = subprocess.run([str(tmp_path / "parallel.exe")], capture_output=True)
+        assert serial.returncode == 30
+        assert serial.stdout != b""
+        assert (parallel.returncode, parallel.stdout) == (serial.returncode, serial.stdout)
+
+
+def make_module() -> ir.Module:
+    mod = ir.Module("source")
+    int32 = ir.IntType(32)
+    func_type = ir.FunctionType(int32, [])
+    extern = ir.Function(mod, func_type, "extern")
+    helper = ir.Function(mod, func_type, "helper")
+    helper.linkage = 'internal'
+    ir.IRBuilder(helper.append_basic_block()).ret(ir.Constant(int32, 1))
+
+    previous = extern
+    for name in ["a", "b", "c"]:
+        func = ir.Function(mod, func_type, name)
+        builder = ir.IRBuilder(func.append_basic_block())
+        builder.ret(builder.add(builder.call(previous, []), builder.call(helper, [])))
+        previous = func
+    return mod
+
+
+def make_sum_module() -> ir.Module:
+    """A module with a function summing an array of int32 in a loop, which can be vectorized"""
+    mod = ir.Module("source")
+    int32, int64 = ir.IntType(32), ir.IntType(64)
+    func = ir.Function(mod, ir.FunctionType(int32, [int32.as_pointer(), int64]), "sum")
+    values, count = func.args
+    entry, loop, done = func.append_basic_block(), func.append_basic_block(), func.append_basic_block()
+
+    builder = ir.IRBuilder(entry)
+    builder.cbranch(builder.icmp_signed('>', count, ir.Constant(int64, 0)), loop, done)
+
+    builder.position_at_end(loop)
+    index = builder.phi(int64)
+    total = builder.phi(int32)
+    next_total = builder.add(total, builder.load(builder.gep(values, [index])))
+    next_index = builder.add(index, ir.Constant(int64, 1))
+    index.add_incoming(ir.Constant(int64, 0), entry)
+    index.add_incoming(next_index, loop)
+    total.add_incoming(ir.Constant(int32, 0), entry)
+    total.add_incoming(next_total, loop)
+    builder.cbranch(builder.icmp_signed('<', next_index, count), loop, done)
+
+    builder.position_at_end(done)
+    result = builder.phi(int32)
+    result.add_incoming(ir.Constant(int32, 0), entry)
+    result.add_incoming(next_total, loop)
+    builder.ret(result)
+    return mod
+
+
+class TestSplitModule:
+    def test_parts_define_each_function_once(self):
+        initialize_llvm()
+        parts = LLVMBackend.split_module(make_module(), 2)
+        assert len(parts) == 2
+
+        defined = []
+        for part in parts:
+            llvm_mod = llvm.parse_assembly(str(part))
+            llvm_mod.verify()
+            defined += [func.name for func in llvm_mod.functions if not func.is_declaration and func.name != "helper"]
+            assert not llvm_mod.get_function("helper").is_declaration
+        assert sorted(defined) == ["a", "b", "c"]
+
+    def test_one_part(self):
+        mod = make_module()
+        assert LLVMBackend.split_module(mod, 1) == [mod]
+
+
+class TestOptPresets:
+    @pytest.mark.parametrize("level", OPT_LEVELS)
+    def test_preset(self, level: str):
+        backend = LLVMBackend(IR(ProgramIR([])))
+        backend.set_opt_level(level)
+        llvm_mod = backend.parse_module(make_module(), llvm.Target.from_default_triple())
+        backend.optimize(llvm_mod, get_target_machine())
+        llvm_mod.verify()
+        # Every preset but 0 inlines the internal helper
+        assert ("@helper()" in str(llvm_mod.get_function("a"))) == (level == '0')
+
+    @pytest.mark.parametrize("level", OPT_LEVELS)
+    def test_vectorizes_loops(self, level: str):
+        backend = LLVMBackend(IR(ProgramIR([])))
+        backend.set_opt_level(level)
+        llvm_mod = backend.parse_module(make_sum_module(), llvm.Target.from_default_triple())
+        backend.optimize(llvm_mod, get_target_machine())
+        llvm_mod.verify()
+        # Only the presets which vectorize loops, which -Oz leaves out to keep code small, use vector types
+        assert ("<4 x i32>" in str(llvm_mod)) == (level in ('2', '3', 's'))
+
+    def test_presets_differ(self):
+        assert len(set(OPT_PRESETS.values())) == len(OPT_PRESETS)
+
+
+class TestTargetCPU:
+    def test_generic_by_default(self):
+        backend = LLVMBackend(IR(ProgramIR([])))
+        assert backend.get_cpu_and_features() == ('', '')
+        assert backend.get_target_machine(llvm.Target.from_default_triple()) is get_target_machine()
+
+    def test_native(self):
+        backend = LLVMBackend(IR(ProgramIR([])))
+        backend.set_target('native')
+        assert backend.get_cpu_and_features() == (llvm.get_host_cpu_name(), llvm.get_host_cpu_features().flatten())
+        backend.set_target('native', '-avx2')
+        assert backend.get_cpu_and_features() == (llvm.get_host_cpu_name(), '-avx2')
+        backend.set_target('', 'native')
+        assert backend.get_cpu_and_features() == ('', llvm.get_host_cpu_features().flatten())
+
+    def test_unknown_cpu_is_an_error(self):
+        with pytest.raises(ValueError, match="'notacpu' is not a recognized processor"):
+            get_target_machine(None, 'notacpu')
+        with pytest.raises(ValueError, match="'[+]notafeature' is not a recognized feature"):
+            get_target_machine(None, '', '+notafeature')
+
+    def test_unknown_cpu_is_reported(self):
+        err = StringIO()
+        MessageHandler.reset_config()
+        MessageHandler.reset_errors()
+        MessageHandler.set_config(err_out=err)
+        backend = LLVMBackend(IR(ProgramIR([])))
+        backend.set_target('notacpu')
+        try:
+            with pytest.raises(FailFlag):
+                backend.get_target_machine(llvm.Target.from_default_triple())
+        finally:
+            MessageHandler.reset_config()
+            MessageHandler.reset_errors()
+        assert "Target Error" in err.getvalue() and "'notacpu'" in err.getvalue()
+
+
+STD_MATH = """
+def double(n: int32) -> int32 {
+    return n * 2;
+}
+"""
+
+PROGRAM = """
+import "<std>/math.az";
+
+@entry
+def main() -> int32 {
+    return math::double(21);
+}
+"""
+
+
+class TestStdBundle:
+    @pytest.fixture
+    def std_dir(self, tmp_path: Path) -> Path:
+        std_dir = tmp_path / "std"
+        std_dir.mkdir()
+        (std_dir / "math.az").write_text(STD_MATH)
+        return std_dir
+
+    @pytest.fixture
+    def project(self, tmp_path: Path) -> Path:
+        project = tmp_path / "project"
+        project.mkdir()
+        (project / "main.az").write_text(PROGRAM)
+        return project
+
+    def test_std_is_not_parsed_or_compiled(self, analyze, tmp_path: Path, std_dir: Path, project: Path):
+        build_std_bundle(std_dir, tmp_path / "bundle")
+        bundle = StdBundle.open(tmp_path / "bundle", std_dir)
+        assert bundle is not None
+
+        frontend, ir_manager = analyze(project=project, std_dir=std_dir, bundle=bundle, mangle=True)
+        build_program(ir_manager.ir, project / "main.exe", bundle=bundle)
+
+        assert [source.get_path().name for source in frontend._sources] == ["main.az"]
+        assert [source.source_name for source in ir_manager.ir.prebuilt_sources] == [str(std_dir / "math.az")]
+        assert subprocess.run([str(project / "main.exe")]).returncode == 42
+
+    def test_matches_build_from_sources(self, analyze, tmp_path: Path, std_dir: Path, project: Path):
+        build_std_bundle(std_dir, tmp_path / "bundle")
+        bundle = StdBundle.open(tmp_path / "bundle", std_dir)
+        bundled_ir = analyze(project=project, std_dir=std_dir, bundle=bundle, mangle=True)[1].ir
+        build_program(bundled_ir, project / "main.exe", bundle=bundle)
+        source_ir = analyze(project=project, std_dir=std_dir, mangle=True)[1].ir
+        build_program(source_ir, project / "main.exe")
+
+        def function_names(program_ir: IR) -> List[str]:
+            return sorted(top_level.name for source in program_ir.program.sources for top_level in source.top_levels
+                          if isinstance(top_level, FunctionIR))
+
+        assert function_names(bundled_ir) == function_names(source_ir)
+
+    def test_ir_is_loaded_on_first_std_import(self, analyze, tmp_path: Path, std_dir: Path, project: Path, monkeypatch):
+        build_std_bundle(std_dir, tmp_path / "bundle")
+        loads = []
+        load = IR.load
+        monkeypatch.setattr(IR, "load", lambda path: loads.append(path) or load(path))
+
+        bundle = StdBundle.open(tmp_path / "bundle", std_dir)
+        (project / "main.az").write_text("@entry\ndef main() -> int32 {\n    return 7;\n}\n")
+        build_program(analyze(project=project, std_dir=std_dir, bundle=bundle, mangle=True)[1].ir, project / "main.exe",
+                      bundle=bundle)
+        assert loads == []
+
+        bundle = StdBundle.open(tmp_path / "bundle", std_dir)
+        (project / "main.az").write_text(PROGRAM)
+        build_program(analyze(project=project, std_dir=std_dir, bundle=bundle, mangle=True)[1].ir, project / "main.exe",
+                      bundle=bundle)
+        assert loads == [tmp_path / "bundle" / StdBundle.IR_FILE]
+
+    def test_stale_bundle_is_not_used(self, tmp_path: Path, std_dir: Path):
+        build_std_bundle(std_dir, tmp_path / "bundle")
+        (std_dir / "math.az").write_text(STD_MATH.replace("n * 2", "n * 3"))
+        assert StdBundle.open(tmp_path / "bundle", std_dir) is None
+
+    def test_bundle_for_other_settings_is_not_used(self, tmp_path: Path, std_dir: Path):
+        build_std_bundle(std_dir, tmp_path / "bundle", opt_level='0')
+        assert StdBundle.open(tmp_path / "bundle", std_dir, opt_level='0') is not None
+        assert StdBundle.open(tmp_path / "bundle", std_dir, opt_level='3') is None
+        assert StdBundle.open(tmp_path / "bundle", std_dir, opt_level='0', cpu='native') is None
+        assert StdBundle.open(tmp_path / "bundle", std_dir, opt_level='0', features='+avx2') is None
+
+    def test_missing_bundle(self, tmp_path: Path, std_dir: Path):
+        assert StdBundle.open(tmp_path / "bundle", std_dir) is None
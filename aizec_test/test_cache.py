@@ -0,0 +1,69 @@
+import pytest
+
+from io import StringIO
+
+from aizec.aize_frontend import AizeParser, ParseCache, MemoryParseCache, SourceAST
+from aizec.aize_common.aize_error import MessageHandler, ErrorLevel
+from aizec.aize_common.aize_source import StreamSource
+
+
+TEXT = "def main() -> int {\n    return 0;\n}\n"
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    MessageHandler.reset_config()
+    MessageHandler.reset_errors()
+
+
+def make_source(text: str = TEXT) -> StreamSource:
+    return StreamSource("<test>", StringIO(text))
+
+
+class TestParseCache:
+    def test_reuses_entry(self, tmp_path):
+        cache = ParseCache(tmp_path)
+        cache.parse(make_source(), AizeParser.parse)
+        assert len(list(tmp_path.glob("*" + ParseCache.SUFFIX))) == 1
+
+        source = make_source()
+        source_ast = cache.parse(source, lambda s: pytest.fail("source was parsed again"))
+        assert isinstance(source_ast, SourceAST)
+        assert source_ast.source is source
+        assert source_ast.top_levels[0].name == "main"
+        assert source.get_line(1) == "    return 0;"
+
+    def test_changed_text_is_parsed(self, tmp_path):
+        cache = ParseCache(tmp_path)
+        cache.parse(make_source(), AizeParser.parse)
+
+        parsed = []
+        cache.parse(make_source(TEXT.replace("main", "other")), lambda s: parsed.append(s) or AizeParser.parse(s))
+        assert len(parsed) == 1
+
+    def test_errors_are_not_cached(self, tmp_path):
+        MessageHandler.set_config(throw_ge=ErrorLevel.NEVER, fail_ge=ErrorLevel.NEVER)
+        cache = ParseCache(tmp_path)
+        cache.parse(make_source("def main( -> int {}"), AizeParser.parse)
+        assert list(tmp_path.glob("*" + ParseCache.SUFFIX)) == []
+
+
+class TestMemoryParseCache:
+    def test_reuses_entry(self):
+        cache = MemoryParseCache()
+        cache.parse(make_source(), AizeParser.parse)
+
+        source = make_source()
+        source_ast = cache.parse(source, lambda s: pytest.fail("source was parsed again"))
+        assert source_ast.source is source
+
+    def test_evicts_least_recently_used(self):
+        cache = MemoryParseCache(max_entries=2)
+        first, second, third = [TEXT.replace("main", name) for name in ["first", "second", "third"]]
+        for text in [first, second, first, third]:
+            cache.parse(make_source(text), AizeParser.parse)
+
+        cache.parse(make_source(first), lambda s: pytest.fail("source was parsed again"))
+        parsed = []
+        cache.parse(make_source(second), lambda s: parsed.append(s) or AizeParser.parse(s))
+        assert len(parsed) == 1
@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from aizec.aize_common.aize_error import MessageHandler, ErrorLevel
+from aizec.aize_run import FrontendManager
+from aizec.common import Path
+
+
+@pytest.fixture(autouse=True)
+def collect_messages():
+    MessageHandler.reset_config()
+    MessageHandler.set_config(throw_ge=ErrorLevel.NEVER, fail_ge=ErrorLevel.NEVER)
+    MessageHandler.reset_errors()
+    yield
+    MessageHandler.reset_config()
+    MessageHandler.reset_errors()
+
+
+@pytest.fixture()
+def project(tmp_path: Path) -> Path:
+    files = {
+        "main.az": 'import "<local>/a.az";\nimport "<local>/b.az";\ndef main() -> int {\n    return 0;\n}\n',
+        "a.az": 'import "<local>/c.az";\ndef a() -> int {\n    return 1;\n}\n',
+        "b.az": 'import "<local>/c.az";\nimport "<local>/b.az";\ndef b() -> int {\n    return $;\n}\n',
+        "c.az": 'def c( -> int {\n    return 2;\n}\n',
+    }
+    for name, text in files.items():
+        (tmp_path / name).write_text(text)
+    return tmp_path
+
+
+def trace(project: Path, jobs: int):
+    MessageHandler.reset_errors()
+    frontend = FrontendManager(project, project, None)
+    frontend.add_file(project / "main.az")
+    frontend.trace_imports(jobs)
+    sources = [source.get_path().name for source in frontend._sources]
+    messages = [(type(msg).__name__, getattr(msg, 'msg', None)) for msg in MessageHandler.instance().messages]
+    return sources, messages
+
+
+class TestParallelTrace:
+    def test_matches_sequential(self, project: Path):
+        sequential = trace(project, 1)
+        parallel = trace(project, 4)
+        assert parallel == sequential
+        assert sorted(sequential[0]) == ["a.az", "b.az", "c.az", "main.az"]
+        assert len(sequential[1]) == 4
+
+
+def test_frontend_does_not_import_llvm():
+    code = "import sys, aizec.__main__; print(any(name.startswith('llvmlite') for name in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": str(Path(__file__).absolute().parent.parent)})
+    assert result.stdout.strip() == "False", result.stderr
@@ -0,0 +1,445 @@
+import sys
+
+import pytest
+
+from aizec.common import List, Path, contextmanager, DispatchTable
+from aizec.ir import IR, Extension
+from aizec.ir.nodes import NodeIds, NodeIR, IntIR, ProgramIR, SourceIR, ImportIR, FunctionIR
+from aizec.ir.serialization import IRFormatError, dump_ir, load_ir
+from aizec.ir_pass import IRTreePass, PassScheduler, SchedulingError, FusedTreePasses
+from aizec.analysis import DefaultPasses, MangleNames, SymbolData
+from aizec.analysis.symbols import NamespaceSymbol, VariableSymbol, FailedLookupError, IntTypeSymbol, TupleTypeSymbol, \
+    FunctionTypeSymbol
+from aizec.aize_backend.aize_llvm_backend import LLVMData, InitLLVM, DeclareFunctions, DefineFunctions, \
+    get_target_machine
+from aizec.aize_frontend.aize_ast import NodeAST
+from aizec.aize_common import Position
+
+
+def make_int(num: int) -> IntIR:
+    return IntIR(num, Position.new_none())
+
+
+class TestExtension:
+    def test_nodes_share_ids_across_extensions(self):
+        node_ids = NodeIds()
+        first, second = Extension.create(node_ids), Extension.create(node_ids)
+        a, b = make_int(1), make_int(2)
+
+        first.expr(a, set_to="a")
+        second.expr(b, set_to="b")
+        second.int(a, set_to="a int")
+
+        assert (a.node_id, b.node_id) == (0, 1)
+        assert first.expr(a) == "a"
+        assert second.expr(b) == "b"
+        assert second.int(a) == "a int"
+        with pytest.raises(ValueError):
+            first.expr(b)
+        with pytest.raises(ValueError):
+            second.expr(a)
+
+    def test_missing_data(self):
+        ext = Extension.create(NodeIds())
+        with pytest.raises(ValueError):
+            ext.program(ProgramIR([]))
+
+    def test_custom_kind(self):
+        ext = Extension.create(NodeIds())
+        node = make_int(1)
+        ext.ext(node, "custom", set_to=3)
+        assert ext.ext(node, "custom") == 3
+        with pytest.raises(ValueError):
+            ext.expr(node)
+
+
+def all_subclasses(cls: type) -> List[type]:
+    return [cls] + [subclass for child in cls.__subclasses__() for subclass in all_subclasses(child)]
+
+
+@pytest.mark.parametrize("base", [NodeIR, NodeAST])
+def test_nodes_have_no_instance_dict(base: type):
+    for node_type in all_subclasses(base):
+        assert node_type.__dictoffset__ == 0, node_type.__qualname__
+
+
+class TestDispatchTable:
+    class Visitor:
+        def visit_int(self, node):
+            return "int"
+
+    def test_falls_back_to_base_class(self):
+        class SubIntIR(IntIR):
+            __slots__ = ()
+
+        table = DispatchTable(self.Visitor, {IntIR: 'visit_int'})
+        assert table[SubIntIR](self.Visitor(), make_int(1)) == "int"
+        assert SubIntIR in table
+
+    def test_unknown_node(self):
+        table = DispatchTable(self.Visitor, {IntIR: 'visit_int'})
+        with pytest.raises(KeyError):
+            table[ProgramIR]
+
+
+class RecordingPass(IRTreePass):
+    log: List[str] = []
+    requires = set()
+    requires_exts = set()
+    adds_exts = set()
+
+    @classmethod
+    def get_required_passes(cls):
+        return cls.requires
+
+    @classmethod
+    def get_required_extensions(cls):
+        return cls.requires_exts
+
+    @classmethod
+    def get_added_extensions(cls):
+        return cls.adds_exts
+
+    def was_successful(self) -> bool:
+        return True
+
+    @contextmanager
+    def source_context(self, source: SourceIR):
+        self.log.append(f"{self.name} enter {source.source_name}")
+        yield
+        self.log.append(f"{self.name} exit {source.source_name}")
+
+    def visit_import(self, imp: ImportIR):
+        self.log.append(f"{self.name} {imp.path}")
+
+
+class TestPassFusion:
+    @pytest.fixture
+    def ir(self) -> IR:
+        RecordingPass.log = []
+        sources = [SourceIR([ImportIR(None, Path(f"{name}{i}"), Position.new_none()) for i in range(2)], name)
+                   for name in "ab"]
+        return IR(ProgramIR(sources))
+
+    def test_fused_passes_share_one_walk(self, ir: IR):
+        class First(RecordingPass):
+            fusable = True
+
+        class Second(RecordingPass):
+            fusable = True
+            requires = {First}
+
+        PassScheduler(ir, [Second, First]).run_scheduled()
+
+        assert ir.ran_passes == {First, Second}
+        assert RecordingPass.log == [
+            "First enter a", "Second enter a", "First a0", "Second a0", "First a1", "Second a1",
+            "Second exit a", "First exit a",
+            "First enter b", "Second enter b", "First b0", "Second b0", "First b1", "Second b1",
+            "Second exit b", "First exit b",
+        ]
+
+    def test_unfusable_pass_runs_alone(self, ir: IR):
+        class First(RecordingPass):
+            fusable = True
+
+        class Middle(RecordingPass):
+            requires = {First}
+
+        class Last(RecordingPass):
+            fusable = True
+            requires = {Middle}
+
+        PassScheduler(ir, [Last, Middle, First]).run_scheduled()
+
+        assert ir.ran_passes == {First, Middle, Last}
+        assert [entry.split()[0] for entry in RecordingPass.log] == ["First"] * 8 + ["Middle"] * 8 + ["Last"] * 8
+
+
+class TestPassScheduler:
+    @pytest.fixture
+    def ir(self) -> IR:
+        return IR(ProgramIR([]))
+
+    def test_plan_orders_by_requirements(self, ir: IR):
+        class First(RecordingPass):
+            pass
+
+        class Second(RecordingPass):
+            requires = {First}
+
+        class Third(RecordingPass):
+            requires = {Second}
+
+        assert PassScheduler(ir, [Third, Second, First]).plan() == [First, Second, Third]
+
+    def test_plan_keeps_scheduled_order(self, ir: IR):
+        class A(RecordingPass):
+            pass
+
+        class B(RecordingPass):
+            pass
+
+        assert PassScheduler(ir, [B, A]).plan() == [B, A]
+
+    def test_extension_requirements(self, ir: IR):
+        class Ext(Extension):
+            pass
+
+        class Uses(RecordingPass):
+            requires_exts = {Ext}
+
+        class Adds(RecordingPass):
+            adds_exts = {Ext}
+
+        assert PassScheduler(ir, [Uses, Adds]).plan() == [Adds, Uses]
+        with pytest.raises(SchedulingError, match="Ext"):
+            PassScheduler(ir, [Uses]).plan()
+
+    def test_sequences(self, ir: IR):
+        assert PassScheduler(ir, [MangleNames, DefaultPasses]).plan() == [DefaultPasses, MangleNames]
+
+    def test_fusable_neighbours_are_fused(self, ir: IR):
+        class First(RecordingPass):
+            fusable = True
+
+        class Second(RecordingPass):
+            fusable = True
+            requires = {First}
+
+        plan = PassScheduler(ir, [Second, First]).plan()
+        assert len(plan) == 1 and isinstance(plan[0], FusedTreePasses)
+        assert plan[0].passes == [First, Second]
+
+    def test_missing_requirement(self, ir: IR):
+        class First(RecordingPass):
+            pass
+
+        class Second(RecordingPass):
+            requires = {First}
+
+        with pytest.raises(SchedulingError, match="Second requires First"):
+            PassScheduler(ir, [Second]).plan()
+        ir.ran_passes.add(First)
+        assert PassScheduler(ir, [Second]).plan() == [Second]
+
+    def test_cycle(self, ir: IR):
+        class A(RecordingPass):
+            pass
+
+        class B(RecordingPass):
+            requires = {A}
+
+        class C(RecordingPass):
+            requires = {B}
+
+        A.requires = {C}
+        with pytest.raises(SchedulingError, match="A -> C -> B -> A"):
+            PassScheduler(ir, [A, B, C]).plan()
+
+
+PROGRAM = """
+struct Point {
+    attr x: int32;
+    attr y: int32;
+}
+
+def scale(p: Point, by: int32) -> int32 {
+    return p.x * by + p.y;
+}
+
+def main() -> int32 {
+    return scale(new Point {1, 2}, 3);
+}
+"""
+
+
+class TestIRFormat:
+    @pytest.fixture
+    def ir(self, analyze) -> IR:
+        _, manager = analyze(PROGRAM)
+        return manager.ir
+
+    def test_round_trip(self, ir: IR, tmp_path: Path):
+        ir.save(tmp_path / "main.air")
+        loaded = IR.load(tmp_path / "main.air")
+
+        assert loaded.ran_passes == ir.ran_passes
+        assert loaded.extensions.keys() == ir.extensions.keys()
+        assert loaded.node_ids.count == ir.node_ids.count
+        assert [source.source_name for source in loaded.program.sources] == \
+               [source.source_name for source in ir.program.sources]
+
+        main_source = loaded.program.sources[-1]
+        functions = [node for node in main_source.top_levels if isinstance(node, FunctionIR)]
+        assert [func.name for func in functions] == ["scale", "main"]
+        symbols = loaded.extensions[SymbolData]
+        scale = symbols.function(functions[0]).symbol
+        assert scale.name == "scale"
+        # Nodes and symbols shared in the saved IR are still shared once loaded
+        call = functions[1].body[0].expr
+        assert symbols.get_var(call.callee).symbol is scale
+
+    def test_loaded_types_are_interned(self, ir: IR):
+        loaded = load_ir(dump_ir(ir))
+        main_source = loaded.program.sources[-1]
+        scale = next(node for node in main_source.top_levels if isinstance(node, FunctionIR))
+        scale_type = loaded.extensions[SymbolData].function(scale).symbol.type
+        assert FunctionTypeSymbol.get(list(scale_type.params), scale_type.ret, None, Position.new_none()) is scale_type
+
+    def test_loaded_ir_compiles(self, ir: IR):
+        loaded = load_ir(dump_ir(ir))
+        for program in ir, loaded:
+            PassScheduler(program, [MangleNames, InitLLVM, DeclareFunctions, DefineFunctions]).run_scheduled()
+        llvm_data, loaded_llvm_data = ir.extensions[LLVMData], loaded.extensions[LLVMData]
+        assert str(loaded_llvm_data.general().mod) == str(llvm_data.general().mod)
+
+    def test_not_an_ir_file(self):
+        with pytest.raises(IRFormatError, match="Not an IR file"):
+            load_ir(b"not an IR file")
+
+    def test_other_version(self, ir: IR):
+        data = bytearray(dump_ir(ir))
+        data[6] += 1
+        with pytest.raises(IRFormatError, match="format version"):
+            load_ir(bytes(data))
+
+    def test_other_python(self, ir: IR):
+        data = bytearray(dump_ir(ir))
+        data[9] += 1
+        with pytest.raises(IRFormatError, match="saved by Python"):
+            load_ir(bytes(data))
+
+    def test_corrupt(self, ir: IR):
+        with pytest.raises(IRFormatError, match="corrupt"):
+            load_ir(dump_ir(ir)[:-100])
+
+    def test_only_aizec_classes(self):
+        class Local:
+            pass
+
+        ir = IR(ProgramIR([]))
+        ir.extensions[Extension] = ext = Extension.create(ir.node_ids)
+        ext.general(set_to=Local())
+        with pytest.raises(IRFormatError):
+            dump_ir(ir)
+
+
+class TestNamespaceLookup:
+    @staticmethod
+    def make_scopes():
+        pos = Position.new_none()
+        outer = NamespaceSymbol("outer", None, pos)
+        inner = NamespaceSymbol("inner", None, pos)
+        outer.define_namespace(inner, visible=False)
+        return outer, inner
+
+    @staticmethod
+    def make_var(name: str) -> VariableSymbol:
+        return VariableSymbol(name, None, None, Position.new_none())
+
+    def test_lookup_walks_parents(self):
+        outer, inner = self.make_scopes()
+        x = self.make_var("x")
+        outer.define_value(x)
+        assert inner.lookup_value("x") is x
+        with pytest.raises(FailedLookupError):
+            inner.lookup_value("x", here=True)
+        with pytest.raises(FailedLookupError):
+            inner.lookup_type("x")
+
+    def test_later_definition_shadows(self):
+        outer, inner = self.make_scopes()
+        outer_x, inner_x = self.make_var("x"), self.make_var("x")
+        outer.define_value(outer_x)
+        assert inner.lookup_value("x") is outer_x
+        inner.define_value(inner_x)
+        assert inner.lookup_value("x") is inner_x
+        assert inner.lookup_value("x", nearest=False) is outer_x
+
+    def test_reparenting_forgets_lookups(self):
+        outer, inner = self.make_scopes()
+        other = NamespaceSymbol("other", None, Position.new_none())
+        outer_x, other_x = self.make_var("x"), self.make_var("x")
+        outer.define_value(outer_x)
+        other.define_value(other_x)
+        assert inner.lookup_value("x") is outer_x
+        other.define_namespace(inner, visible=False)
+        assert inner.lookup_value("x") is other_x
+        outer.define_namespace(inner, visible=False)
+        assert inner.lookup_value("x") is outer_x
+
+    def test_failed_lookup_finds_later_definition(self):
+        outer, inner = self.make_scopes()
+        with pytest.raises(FailedLookupError):
+            inner.lookup_value("x")
+        x = self.make_var("x")
+        outer.define_value(x)
+        assert inner.lookup_value("x") is x
+
+    def test_names_are_interned(self):
+        outer, inner = self.make_scopes()
+        name = "".join(["na", "me"])
+        outer.define_value(self.make_var(name))
+        assert self.make_var(name).name is sys.intern("name")
+        assert next(iter(outer.value_symbols)) is sys.intern("name")
+
+
+class TestStructuralTypes:
+    @staticmethod
+    def make_int(bits: int) -> IntTypeSymbol:
+        return IntTypeSymbol(f"int{bits}", True, bits, None, Position.new_none())
+
+    def test_equal_types_are_identical(self):
+        pos = Position.new_none()
+        int32, int64 = self.make_int(32), self.make_int(64)
+        pair = TupleTypeSymbol.get([int32, int64], None, pos)
+        assert TupleTypeSymbol.get([int32, int64], None, pos) is pair
+        assert TupleTypeSymbol.get([int64, int32], None, pos) is not pair
+
+        func = FunctionTypeSymbol.get([int32], int64, None, pos)
+        assert FunctionTypeSymbol.get([int32], int64, None, pos) is func
+        assert FunctionTypeSymbol.get([int32, int64], int64, None, pos) is not func
+        assert func.is_super_of(func)
+
+    def test_equal_tuples_unify(self, analyze):
+        _, manager = analyze(
+            "def main() -> int32 {\n"
+            "    var pair: (int32, int32) = (1, 2);\n"
+            "    return 0;\n"
+            "}\n"
+        )
+        symbols = manager.ir.extensions[SymbolData]
+        main = next(node for node in manager.ir.program.sources[-1].top_levels if isinstance(node, FunctionIR))
+        pair = main.body[0]
+        pair_type = symbols.decl(pair).type
+        assert isinstance(pair_type, TupleTypeSymbol)
+        assert symbols.expr(pair.value).return_type is pair_type
+        assert TupleTypeSymbol.get(list(pair_type.items), None, Position.new_none()) is pair_type
+
+
+class TestLLVMTypes:
+    def test_types_lowered_once(self, analyze):
+        _, manager = analyze(
+            "union Shape {\n"
+            "    Circle = int32;\n"
+            "    Square = int64;\n"
+            "}\n"
+            "def first(s: Shape, t: Shape) -> Shape {\n"
+            "    return s;\n"
+            "}\n"
+            "def main() -> int32 {\n"
+            "    return 0;\n"
+            "}\n"
+        )
+        PassScheduler(manager.ir, [MangleNames, InitLLVM, DeclareFunctions, DefineFunctions]).run_scheduled()
+
+        general = manager.ir.extensions[LLVMData].general()
+        assert general.machine is get_target_machine()
+        main_source = manager.ir.program.sources[-1]
+        first = next(node for node in main_source.top_levels if isinstance(node, FunctionIR))
+        shape = manager.ir.extensions[SymbolData].function(first).symbol.type.params[0]
+        llvm_pass = DeclareFunctions(manager.ir)
+        assert llvm_pass.resolve_type(shape) is general.llvm_types[shape]
+        # As big as its largest variant, {i8, i64}
+        assert llvm_pass.get_size(general.llvm_types[shape]) == 16
@@ -0,0 +1,35 @@
+import pytest
+
+from aizec.__main__ import main
+from aizec.aize_common.aize_error import MessageHandler
+from aizec.common import Path
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    MessageHandler.reset_config()
+    MessageHandler.reset_errors()
+    yield
+    MessageHandler.reset_config()
+    MessageHandler.reset_errors()
+
+
+def run_main(*argv: str) -> int:
+    with pytest.raises(SystemExit) as exit_info:
+        main(list(argv))
+    return exit_info.value.code
+
+
+class TestCheck:
+    def test_valid_file(self, tmp_path: Path):
+        (tmp_path / "main.az").write_text("def main() -> int32 {\n    return 0;\n}\n")
+        assert run_main("--check", str(tmp_path / "main.az")) == 0
+        assert not (Path.cwd() / "a.exe").exists()
+
+    def test_name_error(self, tmp_path: Path):
+        (tmp_path / "main.az").write_text("def main() -> int32 {\n    return x;\n}\n")
+        assert run_main("--check", str(tmp_path / "main.az")) == 1
+
+    def test_syntax_error(self, tmp_path: Path):
+        (tmp_path / "main.az").write_text("def main( -> int32 {}\n")
+        assert run_main("--check", str(tmp_path / "main.az")) == 1
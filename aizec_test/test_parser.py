@@ -1,10 +1,12 @@
 import pytest
 
-from aizec.aize_frontend.aize_parser import AizeParser, ParseError
+from io import StringIO
+
+from aizec.aize_frontend.aize_parser import AizeParser, ParseError, Scanner, RegexScanner
 from aizec.aize_common.aize_error import MessageHandler, ThrownMessage, ErrorLevel
-from aizec.aize_common.aize_source import Source
+from aizec.aize_common.aize_source import Source, StreamSource
 from aizec.aize_run import FrontendManager
-from aizec.common import Path
+from aizec.common import Path, Type, Callable
 
 
 @pytest.fixture(autouse=True)
@@ -65,3 +67,68 @@ class TestOneLine:
         with pytest.raises(ThrownMessage) as exc_info:
             AizeParser.parse(test_file)
         assert isinstance(exc_info.value.message, ParseError)
+
+
+class TestStrings:
+    def load_test_file(self, name: str) -> Source:
+        return FrontendManager._make_file_source(Path("parser_test_files") / "string" / name)
+
+    def test_strings(self):
+        test_file = self.load_test_file("strings.az")
+        AizeParser.parse(test_file)
+
+    def test_unterminated_string(self):
+        test_file = self.load_test_file("unterminated_string.az")
+        with pytest.raises(ThrownMessage) as exc_info:
+            AizeParser.parse(test_file)
+        assert isinstance(exc_info.value.message, ParseError)
+
+    def test_unterminated_string_at_eof(self):
+        test_file = StreamSource("<test>", StringIO('import "abc'))
+        with pytest.raises(ThrownMessage) as exc_info:
+            AizeParser.parse(test_file, RegexScanner)
+        assert isinstance(exc_info.value.message, ParseError)
+
+
+class TestScannerParity:
+    @staticmethod
+    def scan(scanner: Type[Scanner], source: Source):
+        scanned = []
+        try:
+            for token in scanner.scan_source(source):
+                scanned.append((token.text, token.type, token.line_no, token.columns))
+                if token.type == '<eof>':
+                    break
+        except ThrownMessage as thrown:
+            scanned.append(repr(thrown.message))
+        return scanned
+
+    def assert_parity(self, make_source: Callable[[], Source]):
+        assert self.scan(Scanner, make_source()) == self.scan(RegexScanner, make_source())
+
+    @pytest.mark.parametrize("path", sorted(Path("parser_test_files").rglob("*.az")), ids=str)
+    def test_test_files(self, path: Path):
+        self.assert_parity(lambda: FrontendManager._make_file_source(path))
+
+    @pytest.mark.parametrize("text", [
+        "", "\n", "a", "a\n", "def f() -> int {}", "x //= 10 ** 2\n-> :: ==",
+        '"abc"', '"a\\"b" c', '"abc', '"abc\n"', '"ab\\\nc"', "#", "# ok\n#bad", "$", "a $ ? b", "a $\n b",
+        "a\0b", "\t  1 \t 23\n\n  foo",
+    ])
+    def test_snippets(self, text: str):
+        self.assert_parity(lambda: StreamSource("<test>", StringIO(text)))
+
+
+class TestTokenStream:
+    def test_replay(self):
+        tokens = RegexScanner.scan_tokens(StreamSource("<test>", StringIO("def main() -> int {\n    return 0;\n}\n")))
+        first = [(token.text, token.type, token.line_no, token.columns) for token in tokens]
+        second = [(token.text, token.type, token.line_no, token.columns) for token in tokens]
+        assert first == second
+        assert first[-1][1] == '<eof>'
+        assert len(tokens) == len(first)
+
+    def test_past_end_is_eof(self):
+        tokens = Scanner.scan_tokens(StreamSource("<test>", StringIO("a b")))
+        assert tokens[100].type == '<eof>'
+        assert tokens[1].text == 'b'
@@ -0,0 +1,36 @@
+import sys
+import threading
+
+from pathlib import Path
+
+from aizec.aize_server import CompileServer, send_request
+
+
+def fake_compile(argv):
+    print("compiling", *argv)
+    print("warning", file=sys.stderr)
+    if argv == ["bad.az"]:
+        raise SystemExit(2)
+    return 0, Path("a.exe")
+
+
+class TestCompileServer:
+    def test_round_trip(self, tmp_path):
+        socket_path = tmp_path / "aizec.sock"
+        server = CompileServer(socket_path, fake_compile)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            response = send_request(socket_path, ["good.az"], tmp_path)
+            assert response["status"] == 0
+            assert response["stdout"] == "compiling good.az\n"
+            assert response["stderr"] == "warning\n"
+            assert response["output"] == str(tmp_path / "a.exe")
+
+            response = send_request(socket_path, ["bad.az"], tmp_path)
+            assert response["status"] == 2
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        assert not socket_path.exists()
@@ -0,0 +1,77 @@
+import json
+
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+import pytest
+
+from aizec.aize_common import StageTimer
+from aizec.aize_common.aize_timing import _PeakResidentMemory
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    StageTimer.reset()
+    yield
+    StageTimer.enable(False)
+    StageTimer.reset()
+
+
+class TestStageTimer:
+    def test_disabled_records_nothing(self):
+        with StageTimer.stage("parse"):
+            list(StageTimer.timed_iter("scan", iter(range(3))))
+        assert StageTimer.get_stats() == []
+
+    def test_nested_stages(self):
+        StageTimer.enable()
+        for _ in range(2):
+            with StageTimer.stage("frontend"):
+                with StageTimer.stage("parse"):
+                    assert list(StageTimer.timed_iter("scan", iter(range(3)))) == [0, 1, 2]
+        with StageTimer.stage("backend"):
+            pass
+
+        stats = StageTimer.get_stats()
+        assert [(s.name, s.depth, s.calls) for s in stats] == [("frontend", 0, 2), ("parse", 1, 2), ("scan", 2, 2), ("backend", 0, 1)]
+        assert stats[0].wall >= stats[1].wall
+
+    def test_json(self):
+        StageTimer.enable()
+        with StageTimer.stage("frontend"):
+            with StageTimer.stage("parse"):
+                pass
+        out = StringIO()
+        StageTimer.dump_json(out)
+        stages = json.loads(out.getvalue())["stages"]
+        assert [stage["path"] for stage in stages] == [["frontend"], ["frontend", "parse"]]
+        assert set(stages[0]) == {"path", "name", "depth", "calls", "wall", "cpu", "peak_memory_kb"}
+
+    @pytest.mark.parametrize("resident", [True, False], ids=["resident", "python heap"])
+    def test_peak_memory_is_per_stage(self, resident: bool, monkeypatch):
+        if resident and not _PeakResidentMemory.is_available():
+            pytest.skip("the peak resident memory cannot be reset here")
+        monkeypatch.setattr(_PeakResidentMemory, "is_available", classmethod(lambda cls: resident))
+        StageTimer.enable()
+        with StageTimer.stage("compile"):
+            with StageTimer.stage("allocate"):
+                allocated = b"\x01" * (64 * 2 ** 20)
+                del allocated
+            with StageTimer.stage("idle"):
+                pass
+
+        compile, allocate, idle = StageTimer.get_stats()
+        assert allocate.peak_memory_kb - idle.peak_memory_kb >= 60 * 1024
+        assert compile.peak_memory_kb >= allocate.peak_memory_kb
+
+    def test_stages_on_other_threads(self):
+        StageTimer.enable()
+
+        def work(_):
+            with StageTimer.stage("unit"):
+                pass
+
+        with StageTimer.stage("backend"), ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(StageTimer.in_current_stage(work), range(4)))
+
+        assert [(s.name, s.depth, s.calls) for s in StageTimer.get_stats()] == [("backend", 0, 1), ("unit", 1, 4)]